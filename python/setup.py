@@ -14,6 +14,9 @@ setup(
         "matplotlib==3.9.*",
         "soundfile==0.12.*",
         "scipy==1.14.*",
-    ]
+    ],
+    extras_require={
+        "jit": ["numba==0.61.*"],
+    }
 )
 
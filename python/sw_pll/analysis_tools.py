@@ -3,10 +3,29 @@
 
 import matplotlib.pyplot as plt
 import numpy as np
+import scipy.fft
+import scipy.signal
 import soundfile
+import wave
 from scipy.io import wavfile # soundfile has some issues writing high Fs files
 
-class audio_modulator:
+class tone_modulator:
+    """
+    Base of the audio modulators. Subclasses provide get_spectral_metrics of their modulated tone.
+    """
+
+    def plot_modulated_fft(self, filename, *args, **kwargs):
+        """
+        Plot the spectrum of the modulated waveform and return its spectral_metrics.
+        The other arguments are passed on to get_spectral_metrics.
+        """
+        metrics = self.get_spectral_metrics(*args, **kwargs)
+        metrics.plot(filename)
+
+        return metrics
+
+
+class audio_modulator(tone_modulator):
     """
     This test helper generates a wav file with a fixed sample rate and tone frequency
     of a certain length.
@@ -40,35 +59,331 @@ class audio_modulator:
         # soundfile.write(filename, integer_output, int(self.sample_rate)) # This struggles with >768ksps
         wavfile.write(filename, int(self.sample_rate), integer_output)
 
-    def plot_modulated_fft(self, filename, skip_s=None):
+    def get_spectral_metrics(self, skip_s=None, **kwargs):
+        """
+        spectral_metrics of the modulated waveform, optionally skipping the start of it.
+        kwargs are passed on to spectral_metrics.
+        """
         start_x = 0 if skip_s is None else int(skip_s * self.sample_rate) // 2 * 2
-        waveform = self.waveform[start_x:]
 
-        xf = np.linspace(0.0, 1.0/(2.0/self.sample_rate), waveform.size // 2)
-        N = xf.size
-        window = np.kaiser(N*2, 14)
-        waveform = waveform * window
-        yf = np.fft.fft(waveform)
+        return spectral_metrics(self.waveform[start_x:], self.sample_rate, self.test_tone_hz, **kwargs)
+
+    def load_wav(self, filename):
+        """
+        Used for testing only - load a wav into self.waveform
+        """
+        self.waveform, self.sample_rate = soundfile.read(filename)
+
+
+class spectral_metrics_result:
+    """
+    The result of spectral_metrics. Levels are in dB relative to the power of the tone (dBc):
+
+    -   snr_db:         tone power over the noise in the band, excluding harmonics
+    -   thd_db:         harmonic power in the band over the tone power
+    -   thd_n_db:       harmonic and noise power in the band over the tone power
+    -   spur_hz:        frequency of the largest spur (including harmonics) in the band
+    -   spur_dbc:       level of the largest spur
+    -   noise_floor:    dict of the median noise density of each noise band in dBc/Hz, keyed by band
+
+    The one sided power spectral density it was calculated from is kept in frequencies and psd.
+    """
+    def __init__(self, frequencies, psd, tone_hz, tone_power, snr_db, thd_db, thd_n_db, spur_hz, spur_dbc, noise_floor):
+        self.frequencies = frequencies
+        self.psd = psd
+        self.tone_hz = tone_hz
+        self.tone_power = tone_power
+        self.snr_db = snr_db
+        self.thd_db = thd_db
+        self.thd_n_db = thd_n_db
+        self.spur_hz = spur_hz
+        self.spur_dbc = spur_dbc
+        self.noise_floor = noise_floor
+
+    def __repr__(self):
+        noise_floor = ", ".join(f"{lo:g}-{hi:g}Hz: {level:.1f}dBc/Hz" for (lo, hi), level in self.noise_floor.items())
+        return (f"tone: {self.tone_hz:.2f}Hz SNR: {self.snr_db:.1f}dB THD: {self.thd_db:.1f}dB THD+N: {self.thd_n_db:.1f}dB "
+                f"largest spur: {self.spur_dbc:.1f}dBc at {self.spur_hz:.1f}Hz noise floor: {noise_floor}")
+
+    def plot(self, filename):
+        """
+        Plot the spectrum in dBc per bin from 10Hz to 100kHz with the largest spur marked
+        """
+        bin_hz = self.frequencies[1] - self.frequencies[0]
+        with np.errstate(divide="ignore"):
+            level = 10 * np.log10(self.psd * bin_hz / self.tone_power)
+
         fig, ax = plt.subplots()
-        
-        # Plot a zoom in on the test
-        tone_idx = int(self.test_tone_hz / (self.sample_rate / 2) * N)
-        num_side_bins = 50
-        yf = 20 * np.log10(np.abs(yf) / N)
-        # ax.plot(xf[tone_idx - num_side_bins:tone_idx + num_side_bins], yf[tone_idx - num_side_bins:tone_idx + num_side_bins], marker='.')
-        
-        # Plot the whole frequncy range from DC to nyquist
-        ax.plot(xf[:N], yf[:N], marker='.')
+        ax.plot(self.frequencies, level, marker='.')
+        ax.plot(self.spur_hz, self.spur_dbc, marker='x', color='red', label=f'largest spur {self.spur_dbc:.1f}dBc')
         ax.set_xscale("log")
+        ax.set_xlabel('Frequency (Hz)')
+        ax.set_ylabel('dBc')
+        ax.set_title(f'SNR {self.snr_db:.1f}dB, THD+N {self.thd_n_db:.1f}dB')
+        ax.legend(loc="upper right")
         plt.xlim((10**1, 10**5))
-        plt.ylim((-200, 0))
+        plt.ylim((-200, 10))
         plt.savefig(filename, dpi=150)
+        plt.close(fig)
 
-    def load_wav(self, filename):
+
+def _main_lobe_bins(window, nperseg):
+    """
+    Half width of the main lobe of a window in FFT bins, to the first null
+    """
+    oversample = 16
+    response = np.abs(np.fft.rfft(scipy.signal.get_window(window, nperseg), oversample * nperseg))
+    rising = np.flatnonzero(np.diff(response) > 0)
+    first_null = rising[0] if len(rising) else len(response)
+
+    return int(np.ceil(first_null / oversample))
+
+
+def _segment_length(sample_rate, resolution_hz, num_samples=None):
+    """
+    Welch segment length of about sample_rate / resolution_hz samples, but no more than num_samples, rounded down
+    to a fast FFT length
+    """
+    nperseg = int(np.ceil(sample_rate / resolution_hz))
+    if num_samples is not None:
+        nperseg = min(nperseg, num_samples)
+
+    return scipy.fft.prev_fast_len(max(nperseg, 16), real=True)
+
+
+class _welch_accumulator:
+    """
+    Welch average of the one sided power spectral density of a signal which is added a block at a time. This is the same
+    as scipy.signal.welch with detrend=False and 50% overlapped segments, but only one segment is held at a time.
+    """
+
+    def __init__(self, sample_rate, nperseg, window):
+        self.sample_rate = sample_rate
+        self.window = scipy.signal.get_window(window, nperseg)
+        self.step = nperseg - nperseg // 2
+        self.segment = np.empty(nperseg, dtype=np.float64)
+        self.fill = 0
+        self.power = np.zeros(nperseg // 2 + 1, dtype=np.float64) # Sum of the periodograms
+        self.num_segments = 0
+
+    def add(self, samples):
+        nperseg = len(self.segment)
+        while len(samples):
+            n = min(len(samples), nperseg - self.fill)
+            self.segment[self.fill:self.fill + n] = samples[:n]
+            self.fill += n
+            samples = samples[n:]
+
+            if self.fill == nperseg:
+                self.power += np.abs(scipy.fft.rfft(self.segment * self.window))**2
+                self.num_segments += 1
+                self.segment[:nperseg - self.step] = self.segment[self.step:]
+                self.fill = nperseg - self.step
+
+    def get_psd(self):
         """
-        Used for testing only - load a wav into self.waveform
+        The frequencies and the power spectral density averaged over the segments so far
         """
-        self.waveform, self.sample_rate = soundfile.read(filename)
+        if self.num_segments == 0:
+            raise ValueError(f"Not enough samples for a segment of {len(self.segment)}")
+        nperseg = len(self.segment)
+        psd = self.power / (self.num_segments * self.sample_rate * np.sum(self.window**2))
+        psd[1:(nperseg + 1) // 2] *= 2 # One sided, without DC or Nyquist
+
+        return scipy.fft.rfftfreq(nperseg, 1.0 / self.sample_rate), psd
+
+
+def spectral_metrics(waveform, sample_rate, tone_hz, band_hz=(20.0, 20000.0), noise_bands_hz=((20.0, 200.0), (200.0, 2000.0), (2000.0, 20000.0)),
+                     resolution_hz=5.0, window=("kaiser", 14), num_harmonics=5):
+    """
+    Measure a test tone: SNR, THD, THD+N, the largest spur and the noise floor of each noise band. Returns a spectral_metrics_result.
+
+    The spectrum is a Welch average of real FFTs over 50% overlapped segments of about sample_rate / resolution_hz samples,
+    rounded down to a fast FFT length. The tone is taken as the peak nearest tone_hz, and the tone, its harmonics and DC
+    each occupy the main lobe of the window either side of their bin.
+    """
+    waveform = np.asarray(waveform, dtype=np.float64)
+    nperseg = _segment_length(sample_rate, resolution_hz, len(waveform))
+    frequencies, psd = scipy.signal.welch(waveform, sample_rate, window=window, nperseg=nperseg, noverlap=nperseg // 2,
+                                          detrend=False, scaling="density")
+
+    return psd_metrics(frequencies, psd, tone_hz, nperseg, band_hz=band_hz, noise_bands_hz=noise_bands_hz, window=window,
+                       num_harmonics=num_harmonics)
+
+
+def psd_metrics(frequencies, psd, tone_hz, nperseg, band_hz=(20.0, 20000.0), noise_bands_hz=((20.0, 200.0), (200.0, 2000.0), (2000.0, 20000.0)),
+                window=("kaiser", 14), num_harmonics=5):
+    """
+    spectral_metrics of a one sided power spectral density which was Welch averaged over segments of nperseg samples
+    with window
+    """
+    bin_hz = frequencies[1]
+    lobe = _main_lobe_bins(window, nperseg) + 1 # Allow for the tone not being at the centre of a bin
+
+    def lobe_bins(centre):
+        return slice(max(centre - lobe, 0), centre + lobe + 1)
+
+    # Tone, then its harmonics
+    nominal = int(round(tone_hz / bin_hz))
+    search = lobe_bins(nominal)
+    tone_bin = search.start + int(np.argmax(psd[search]))
+    tone_power = psd[lobe_bins(tone_bin)].sum() * bin_hz
+
+    excluded = np.zeros(len(psd), dtype=bool)
+    excluded[lobe_bins(0)] = True
+    excluded[lobe_bins(tone_bin)] = True
+    harmonic = np.zeros(len(psd), dtype=bool)
+    for n in range(2, num_harmonics + 2):
+        harmonic[lobe_bins(int(round(n * frequencies[tone_bin] / bin_hz)))] = True
+    harmonic &= ~excluded
+
+    in_band = (frequencies >= band_hz[0]) & (frequencies <= band_hz[1])
+    noise = in_band & ~excluded & ~harmonic
+    harmonic_power = psd[in_band & harmonic].sum() * bin_hz
+    noise_power = psd[noise].sum() * bin_hz
+
+    # Largest spur, measured over its main lobe without any of the tone or DC
+    candidates = np.flatnonzero(in_band & ~excluded)
+    spur_bin = candidates[np.argmax(psd[candidates])] if len(candidates) else tone_bin
+    spur_power = psd[lobe_bins(spur_bin)][~excluded[lobe_bins(spur_bin)]].sum() * bin_hz
+
+    noise_floor = {}
+    for lo, hi in noise_bands_hz:
+        band_noise = psd[(frequencies >= lo) & (frequencies <= hi) & ~excluded & ~harmonic]
+        if len(band_noise):
+            noise_floor[(lo, hi)] = 10 * np.log10(np.median(band_noise) / tone_power)
+
+    with np.errstate(divide="ignore"):
+        return spectral_metrics_result(frequencies, psd, float(frequencies[tone_bin]), tone_power,
+                                snr_db=10 * np.log10(tone_power / noise_power),
+                                thd_db=10 * np.log10(harmonic_power / tone_power),
+                                thd_n_db=10 * np.log10((harmonic_power + noise_power) / tone_power),
+                                spur_hz=float(frequencies[spur_bin]),
+                                spur_dbc=10 * np.log10(spur_power / tone_power),
+                                noise_floor=noise_floor)
+
+
+class streaming_audio_modulator(tone_modulator):
+    """
+    Frequency modulates a test tone as the deviations are added, rather than holding the deviation
+    for the whole duration as audio_modulator does. Deviations are added in order, either as
+    piecewise constant segments or per sample. They are synthesised a chunk at a time with the phase
+    carried between chunks, written to the wav file and added to the Welch average of the spectrum as
+    they go, so memory use does not depend on the duration. The result is identical to audio_modulator
+    with the same deviations.
+    """
+
+    def __init__(self, sample_rate=48000, test_tone_hz=1000, wav_file=None, chunk_samples=1 << 16, analyse_from_s=None,
+                 duration_s=None, resolution_hz=5.0, window=("kaiser", 14)):
+        """
+        If wav_file is given the modulated tone is written to it as 16 bit mono.
+        If analyse_from_s is given the spectrum of the tone from that time on is averaged for get_spectral_metrics,
+        with segments of the same length as spectral_metrics. If the tone may be shorter than sample_rate / resolution_hz
+        samples from analyse_from_s, duration_s must be given for this. Only one segment of the tone is held.
+        """
+        self.sample_rate = sample_rate
+        self.test_tone_hz = test_tone_hz
+
+        self.modulator = np.empty(int(chunk_samples), dtype=np.float64) # The current chunk
+        self.chunk_count = 0
+        self.num_samples = 0        # Samples added
+        self.phase = 0.0            # Phase at the end of the last chunk
+
+        self.analyse_from = None if analyse_from_s is None else int(analyse_from_s * sample_rate) // 2 * 2
+        self.window = window
+        analysed_samples = None if (duration_s is None or analyse_from_s is None) else int(duration_s * sample_rate) - self.analyse_from
+        self.nperseg = _segment_length(sample_rate, resolution_hz, analysed_samples)
+        self.welch = None if analyse_from_s is None else _welch_accumulator(sample_rate, self.nperseg, window)
+
+        self.wav = None
+        if wav_file is not None:
+            self.wav = wave.open(str(wav_file), "wb")
+            self.wav.setnchannels(1)
+            self.wav.setsampwidth(2)
+            self.wav.setframerate(int(sample_rate))
+
+    def add_segment(self, num_samples, delta_freq):
+        """
+        Add num_samples samples deviated by delta_freq from the test tone
+        """
+        while num_samples > 0:
+            n = min(num_samples, len(self.modulator) - self.chunk_count)
+            self.modulator[self.chunk_count:self.chunk_count + n] = self.test_tone_hz + delta_freq
+            self._added(n)
+            num_samples -= n
+
+    def add_segment_until(self, end_s, delta_freq):
+        """
+        Add a segment deviated by delta_freq up to end_s, as audio_modulator.apply_frequency_deviation from
+        the end of the previous segment
+        """
+        self.add_segment(int(end_s * self.sample_rate) - self.num_samples, delta_freq)
+
+    def add_samples(self, delta_freq):
+        """
+        Add samples with the deviation of each one from the test tone, for example a trace of frequency errors
+        """
+        delta_freq = np.asarray(delta_freq, dtype=np.float64)
+        while len(delta_freq):
+            n = min(len(delta_freq), len(self.modulator) - self.chunk_count)
+            np.add(delta_freq[:n], self.test_tone_hz, out=self.modulator[self.chunk_count:self.chunk_count + n])
+            self._added(n)
+            delta_freq = delta_freq[n:]
+
+    def _added(self, n):
+        self.chunk_count += n
+        self.num_samples += n
+        if self.chunk_count == len(self.modulator):
+            self._synthesise()
+
+    def _synthesise(self):
+        """
+        Modulate the current chunk. The phase is accumulated as audio_modulator.modulate_waveform
+        does, starting from the end of the previous chunk.
+        """
+        count = self.chunk_count
+        if count == 0:
+            return
+        start = self.num_samples - count
+
+        delta_phi = self.modulator[:count] * np.pi / (self.sample_rate / 2.0)
+        delta_phi[0] += self.phase
+        phi = np.cumsum(delta_phi)
+        self.phase = phi[-1]
+        waveform = np.sin(phi)
+
+        if self.wav is not None:
+            self.wav.writeframes(np.int16(waveform * 32767).astype("<i2").tobytes())
+        if self.welch is not None and start + count > self.analyse_from:
+            self.welch.add(waveform[max(self.analyse_from - start, 0):])
+
+        self.chunk_count = 0
+
+    def close(self):
+        """
+        Modulate the remaining samples and finish the wav file
+        """
+        self._synthesise()
+        if self.wav is not None:
+            self.wav.close()
+            self.wav = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def get_spectral_metrics(self, **kwargs):
+        """
+        spectral_metrics of the tone from analyse_from_s up to the last complete segment synthesised.
+        kwargs are passed on to psd_metrics.
+        """
+        if self.welch is None:
+            raise ValueError("The spectrum is only averaged if analyse_from_s is given")
+        frequencies, psd = self.welch.get_psd()
+
+        return psd_metrics(frequencies, psd, self.test_tone_hz, self.nperseg, window=self.window, **kwargs)
 
 
 if __name__ == '__main__':
@@ -2,11 +2,11 @@
 # This Software is subject to the terms of the XMOS Public Licence: Version 1.
 
 import subprocess
-import re
 from pathlib import Path
-from sw_pll.pll_calc import print_regs, find_pll
-from contextlib import redirect_stdout
-import io
+from sw_pll.pll_calc import get_regs, iter_pll_solutions, rank_pll_solutions, get_frac_list, write_frac_header, solver_versions
+from sw_pll.solution_cache import solution_cache, cache_enabled
+from sw_pll.lut_sidecar import write_lut_sidecar
+import numpy as np
 from math import isclose
 
 register_file = "register_setup.h" # can be changed as needed. This contains the register setup params and is accessible via C in the firmware
@@ -19,11 +19,14 @@ class app_pll_frac_calc:
         It uses the checks specified in the datasheet to ensure the settings are valid, and will assert if not.
         To keep the inherent jitter of the PLL output down to a minimum, it is recommended that R be kept small,
         ideally = 0 (which equiates to 1) but reduces lock range.
+
+        The F, R and OD checks and the integer part of the calculation are done once each time F, R, OD or ACD
+        change, so updates of only the fractional settings are fast. Set strict to repeat every check on each call.
     """
 
     frac_enable_mask = 0x80000000
 
-    def __init__(self, input_frequency, F_init, R_init, f_init, p_init, OD_init, ACD_init, verbose=False):
+    def __init__(self, input_frequency, F_init, R_init, f_init, p_init, OD_init, ACD_init, verbose=False, strict=False):
         """
         Constructor initialising a PLL instance
         """
@@ -37,16 +40,15 @@ class app_pll_frac_calc:
         self.output_frequency = None
         self.fractional_enable = True
         self.verbose = verbose
+        self.strict = strict
+        self._integer_settings = None   # (input_frequency, F, R, OD, ACD) last checked by _update_integer_settings
 
         self.calc_frequency()
 
-    def calc_frequency(self):
+    def _check_integer_settings(self):
         """
-        Calculate the output frequency based on current object settings
+        Check the F, R and OD settings and the resulting VCO frequency are within the datasheet limits
         """
-        if self.verbose:
-            print(f"F: {self.F} R: {self.R} OD: {self.OD} ACD: {self.ACD} f: {self.f} p: {self.p}")
-            print(f"input_frequency: {self.input_frequency}")
         assert self.F >= 1 and self.F <= 8191, f"Invalid F setting {self.F}"
         assert type(self.F) is int, f"Error: F must be an INT"
         assert self.R >= 0 and self.R <= 63, f"Invalid R setting {self.R}"
@@ -58,6 +60,42 @@ class app_pll_frac_calc:
         assert intermediate_freq >= 360000000.0 and intermediate_freq <= 1800000000.0, f"Invalid VCO freq: {intermediate_freq}"
         # print(f"intermediate_freq: {intermediate_freq}")
 
+    def _update_integer_settings(self):
+        """
+        Check the integer settings and precompute the terms of the frequency calculation which do not depend on f and p.
+        Only done when the settings have changed since the last call.
+        """
+        integer_settings = (self.input_frequency, self.F, self.R, self.OD, self.ACD)
+        if integer_settings == self._integer_settings:
+            return
+
+        self._check_integer_settings()
+        self._fb_int = self.F + 1.0
+        self._divisors = (self.R + 1.0, self.OD + 1.0, 2.0 * (self.ACD + 1))
+        r_div, od_div, acd_div = self._divisors
+        self._int_output_frequency = self.input_frequency * (self._fb_int / 2.0 / r_div / od_div / acd_div)
+        self._integer_settings = integer_settings
+
+    def calc_frequency(self):
+        """
+        Calculate the output frequency based on current object settings
+        """
+        if self.verbose:
+            print(f"F: {self.F} R: {self.R} OD: {self.OD} ACD: {self.ACD} f: {self.f} p: {self.p}")
+            print(f"input_frequency: {self.input_frequency}")
+
+        if not self.strict:
+            # Same calculation, in the same order, as below so the result is identical
+            self._update_integer_settings()
+            if self.fractional_enable:
+                r_div, od_div, acd_div = self._divisors
+                self.output_frequency = self.input_frequency * ((self._fb_int + ((self.f + 1) / (self.p + 1))) / 2.0 / r_div / od_div / acd_div)
+            else:
+                self.output_frequency = self._int_output_frequency
+            return self.output_frequency
+
+        self._check_integer_settings()
+
         assert type(self.p) is int, f"Error: r must be an INT"
         assert type(self.f) is int, f"Error: f must be an INT"
 
@@ -115,6 +153,36 @@ class app_pll_frac_calc:
         return self.update_frac(f, p)
 
 
+    def frequencies_from_frac(self, f, p, enable=True):
+        """
+        Calculate the output frequency for arrays of f, p and fractional enable settings in one call, using
+        the current F, R, OD and ACD. The results are identical to calling update_frac for each element but
+        the settings are checked once and the object state is not changed.
+        """
+        self._update_integer_settings()
+        f = np.asarray(f, dtype=np.int64)
+        p = np.asarray(p, dtype=np.int64)
+        enable = np.asarray(enable, dtype=bool)
+        assert np.all((f >= 0) & (f <= 255)) and np.all((p >= 0) & (p <= 255)), "Error: f and p must be 8 bit values"
+
+        r_div, od_div, acd_div = self._divisors
+        fb_div = np.where(enable, self._fb_int + ((f + 1) / (p + 1)), self._fb_int)
+        pll_ratio = fb_div / 2.0 / r_div / od_div / acd_div
+
+        return self.input_frequency * pll_ratio
+
+    def frequencies_from_frac_regs(self, regs):
+        """
+        Calculate the output frequency for an array of fractional register values, for example a captured
+        register trace. Vectorised equivalent of update_frac_reg which does not change the object state.
+        """
+        regs = np.asarray(regs, dtype=np.int64)
+        f = (regs >> 8) & ((2**8)-1)
+        p = regs & ((2**8)-1)
+        enable = (regs & self.frac_enable_mask) != 0
+
+        return self.frequencies_from_frac(f, p, enable)
+
     def get_frac_reg(self):
         """
         Returns the fractional reg value from current setting
@@ -139,17 +207,192 @@ class app_pll_frac_calc:
         text += f"   ACD: {self.ACD}\n"
         text += "*/\n\n"
 
-        # This is a way of calling a printing function from another module and capturing the STDOUT
-        f = io.StringIO()
-        with redirect_stdout(f):
-            # in pll_calc, op_div = OD, fb_div = F, f, p, ref_div = R, fin_op_div = ACD
-            print_regs(self.OD + 1, [self.F + 1, self.f + 1, self.p + 1] , self.R + 1, self.ACD + 1, app=1)
-        text += f.getvalue().replace(" ", "_").replace("REG_0x", "REG 0x").replace("APP_PLL", "#define APP_PLL")
+        # in pll_calc, op_div = OD, fb_div = F, f, p, ref_div = R, fin_op_div = ACD
+        regs = get_regs(self.OD + 1, [self.F + 1, self.f + 1, self.p + 1] , self.R + 1, self.ACD + 1, app=1)
+        for name, value in regs.items():
+            text += f"#define {name} 0x{value:08X}\n"
+
+        return text
+
+class lut_table:
+    """
+    The fractional setting look up table for a LUT based DCO, as generated by pll_calc. Holds the
+    fraction list, the 16 bit register values and the fraction range, and can optionally be saved
+    as a fractions.h header for the firmware.
+    """
+    def __init__(self, frac_list, den_max):
+        self.frac_list = frac_list
+        self.den_max = den_max
+        self.lut = np.array([((m - 1) << 8) | (n - 1) for _, m, n in frac_list], dtype=np.uint16)
+        self.min_frac = min(item[0] for item in frac_list)
+        self.max_frac = max(item[0] for item in frac_list)
+
+    def __len__(self):
+        return len(self.lut)
+
+    def write_header(self, filename="fractions.h"):
+        """
+        Save as a C header in the same format as pll_calc.py --header
+        """
+        write_frac_header(self.frac_list, self.den_max, filename)
+        return filename
+
+
+class pll_config:
+    """
+    An App PLL configuration found by find_pll_config. Holds the register settings (in the same form
+    as app_pll_frac_calc), the resulting frequencies and the LUT so that it can be passed directly to
+    lut_dco, lut_pi_ctrl and sim_sw_pll_lut without any files. register_setup.h and fractions.h are
+    only written if write_headers is called.
+    """
+    def __init__(self, input_frequency, F, R, f, p, OD, ACD, output_frequency, vco_freq, ppm, lut=None, cmd="", solution_index=None):
+        self.input_frequency = input_frequency
+        self.F = F
+        self.R = R
+        self.f = f
+        self.p = p
+        self.OD = OD
+        self.ACD = ACD
+        self.output_frequency = output_frequency
+        self.vco_freq = vco_freq
+        self.ppm = ppm
+        self.lut = lut                          # lut_table, if one is used
+        self.cmd = cmd                          # Equivalent pll_calc.py command line, for the register file comments
+        self.solution_index = solution_index
+
+    def get_app_pll(self):
+        """
+        A new app_pll_frac_calc with these settings
+        """
+        return app_pll_frac_calc(self.input_frequency, self.F, self.R, self.f, self.p, self.OD, self.ACD)
+
+    def get_regs(self):
+        """
+        Dict of App PLL register name to value
+        """
+        # in pll_calc, op_div = OD, fb_div = F, f, p, ref_div = R, fin_op_div = ACD
+        return get_regs(self.OD + 1, [self.F + 1, self.f + 1, self.p + 1], self.R + 1, self.ACD + 1, app=1)
+
+    def register_file_text(self):
+        """
+        Text of register_setup.h. The settings are in the comment, which lut_dco can parse, followed by the register values.
+        """
+        text = f"/* Autogenerated by {Path(__file__).name} using command:\n"
+        text += f"   {self.cmd}\n"
+        text += f"   Picked output solution #{self.solution_index}\n"
+        text += f"   Input freq: {self.input_frequency}\n"
+        text += f"   F: {self.F}\n"
+        text += f"   R: {self.R}\n"
+        text += f"   f: {self.f}\n"
+        text += f"   p: {self.p}\n"
+        text += f"   OD: {self.OD}\n"
+        text += f"   ACD: {self.ACD}\n"
+        text += f"   Output freq: {self.output_frequency}\n"
+        text += f"   VCO freq: {self.vco_freq} */\n"
+        text += "\n"
+        for name, value in self.get_regs().items():
+            text += f"#define {name}  \t0x{value:08X}\n"
 
         return text
 
+    def write_headers(self, register_filename=register_file, fractions_filename="fractions.h"):
+        """
+        Save register_setup.h and, if there is a LUT, fractions.h for use by the firmware or older tools.
+        A binary copy of both is also saved alongside fractions.h for lut_dco to load quickly. See lut_sidecar.py
+        """
+        if self.lut is not None:
+            self.lut.write_header(fractions_filename)
+        with open(register_filename, "w") as reg_vals:
+            reg_vals.write(self.register_file_text())
+        if self.lut is not None:
+            write_lut_sidecar(fractions_filename, register_filename, self.lut.lut, [item[0] for item in self.lut.frac_list],
+                              self.input_frequency, (self.F, self.R, self.f, self.p, self.OD, self.ACD))
+
+        return register_filename
+
+
                                                               # see /doc/sw_pll.rst for guidance on these settings
-def get_pll_solution(input_frequency, target_output_frequency, max_denom=80, min_F=200, ppm_max=2, fracmin=0.65, fracmax=0.95):
+def find_pll_config(input_frequency, target_output_frequency, max_denom=80, min_F=200, ppm_max=2, fracmin=0.65, fracmax=0.95, solver="inverse", cache=True, workers=1, select="min_F"):
+    """
+        Find a PLL configuration and LUT in the same way as get_pll_solution and return it as a pll_config.
+        No header or sidecar files are written. With cache=True the solution is read from and stored in the
+        on-disk solution cache, whose writes are atomic, so this is safe to call from several threads in one
+        process either way. The arguments are the same as get_pll_solution.
+    """
+    if select not in ("min_F", "pareto"):
+        raise ValueError(f"Unknown select {select}, must be min_F or pareto")
+
+    input_frequency_MHz = input_frequency / 1000000.0
+    target_output_frequency_MHz = target_output_frequency / 1000000.0
+    pfcmin = 6.0
+
+    # Suitable solutions have F greater than min_F and the nominal frac setting close to halfway between fracmin and
+    # fracmax so we have good range. Solutions are generated lowest F first so for min_F the first match is picked.
+    # For pareto the suitable solution ranked best by pll_calc.rank_pll_solutions is picked.
+
+    midway_tolerance = 0.10 # We need to be close to the midway point for nominal to allow good range + and -
+
+    def suitable(sln):
+        return sln.fb_div[0] > min_F and sln.fb_div[2] != 0 and isclose(sln.fb_div[1] / sln.fb_div[2], (fracmax + fracmin) / 2, rel_tol=midway_tolerance)
+
+    search_params = {"input_freq":input_frequency_MHz, "output_target":target_output_frequency_MHz, "ppm_error_max":int(ppm_max), "den_max":max_denom,
+                     "pfcmin":pfcmin, "fracmin":fracmin, "fracmax":fracmax, "min_F":min_F, "midway_tolerance":midway_tolerance, "solver":solver,
+                     "solver_version":solver_versions.get(solver), "select":select}
+    search_cache = solution_cache() if (cache and cache_enabled()) else None
+    cached = search_cache.get(search_params) if search_cache else None
+
+    if cached is not None:
+        idx, solution = cached
+    else:
+        idx, solution = None, None
+        solutions = iter_pll_solutions(input_freq=input_frequency_MHz,
+                                       output_target=target_output_frequency_MHz,
+                                       ppm_error_max=int(ppm_max),
+                                       den_max=max_denom,
+                                       pfcmin=pfcmin,
+                                       app=1,
+                                       fracmax=fracmax,
+                                       fracmin=fracmin,
+                                       solver=solver,
+                                       order="fb_div",
+                                       workers=workers)
+        if select == "min_F":
+            for i, sln in enumerate(solutions):
+                if suitable(sln):
+                    idx, solution = i, sln._asdict()
+                    break
+        else:
+            solutions = list(solutions)
+            ranked = rank_pll_solutions(filter(suitable, solutions), k=1, fracmin=fracmin, fracmax=fracmax)
+            if ranked:
+                idx, solution = solutions.index(ranked[0]), ranked[0]._asdict()
+        if solution is None:
+            raise ValueError(f"Unable to find solution that meets criteria of min_F: {min_F} and midway_tolerance: {midway_tolerance}")
+        if search_cache:
+            search_cache.put(search_params, [idx, solution])
+
+    # Get command line and put in comments to enable user to generate these offline
+    calc_script = Path(__file__).parent/"pll_calc.py"
+    #                       input freq,           app pll,  max denom,  output freq,  min phase comp freq, max ppm error,  raw, fractional range, make header
+    cmd = f"{calc_script} -i {input_frequency_MHz}  -a -m {max_denom} -t {target_output_frequency_MHz} -p {pfcmin} -e {int(ppm_max)} -r --fracmin {fracmin} --fracmax {fracmax} --header"
+
+    # Now convert to actual settings in register bitfields
+    return pll_config(input_frequency,
+                      F = int(solution["fb_div"][0] - 1),       # PLL integer multiplier
+                      R = int(solution["ref_div"] - 1),         # PLL integer divisor
+                      f = int(solution["fb_div"][1] - 1),       # PLL fractional multiplier
+                      p = int(solution["fb_div"][2] - 1),       # PLL fractional divisor
+                      OD = int(solution["op_div"] - 1),         # PLL output divider
+                      ACD = int(solution["fin_op_div"] - 1),    # PLL application clock divider
+                      output_frequency = 1000000.0 * solution["out_freq"],
+                      vco_freq = 1000000.0 * solution["vco_freq"],
+                      ppm = float(solution["ppm_error"]),       # PLL PPM error for requrested set frequency
+                      lut = lut_table(get_frac_list(max_denom, fracmin, fracmax), max_denom),
+                      cmd = cmd,
+                      solution_index = idx)
+
+
+def get_pll_solution(input_frequency, target_output_frequency, max_denom=80, min_F=200, ppm_max=2, fracmin=0.65, fracmax=0.95, solver="inverse", cache=True, workers=1, select="min_F"):
     """
         This is a wrapper function for pll_calc.py and allows it to be called programatically.
         It contains sensible defaults for the arguments and abstracts some of the complexity away from 
@@ -159,9 +402,11 @@ def get_pll_solution(input_frequency, target_output_frequency, max_denom=80, min
         Once run, this function saves two output files:
         - fractions.h which contains the fractional term lookup table, which is guarranteed monotonic (important for PI stability)
         - register_setup.h which contains the PLL settings in comments as well as register settings for init in the application 
+        Use find_pll_config instead to get the same solution in memory without writing these files.
 
-        This function and the underlying call to pll_calc may take several seconds to complete since it searches a range
-        of possible solutions numerically.
+        Every solution of the search is generated, lowest F first, by pll_calc.iter_pll_solutions and by default the
+        first one which meets the min_F and nominal fraction criteria is used. With select="pareto" the one of those
+        ranked best by pll_calc.rank_pll_solutions is used instead. A ValueError is raised if there is none.
         
         input_frequency         - The xcore clock frequency, normally the XTAL frequency
         nominal_ref_frequency   - The nominal input reference frequency
@@ -171,103 +416,19 @@ def get_pll_solution(input_frequency, target_output_frequency, max_denom=80, min
         ppm_max                 - (Optional) The allowable PPM deviation for the target nominal frequency. See/doc/sw_pll.rst for guidance
         fracmin                 - (Optional) The minimum fractional multiplier. See/doc/sw_pll.rst for guidance
         fracmax                 - (Optional) The maximum fractional multiplier. See/doc/sw_pll.rst for guidance
+        solver                  - (Optional) The pll_calc search implementation, "inverse" (fast), "vector" (exact ppm check) or "loop" (reference)
+        cache                   - (Optional) Use the on-disk cache of previous search results. See solution_cache.py
+        workers                 - (Optional) Number of processes to share the search between
+        select                  - (Optional) "min_F" to pick the suitable solution with the lowest F or "pareto" to rank them
 
     """
+    config = find_pll_config(input_frequency, target_output_frequency, max_denom=max_denom, min_F=min_F, ppm_max=ppm_max, fracmin=fracmin,
+                             fracmax=fracmax, solver=solver, cache=cache, workers=workers, select=select)
+    print(f"Picked output solution #{config.solution_index}: F: {config.F} R: {config.R} f: {config.f} p: {config.p} OD: {config.OD} ACD: {config.ACD}")
 
+    config.write_headers()
 
-
-    input_frequency_MHz = input_frequency / 1000000.0
-    target_output_frequency_MHz = target_output_frequency / 1000000.0
-    pfcmin = 6.0
-
-    solutions = find_pll(input_freq=input_frequency_MHz,
-                        output_target=target_output_frequency_MHz,
-                        ppm_error_max=int(ppm_max),
-                        den_max=max_denom,
-                        pfcmin=pfcmin,
-                        maxsol=500,
-                        app=1,
-                        raw = 1,
-                        header = 1,
-                        fracmax = fracmax,
-                        fracmin = fracmin)
-
-    solutions_sorted = sorted(solutions, key=lambda d: d["fb_div"][0])
-
-    possible_Fs = [sln["fb_div"][0] for sln in solutions_sorted]
-    print(f"Available F values: {possible_Fs}")
-
-    # Find first solution with F greater than min_F and where the nominal frac setting is close to halfway between
-    # fracmin and fracmax so we have good range
-
-    midway_tolerance = 0.10 # We need to be close to the midway point for nominal to allow good range + and -
-
-    idx = None
-    for i in range(len(possible_Fs)):
-        frac_nom_setting = solutions_sorted[i]['fb_div'][1] / solutions_sorted[i]['fb_div'][2]
-        print(possible_Fs[i], frac_nom_setting, isclose(frac_nom_setting, (fracmax + fracmin) / 2, rel_tol=midway_tolerance))
-        if possible_Fs[i] > min_F and isclose(frac_nom_setting, (fracmax + fracmin) / 2, rel_tol=midway_tolerance):
-            idx = i
-            break
-
-    if idx is None:
-        print(f"Unable to find solution that meets criteria of min_F: {min_F} and midway_tolerance: {midway_tolerance}")
-
-
-    solution = solutions_sorted[idx]
-    # print("**** SELECTED SOLN:", solution)
-
-    output_frequency = 1000000.0 * solution["out_freq"]
-    vco_freq = 1000000.0 * solution["vco_freq"]
-
-    # Now convert to actual settings in register bitfields
-    F = int(solution["fb_div"][0] - 1)      # PLL integer multiplier
-    R = int(solution["ref_div"] - 1)        # PLL integer divisor
-    f = int(solution["fb_div"][1] - 1)      # PLL fractional multiplier
-    p = int(solution["fb_div"][2] - 1)      # PLL fractional divisor
-    OD = int(solution["op_div"] - 1)        # PLL output divider
-    ACD = int(solution["fin_op_div"] - 1)   # PLL application clock divider
-    ppm = float(solution["ppm_error"])      # PLL PPM error for requrested set frequency
-
-    # Get command line and put in comments to enable user to generate these offline
-    calc_script = Path(__file__).parent/"pll_calc.py"
-    #                       input freq,           app pll,  max denom,  output freq,  min phase comp freq, max ppm error,  raw, fractional range, make header
-    cmd = f"{calc_script} -i {input_frequency_MHz}  -a -m {max_denom} -t {target_output_frequency_MHz} -p {pfcmin} -e {int(ppm_max)} -r --fracmin {fracmin} --fracmax {fracmax} --header"
-    
-    # Now use tools here to get the reg vals
-    app_pll_setup = app_pll_frac_calc(input_frequency_MHz * 1e6, F, R, f, p, OD, ACD)
-    register_setup_text = app_pll_setup.gen_register_file_text()
-
-
-    # Now get reg values and save to file
-    with open(register_file, "w") as reg_vals:
-        reg_vals.write(f"/* Autogenerated by {Path(__file__).name} using command:\n")
-        reg_vals.write(f"   {cmd}\n")
-        reg_vals.write(f"   Picked output solution #{idx}\n")
-        # reg_vals.write(f"\n{solution}\n\n") # This is verbose and contains the same info as below
-        reg_vals.write(f"   Input freq: {input_frequency}\n")
-        reg_vals.write(f"   F: {F}\n")
-        reg_vals.write(f"   R: {R}\n")
-        reg_vals.write(f"   f: {f}\n")
-        reg_vals.write(f"   p: {p}\n")
-        reg_vals.write(f"   OD: {OD}\n")
-        reg_vals.write(f"   ACD: {ACD}\n")
-        reg_vals.write(f"   Output freq: {output_frequency}\n")
-        reg_vals.write(f"   VCO freq: {vco_freq} */\n")
-        reg_vals.write("\n")
-
-
-        for reg in ["APP PLL CTL REG", "APP PLL DIV REG", "APP PLL FRAC REG"]:
-            regex = rf"({reg})\s+(0[xX][A-Fa-f0-9]+)"
-            match = re.search(regex, register_setup_text)
-            if match:
-                val = match.groups()[1]
-                reg_name = reg.replace(" ", "_")
-                line = f"#define {reg_name}  \t{val}\n"
-                reg_vals.write(line)
-
-
-    return output_frequency, vco_freq, F, R, f, p, OD, ACD, ppm 
+    return config.output_frequency, config.vco_freq, config.F, config.R, config.f, config.p, config.OD, config.ACD, config.ppm
 
 class pll_solution:
     """
@@ -275,10 +436,12 @@ class pll_solution:
     intended for programatic access from the tests. Creates a PLL setup and LUT and reads back the generated LUT
     """
     def __init__(self, *args, **kwargs):
-        self.output_frequency, self.vco_freq, self.F, self.R, self.f, self.p, self.OD, self.ACD, self.ppm = get_pll_solution(*args, **kwargs)
-        from .dco_model import lut_dco
-        dco = lut_dco("fractions.h")
-        self.lut, min_frac, max_frac = dco._read_lut_header("fractions.h")
+        self.config = find_pll_config(*args, **kwargs)
+        self.config.write_headers()
+
+        self.output_frequency, self.vco_freq, self.ppm = self.config.output_frequency, self.config.vco_freq, self.config.ppm
+        self.F, self.R, self.f, self.p, self.OD, self.ACD = self.config.F, self.config.R, self.config.f, self.config.p, self.config.OD, self.config.ACD
+        self.lut = self.config.lut.lut
 
 
 if __name__ == '__main__':
@@ -2,6 +2,7 @@
 # This Software is subject to the terms of the XMOS Public Licence: Version 1.
 
 from sw_pll.dco_model import lut_dco, sigma_delta_dco, lock_count_threshold
+from sw_pll import kernels
 import numpy as np
 
 
@@ -38,6 +39,12 @@ class pi_ctrl():
         Calculate the LUT setting from the input error
         """
 
+        if kernels.jit_enabled() and not self.verbose:
+            self.total_error, self.error_accum, self.error_accum_accum = kernels.pi_step(
+                float(error), self.Kp, self.Ki, self.Kii, kernels.windup_limit(self.i_windup_limit),
+                kernels.windup_limit(self.ii_windup_limit), self.error_accum, self.error_accum_accum)
+            return self.total_error
+
         # clamp integral terms to stop them irrecoverably drifting off.
         if self.i_windup_limit is None:
             self.error_accum = self.error_accum + error
@@ -76,11 +83,12 @@ class lut_pi_ctrl(pi_ctrl):
         desired response. The function run_sim allows for a plot of a step resopnse input which allows this
         to be done visually.
     """
-    def __init__(self, Kp, Ki, Kii=None, base_lut_index=None, verbose=False):
+    def __init__(self, Kp, Ki, Kii=None, base_lut_index=None, verbose=False, config=None):
         """
-        Create instance absed on specific control constants
+        Create instance absed on specific control constants.
+        The LUT is read from fractions.h unless a pll_config from app_pll_model.find_pll_config is passed.
         """        
-        self.dco = lut_dco()
+        self.dco = lut_dco(config=config)
         self.lut_lookup_function = self.dco.get_lut()
         lut_size = self.dco.get_lut_size()
         self.diff = 0.0                 # Most recent diff between expected and actual. Used by tests
@@ -1,7 +1,9 @@
 # Copyright 2023-2025 XMOS LIMITED.
 # This Software is subject to the terms of the XMOS Public Licence: Version 1.
 
-from sw_pll.app_pll_model import register_file, app_pll_frac_calc
+from sw_pll.app_pll_model import register_file, app_pll_frac_calc, lut_table
+from sw_pll.lut_sidecar import read_lut_sidecar
+from sw_pll import kernels
 import matplotlib.pyplot as plt
 import numpy as np
 import os
@@ -35,19 +37,39 @@ class lut_dco:
         used by the sw_pll simulation. It may be used directly but is generally used a sub class of error_to_pll_output_frequency.
     """
 
-    def __init__(self, header_file = "fractions.h", verbose=False):   # fixed header_file name by pll_calc.py 
+    def __init__(self, header_file = "fractions.h", verbose=False, frac_list=None, config=None):   # fixed header_file name by pll_calc.py 
         """
         Constructor for the LUT DCO. Reads the pre-calculated header filed and produces the LUT which contains
         the pll fractional register settings (16b) for each of the entries. Also a
+        If frac_list from pll_calc.get_frac_list is passed then the LUT is built directly from it instead of the header.
+        If a pll_config from app_pll_model.find_pll_config is passed then the LUT and PLL settings are taken from it
+        and no files are read. Otherwise the binary sidecar of the headers is used if it is up to date, see lut_sidecar.py.
         """
 
-        self.lut, self.min_frac, self.max_frac = self._read_lut_header(header_file)
-        input_freq, F, R, f, p, OD, ACD = self._parse_register_file(register_file)
-        self.app_pll = app_pll_frac_calc(input_freq, F, R, f, p, OD, ACD)
+        sidecar = read_lut_sidecar(header_file, register_file) if (config is None and frac_list is None) else None
+
+        if config is not None:
+            self.lut, self.min_frac, self.max_frac = config.lut.lut, config.lut.min_frac, config.lut.max_frac
+            self.app_pll = config.get_app_pll()
+        elif sidecar is not None:
+            self.lut, fracs, input_freq, settings = sidecar
+            self.min_frac, self.max_frac = float(fracs.min()), float(fracs.max())
+            self.app_pll = app_pll_frac_calc(input_freq, *settings)
+        else:
+            if frac_list is None:
+                self.lut, self.min_frac, self.max_frac = self._read_lut_header(header_file)
+            else:
+                self.lut, self.min_frac, self.max_frac = self._lut_from_frac_list(frac_list)
+            input_freq, F, R, f, p, OD, ACD = self._parse_register_file(register_file)
+            self.app_pll = app_pll_frac_calc(input_freq, F, R, f, p, OD, ACD)
 
         a = self.lut[self.get_lut_size() // 2]
         b = app_pll_frac_calc.frac_enable_mask
 
+        # The LUT is fixed so the output frequency for every entry is calculated once here
+        self.frequencies = self.app_pll.frequencies_from_frac_regs(self.lut.astype(np.int64) | app_pll_frac_calc.frac_enable_mask)
+        self._frequency_list = self.frequencies.tolist() # Faster to index one at a time than the array
+
         self.last_output_frequency = self.app_pll.update_frac_reg(self.lut[self.get_lut_size() // 2].astype(int) | app_pll_frac_calc.frac_enable_mask)
         self.lock_status = -1
         self.lock_count = lock_count_threshold
@@ -85,6 +107,15 @@ class lut_dco:
         # print(f"min_frac: {min_frac} max_frac: {max_frac}")
         return lut, min_frac, max_frac
 
+    @staticmethod
+    def _lut_from_frac_list(frac_list):
+        """
+        build the LUT from a list of (fraction, m, n) as generated by pll_calc
+        """
+        table = lut_table(frac_list, den_max=0)
+
+        return table.lut, table.min_frac, table.max_frac
+
     def _parse_register_file(self, register_file):
         """
             This method reads the pre-saved register setup comments from get_pll_solution and parses them into parameters that
@@ -124,14 +155,8 @@ class lut_dco:
         lut = self.get_lut()
         steps = np.size(lut)
 
-        register = int(lut[0])
-        min_freq = self.app_pll.update_frac_reg(register | app_pll_frac_calc.frac_enable_mask)
-
-        register = int(lut[steps // 2])
-        mid_freq = self.app_pll.update_frac_reg(register | app_pll_frac_calc.frac_enable_mask)
-
-        register = int(lut[-1])
-        max_freq = self.app_pll.update_frac_reg(register | app_pll_frac_calc.frac_enable_mask)
+        registers = lut[[0, steps // 2, -1]].astype(np.int64) | app_pll_frac_calc.frac_enable_mask
+        min_freq, mid_freq, max_freq = self.app_pll.frequencies_from_frac_regs(registers).tolist()
 
         ave_step_size = (max_freq - min_freq) / steps
 
@@ -153,11 +178,7 @@ class lut_dco:
         that it can produce.
         """
 
-        frequencies = []
-        for step in range(self.get_lut_size()):
-            register = int(self.lut[step])
-            self.app_pll.update_frac_reg(register | app_pll_frac_calc.frac_enable_mask)
-            frequencies.append(self.app_pll.get_output_frequency())
+        frequencies = self.app_pll.frequencies_from_frac_regs(self.lut.astype(np.int64) | app_pll_frac_calc.frac_enable_mask)
 
         plt.clf()
         plt.plot(frequencies, color='green', marker='.', label='frequency')
@@ -171,7 +192,8 @@ class lut_dco:
 
     def get_frequency_from_dco_control(self, dco_ctrl):
         """
-        given a set_point, a LUT, and an APP_PLL, calculate the frequency
+        given a set_point, a LUT, and an APP_PLL, calculate the frequency.
+        The frequency is looked up from the table calculated at construction so app_pll is not updated.
         """
 
         if dco_ctrl is None:
@@ -179,6 +201,13 @@ class lut_dco:
 
         num_entries = self.get_lut_size()
 
+        if kernels.jit_enabled():
+            set_point, self.lock_status, self.lock_count = kernels.lut_step(float(dco_ctrl), num_entries, self.lock_status,
+                                                                            self.lock_count, lock_count_threshold)
+            output_frequency = self._frequency_list[set_point]
+            self.last_output_frequency = output_frequency
+            return output_frequency, self.lock_status
+
         set_point = int(dco_ctrl)
         if set_point < 0:
             set_point = 0
@@ -195,12 +224,49 @@ class lut_dco:
             else:
                 self.lock_status = 0
 
-        register = int(self.lut[set_point])
-
-        output_frequency = self.app_pll.update_frac_reg(register | app_pll_frac_calc.frac_enable_mask)
+        output_frequency = self._frequency_list[set_point]
         self.last_output_frequency = output_frequency
         return output_frequency, self.lock_status
 
+    def get_frequencies_from_dco_controls(self, dco_ctrls):
+        """
+        Vectorised get_frequency_from_dco_control for a whole trajectory of dco_ctrl values, where NaN stands
+        for None. Returns arrays of the output frequencies and lock statuses, identical to calling
+        get_frequency_from_dco_control for each value in turn, and leaves the lock state as that would.
+        """
+        dco_ctrls = np.asarray(dco_ctrls, dtype=np.float64)
+        num_entries = self.get_lut_size()
+        index = np.arange(len(dco_ctrls))
+
+        valid = ~np.isnan(dco_ctrls)
+        set_points = np.trunc(np.where(valid, dco_ctrls, 0.0)) # Same rounding as int()
+        low = valid & (set_points < 0)
+        high = valid & (set_points >= num_entries)
+        in_range = valid & ~low & ~high
+        set_points = np.clip(set_points, 0, num_entries - 1).astype(np.int64)
+
+        # Each value's lock status depends on the last out of range value (or the starting state if there was
+        # none) and on how many in range values there have been since, which counts down lock_count.
+        last_event = np.maximum.accumulate(np.where(low | high, index, -1))
+        in_range_count = np.cumsum(in_range)
+        has_event = last_event >= 0
+        event = np.maximum(last_event, 0)
+        since_event = in_range_count - np.where(has_event, in_range_count[event], 0)
+        event_status = np.where(has_event, np.where(low[event], -1, 1), self.lock_status)
+        event_count = np.where(has_event, lock_count_threshold, self.lock_count)
+        lock_statuses = np.where(since_event <= event_count, event_status, 0)
+
+        # None repeats the last output frequency
+        last_valid = np.maximum.accumulate(np.where(valid, index, -1))
+        frequencies = np.where(last_valid >= 0, self.frequencies[set_points[np.maximum(last_valid, 0)]], self.last_output_frequency)
+
+        if len(dco_ctrls):
+            self.lock_status = int(lock_statuses[-1])
+            self.lock_count = int(max(event_count[-1] - since_event[-1], 0))
+            self.last_output_frequency = float(frequencies[-1])
+
+        return frequencies, lock_statuses
+
 
 
 ######################################
@@ -222,6 +288,11 @@ class sdm:
         self.sdm_x2 = 0
         self.sdm_x3 = 0
 
+        # Cycle detection state for modulate_block
+        self._block_key = None
+        self._cycle_search = None
+        self._cycle = None
+
     # # generalized version without fixed point shifts. WIP!!
     # # takes a Q20 number from 60000 to 980000 (or 0.0572 to 0.934)
     # # This is work in progress - the integer model matches the firmware better
@@ -257,6 +328,10 @@ class sdm:
         # Third order, 9 level output delta sigma. 20 bit unsigned input.
         sdm_in = int(sdm_in)
 
+        if kernels.jit_enabled():
+            sdm_out, self.sdm_x1, self.sdm_x2, self.sdm_x3 = kernels.sdm_step(sdm_in, self.sdm_x1, self.sdm_x2, self.sdm_x3)
+            return sdm_out
+
         sdm_out = ((self.sdm_x3<<4) + (self.sdm_x3<<1)) >> 13
 
         if sdm_out > 8:
@@ -270,6 +345,98 @@ class sdm:
 
         return sdm_out
 
+    def modulate_block(self, sdm_in, n):
+        """
+        Run the modulator n times with a constant input and return the output steps as a uint8 array.
+        Bit exact with calling do_sigma_delta_int n times.
+
+        With a constant input the state (x1, x2, x3) is eventually periodic. The cycle is searched for
+        (Brent's method) across consecutive calls with the same input, which is how the simulator calls
+        this once per control period. Once found, the cached output pattern is replayed and the state is
+        advanced from it with cumulative sums rather than a step at a time.
+        With the compiled kernels enabled the search runs in kernels.sdm_cycle_search.
+        """
+        sdm_in = int(sdm_in)
+        x1, x2, x3 = self.sdm_x1, self.sdm_x2, self.sdm_x3
+
+        if (sdm_in, x1, x2, x3) != self._block_key:
+            # New input, or the state was changed by do_sigma_delta_int
+            self._cycle = None
+            self._cycle_search = ((x1, x2, x3), 1, 0, [])
+
+        codes = []
+        if self._cycle is None and kernels.jit_enabled():
+            (t1, t2, t3), power, lam, recent = self._cycle_search
+            codes, x1, x2, x3, t1, t2, t3, power, lam, found, reset = kernels.sdm_cycle_search(
+                sdm_in, int(n), x1, x2, x3, t1, t2, t3, power, lam)
+            if reset >= 0:
+                recent = []
+            recent.extend(codes[max(reset, 0):].tolist())
+            if found:
+                self._cycle = [np.array(recent, dtype=np.uint8), 0]
+            self._cycle_search = ((t1, t2, t3), power, lam, recent)
+
+        elif self._cycle is None:
+            (t1, t2, t3), power, lam, recent = self._cycle_search
+            append = codes.append
+            record = recent.append
+            while len(codes) < n:
+                sdm_out = ((x3<<4) + (x3<<1)) >> 13
+                if sdm_out > 8:
+                    sdm_out = 8
+                elif sdm_out < 0:
+                    sdm_out = 0
+
+                x3 += (x2>>5) - (sdm_out<<9) - (sdm_out<<8)
+                x2 += (x1>>5) - (sdm_out<<14)
+                x1 += sdm_in - (sdm_out<<17)
+                append(sdm_out)
+                record(sdm_out)
+
+                lam += 1
+                if x1 == t1 and x2 == t2 and x3 == t3:
+                    # Back at the saved state so the outputs since then repeat from here
+                    self._cycle = [np.array(recent, dtype=np.uint8), 0]
+                    break
+                if lam == power:
+                    t1, t2, t3 = x1, x2, x3
+                    power <<= 1
+                    lam = 0
+                    recent = []
+                    record = recent.append
+            self._cycle_search = ((t1, t2, t3), power, lam, recent)
+
+        codes = np.array(codes, dtype=np.uint8)
+        if self._cycle is not None and len(codes) < n:
+            pattern, phase = self._cycle
+            replay = np.resize(np.roll(pattern, -phase), n - len(codes))
+            self._cycle[1] = (phase + len(replay)) % len(pattern)
+            x1, x2, x3 = self._advance_state(x1, x2, x3, sdm_in, replay)
+            codes = np.concatenate((codes, replay))
+
+        self.sdm_x1, self.sdm_x2, self.sdm_x3 = x1, x2, x3
+        self._block_key = (sdm_in, x1, x2, x3)
+
+        return codes
+
+    @staticmethod
+    def _advance_state(x1, x2, x3, sdm_in, codes):
+        """
+        The state after running the modulator with a known sequence of output steps
+        """
+        codes = codes.astype(np.int64)
+        steps = np.arange(len(codes), dtype=np.int64)
+        fed_back = np.cumsum(codes) - codes                         # Outputs before each step
+
+        x1_seq = x1 + steps * sdm_in - (fed_back << 17)            # x1 at the start of each step
+        x2_inc = (x1_seq >> 5) - (codes << 14)
+        x2_seq = x2 + np.cumsum(x2_inc) - x2_inc                    # x2 at the start of each step
+        x3_inc = (x2_seq >> 5) - (codes << 9) - (codes << 8)
+
+        return (x1 + len(codes) * sdm_in - (int(codes.sum()) << 17),
+                x2 + int(x2_inc.sum()),
+                x3 + int(x3_inc.sum()))
+
 
 class sigma_delta_dco(sdm):
     """
@@ -304,20 +471,31 @@ class sigma_delta_dco(sdm):
         self.sdm_out = 0
         self.f = 0
 
+        # Output frequency of each SDM step. Step 0 is frac off, steps 1 to 8 inclusive are f = step - 1
+        steps = np.arange(self.p_value + 1)
+        self.frequencies = self.app_pll.frequencies_from_frac(np.maximum(steps - 1, 0), self.p_value - 1, steps > 0)
+        self._frequency_list = self.frequencies.tolist() # Faster to index one at a time than the array
+
         sdm.__init__(self)
 
     def _sdm_out_to_freq(self, sdm_out):
         """
         Translate the SDM steps to register settings
         """
-        if sdm_out == 0:
-            # Step 0
-            self.f = 0
-            return self.app_pll.update_frac(self.f, self.p_value - 1, False)
-        else:
-            # Steps 1 to 8 inclusive
-            self.f = sdm_out - 1
-            return self.app_pll.update_frac(self.f, self.p_value - 1, True)
+        # Set the App PLL registers to match without recalculating the frequency
+        self.f = 0 if sdm_out == 0 else sdm_out - 1
+        self.app_pll.f = self.f
+        self.app_pll.p = self.p_value - 1
+        self.app_pll.fractional_enable = sdm_out != 0
+        self.app_pll.output_frequency = self._frequency_list[sdm_out]
+
+        return self.app_pll.output_frequency
+
+    def codes_to_frequency(self, codes):
+        """
+        Convert an array of SDM steps, for example from modulate_block, to output frequencies
+        """
+        return self.frequencies[codes]
 
     def do_modulate(self, input):
         """
@@ -330,14 +508,27 @@ class sigma_delta_dco(sdm):
   
         return frequency
 
+    def modulate_block(self, input, n):
+        """
+        Input a control value for n SDM steps and return the steps (0 to 8) as a uint8 array.
+        Use codes_to_frequency to get the output frequencies. The final state is the same as
+        after n calls to do_modulate.
+        """
+        codes = sdm.modulate_block(self, input, n)
+        if len(codes):
+            self.sdm_out = int(codes[-1])
+            self._sdm_out_to_freq(self.sdm_out)
+
+        return codes
+
     def print_stats(self):
         """
         Returns a summary of the SDM range and steps.
         """
 
         steps = self.p_value + 1 # +1 we have frac off state
-        min_freq = self._sdm_out_to_freq(0)
-        max_freq = self._sdm_out_to_freq(self.p_value)
+        min_freq = self._frequency_list[0]
+        max_freq = self._frequency_list[self.p_value]
         target_output_frequency = self.profiles[self.profile]["output_frequency"]
 
 
@@ -359,12 +550,8 @@ class sigma_delta_dco(sdm):
         that it can produce.
         """
 
-        frequencies = []
-        for step in range(self.p_value + 1): # +1 since p value is +1 in datasheet
-            frequencies.append(self._sdm_out_to_freq(step))
-
         plt.clf()
-        plt.plot(frequencies, color='green', marker='.', label='frequency')
+        plt.plot(self.frequencies, color='green', marker='.', label='frequency')
         plt.title('PLL fractional range', fontsize=14)
         plt.xlabel(f'SDM step', fontsize=14)
         plt.ylabel('Frequency', fontsize=10)
@@ -0,0 +1,166 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+# This file contains compiled versions of the per step model functions: the SDM, the PI controller and
+# the LUT DCO lookup. They are used automatically when Numba is installed, unless the environment variable
+# SW_PLL_JIT is set to 0. Otherwise, or when disabled with set_jit_enabled(False), the models run their
+# own pure Python code.
+#
+# Each kernel is a plain function of its inputs and state which returns the outputs and the new state,
+# with the same arithmetic as the model method it replaces so the results are bit exact. Without Numba
+# the kernels are still callable as ordinary Python functions.
+
+import math
+import os
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+jit_available = numba is not None
+
+
+def _jit(function):
+    return numba.njit(cache=True)(function) if jit_available else function
+
+
+@_jit
+def sdm_step(sdm_in, x1, x2, x3):
+    """
+    sdm.do_sigma_delta_int. Returns (sdm_out, x1, x2, x3)
+    """
+    sdm_out = ((x3<<4) + (x3<<1)) >> 13
+    if sdm_out > 8:
+        sdm_out = 8
+    if sdm_out < 0:
+        sdm_out = 0
+
+    x3 += (x2>>5) - (sdm_out<<9) - (sdm_out<<8)
+    x2 += (x1>>5) - (sdm_out<<14)
+    x1 += sdm_in - (sdm_out<<17)
+
+    return sdm_out, x1, x2, x3
+
+
+@_jit
+def sdm_block(sdm_in, n, x1, x2, x3):
+    """
+    sdm.modulate_block. Returns (uint8 array of sdm_out, x1, x2, x3)
+    """
+    codes = np.empty(n, dtype=np.uint8)
+    for i in range(n):
+        sdm_out, x1, x2, x3 = sdm_step(sdm_in, x1, x2, x3)
+        codes[i] = sdm_out
+
+    return codes, x1, x2, x3
+
+
+@_jit
+def sdm_batch_block(sdm_in, n, x1, x2, x3):
+    """
+    sim_sw_pll_sd_batch.do_sigma_delta_block, one instance after another. sdm_in and the states are arrays
+    of one per instance and the states are updated in place. Returns a uint8 array of sdm_out of shape
+    (instances, n)
+    """
+    codes = np.empty((len(sdm_in), n), dtype=np.uint8)
+    for lane in range(len(sdm_in)):
+        lane_codes, x1[lane], x2[lane], x3[lane] = sdm_block(sdm_in[lane], n, x1[lane], x2[lane], x3[lane])
+        codes[lane] = lane_codes
+
+    return codes
+
+
+@_jit
+def sdm_cycle_search(sdm_in, n, x1, x2, x3, t1, t2, t3, power, lam):
+    """
+    Up to n steps of the cycle search in sdm.modulate_block, stopping early when the state is back at
+    the saved state (t1, t2, t3). Returns (uint8 array of sdm_out, x1, x2, x3, t1, t2, t3, power, lam,
+    found, reset) where reset is the index of the output after the last time the saved state was moved,
+    or -1 if it was not moved.
+    """
+    codes = np.empty(n, dtype=np.uint8)
+    found = False
+    reset = -1
+    i = 0
+    while i < n:
+        sdm_out, x1, x2, x3 = sdm_step(sdm_in, x1, x2, x3)
+        codes[i] = sdm_out
+        i += 1
+
+        lam += 1
+        if x1 == t1 and x2 == t2 and x3 == t3:
+            found = True
+            break
+        if lam == power:
+            t1, t2, t3 = x1, x2, x3
+            power <<= 1
+            lam = 0
+            reset = i
+
+    return codes[:i], x1, x2, x3, t1, t2, t3, power, lam, found, reset
+
+
+@_jit
+def pi_step(error, Kp, Ki, Kii, i_windup_limit, ii_windup_limit, error_accum, error_accum_accum):
+    """
+    pi_ctrl.do_control_from_error. An infinite windup limit stands for None.
+    Returns (total_error, error_accum, error_accum_accum)
+    """
+    error_accum = min(max(error_accum + error, -i_windup_limit), i_windup_limit)
+    error_accum_accum = min(max(error_accum_accum + error_accum, -ii_windup_limit), ii_windup_limit)
+
+    error_p = Kp * error
+    error_i = Ki * error_accum
+    error_ii = Kii * error_accum_accum
+
+    return error_p + error_i + error_ii, error_accum, error_accum_accum
+
+
+@_jit
+def lut_step(dco_ctrl, num_entries, lock_status, lock_count, lock_count_threshold):
+    """
+    lut_dco.get_frequency_from_dco_control for a dco_ctrl which is not None.
+    Returns (set_point, lock_status, lock_count)
+    """
+    set_point = int(dco_ctrl)
+    if set_point < 0:
+        return 0, -1, lock_count_threshold
+    if set_point >= num_entries:
+        return num_entries - 1, 1, lock_count_threshold
+    if lock_count > 0:
+        return set_point, lock_status, lock_count - 1
+
+    return set_point, 0, lock_count
+
+
+def windup_limit(limit):
+    """
+    Convert a pi_ctrl windup limit to the form pi_step takes
+    """
+    return math.inf if limit is None else float(limit)
+
+
+_enabled = jit_available and os.environ.get("SW_PLL_JIT", "1") != "0"
+
+
+def jit_enabled():
+    """
+    True if the models are using the compiled kernels
+    """
+    return _enabled
+
+
+def set_jit_enabled(enabled):
+    """
+    Switch the models between the compiled kernels and their pure Python code. Returns the previous setting.
+    The kernels can only be enabled when Numba is installed.
+    """
+    global _enabled
+    previous = _enabled
+    _enabled = bool(enabled) and jit_available
+
+    return previous
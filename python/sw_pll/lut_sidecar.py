@@ -0,0 +1,136 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+# This file contains a compact binary copy of fractions.h and the register setup from register_setup.h,
+# written alongside the headers by pll_config.write_headers. lut_dco memory maps it, when it is present
+# and up to date, rather than parsing the header text. Mapped tables are shared between lut_dco instances.
+#
+# File layout, all little endian:
+#     header      - sidecar_header_dtype below
+#     regs        - uint16 LUT register values, num_entries long
+#     padding     - to an 8 byte boundary
+#     fracs       - float64 fraction values, num_entries long
+#
+# The header holds a hash of each of the text files it was made from. If either has been changed since,
+# for example by running pll_calc.py --header, the sidecar is ignored and the text is parsed as before.
+# The text files are only hashed again when their size or modification time changes.
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+sidecar_magic = b"SWPLLLUT"
+sidecar_version = 1
+
+sidecar_header_dtype = np.dtype([("magic", "S8"), ("version", "<u4"), ("num_entries", "<u4"), ("input_freq", "<f8"),
+                                 ("settings", "<i4", (6,)),     # F, R, f, p, OD, ACD as used by app_pll_frac_calc
+                                 ("sources", "u1", (2, 20))])   # sha1 of the fractions and register setup headers
+
+_mapped_sidecars = {}   # Resolved path -> ((size, mtime), lut, fracs, input_freq, settings, sources)
+_checked_sources = {}   # Resolved path -> (sidecar (size, mtime), headers (size, mtime)) whose hashes matched
+
+
+def sidecar_path(header_file):
+    """
+    The sidecar for a fractions header, for example fractions.bin for fractions.h
+    """
+    return Path(header_file).with_suffix(".bin")
+
+
+def _source_hash(filename):
+    with open(filename, "rb") as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+def _file_stat(filename):
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def write_lut_sidecar(header_file, register_filename, lut, fracs, input_freq, settings):
+    """
+    Write the sidecar for header_file. Call after both header_file and register_filename have been written.
+    Failure to write is not an error since lut_dco can always parse the headers.
+    """
+    path = sidecar_path(header_file)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+
+    header = np.zeros(1, dtype=sidecar_header_dtype)
+    header["magic"] = sidecar_magic
+    header["version"] = sidecar_version
+    header["num_entries"] = len(lut)
+    header["input_freq"] = input_freq
+    header["settings"] = settings
+
+    regs = np.asarray(lut, dtype="<u2")
+    padding = -(sidecar_header_dtype.itemsize + regs.nbytes) % 8
+    try:
+        header["sources"] = np.frombuffer(_source_hash(header_file) + _source_hash(register_filename), dtype=np.uint8).reshape(2, 20)
+        with open(tmp_path, "wb") as f:
+            f.write(header.tobytes())
+            f.write(regs.tobytes())
+            f.write(bytes(padding))
+            f.write(np.asarray(fracs, dtype="<f8").tobytes())
+        os.replace(tmp_path, path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+
+
+def read_lut_sidecar(header_file, register_filename):
+    """
+    Return (lut, fracs, input_freq, settings) for header_file from its sidecar, or None if there is no usable
+    sidecar or the headers have changed since it was written. lut and fracs are read only memory mapped arrays,
+    shared by every caller until the sidecar file changes.
+    """
+    path = sidecar_path(header_file)
+    try:
+        stat = path.stat()
+        key = str(path.resolve())
+    except OSError:
+        return None
+
+    entry = _mapped_sidecars.get(key)
+    if entry is None or entry[0] != (stat.st_size, stat.st_mtime_ns):
+        entry = _map_sidecar(path, stat)
+        if entry is None:
+            return None
+        _mapped_sidecars[key] = entry
+
+    try:
+        checked = (entry[0], (_file_stat(header_file), _file_stat(register_filename)))
+        if _checked_sources.get(key) != checked:
+            if (_source_hash(header_file), _source_hash(register_filename)) != entry[5]:
+                return None
+            _checked_sources[key] = checked
+    except OSError:
+        return None
+
+    return entry[1:5]
+
+
+def _map_sidecar(path, stat):
+    """
+    Check the sidecar header and map the tables
+    """
+    if stat.st_size < sidecar_header_dtype.itemsize:
+        return None
+    header = np.fromfile(path, dtype=sidecar_header_dtype, count=1)[0]
+    if header["magic"] != sidecar_magic or header["version"] != sidecar_version or header["num_entries"] == 0:
+        return None
+
+    num_entries = int(header["num_entries"])
+    regs_offset = sidecar_header_dtype.itemsize
+    fracs_offset = regs_offset + 2 * num_entries
+    fracs_offset += -fracs_offset % 8
+    if stat.st_size != fracs_offset + 8 * num_entries:
+        return None
+
+    lut = np.memmap(path, dtype="<u2", mode="r", offset=regs_offset, shape=(num_entries,))
+    fracs = np.memmap(path, dtype="<f8", mode="r", offset=fracs_offset, shape=(num_entries,))
+    settings = tuple(int(setting) for setting in header["settings"])
+    sources = tuple(source.tobytes() for source in header["sources"])
+
+    return (stat.st_size, stat.st_mtime_ns), lut, fracs, float(header["input_freq"]), settings, sources
@@ -38,12 +38,27 @@
 # All frequencies are in MHz.
 
 import math
+import bisect
+import concurrent.futures
+import functools
+import heapq
+import itertools
+import sys
+from collections import namedtuple
+from fractions import Fraction
 from operator import itemgetter
 
+import numpy as np
+
+from sw_pll.solution_cache import solution_cache, cache_enabled
+
 import argparse
 
 
-def print_regs(op_div, fb_div, ref_div, fin_op_div, app = 0):
+def get_regs(op_div, fb_div, ref_div, fin_op_div, app = 0):
+  """
+  Register values for a solution as a dict of register name to value, in the order print_regs shows them
+  """
   if app:
     app_pll_ctl_reg = (1 << 27) | (((op_div)-1) << 23) | ((int(fb_div[0])-1) << 8) | (ref_div-1)
     app_pll_div_reg = (1 << 31) | (fin_op_div-1)
@@ -52,14 +67,15 @@ def print_regs(op_div, fb_div, ref_div, fin_op_div, app = 0):
       #print(fb_div)
       app_pll_frac_reg = (1 << 31) | ((fb_div[1]-1) << 8) | (fb_div[2]-1)
 
-    print('APP_PLL_CTL_REG 0x' + '{:08X}'.format(app_pll_ctl_reg))
-    print('APP_PLL_DIV_REG 0x' + '{:08X}'.format(app_pll_div_reg))
-    print('APP_PLL_FRAC_REG 0x' + '{:08X}'.format(app_pll_frac_reg))
+    return {'APP_PLL_CTL_REG': app_pll_ctl_reg, 'APP_PLL_DIV_REG': app_pll_div_reg, 'APP_PLL_FRAC_REG': app_pll_frac_reg}
   else:
     pll_ctl_reg = (((op_div)-1) << 23) | ((int(fb_div[0])-1) << 8) | (ref_div-1)
     pll_div_reg = fin_op_div-1
-    print('PLL_CTL_REG 0x' + '{:08X}'.format(pll_ctl_reg))
-    print('SWITCH/CORE_DIV_REG 0x' + '{:08X}'.format(pll_div_reg))
+    return {'PLL_CTL_REG': pll_ctl_reg, 'SWITCH/CORE_DIV_REG': pll_div_reg}
+
+def print_regs(op_div, fb_div, ref_div, fin_op_div, app = 0):
+  for name, value in get_regs(op_div, fb_div, ref_div, fin_op_div, app).items():
+    print(name + ' 0x' + '{:08X}'.format(value))
 
 def print_solution(ppm_error, input_freq, out_freq, vco_freq, ref_div, fb_div, op_div, fin_op_div, app = 0):
   fb_div_string = '{:4d}'.format(int(fb_div[0])) + ", FRAC " + '{:1.3f}'.format(fb_div[0]-int(fb_div[0])) + " (m = " + '{:3d}'.format(fb_div[1]) + ", n = " + '{:3d}'.format(fb_div[2]) + ")"
@@ -77,15 +93,398 @@ def print_solution_set(solutions, raw = 0, app = 0):
     print_solution(solution['ppm_error'], solution['input_freq'], solution['out_freq'], solution['vco_freq'], solution['ref_div'], solution['fb_div'], solution['op_div'], solution['fin_op_div'], app)
 
 
-def find_pll(input_freq = 24, output_target = 600, ppm_error_max = 0, den_max = 0, pfcmin = 1.0, maxsol = 200, app = 0, raw = 0, header = 0, fracmax = 1.0, fracmin = 0.0):
-    # PLL Reference divider (R) 1-64
-    ref_div_list = list(range(1,65))
+# Actual Phase Comparator Limits
+pc_freq_min_limit = 0.22 # 220kHz
+pc_freq_max = 1800.0 # 1.8GHz
+
+# Actual VCO Limits (/1 output from PLL goes from 360 - 1800MHz so before the /2 this is 720 - 3600MHz)
+vco_freq_min = 720.0 #720MHz
+vco_freq_max = 3600.0 #3.6GHz
+
+# New constraint of /1 output of PLL being 800MHz max (Both Core and App PLLs)
+# So this doesn't constrain VCO freq becuase you have the output divider.
+pll_out_max = 800.0 # 800MHz
+
+# Divider ranges from the Macro docs
+ref_div_max = 64
+fb_div_max = 8192
+op_div_max = 8
+fin_op_div_max = 65536
+
+
+@functools.lru_cache(maxsize=32)
+def get_frac_list(den_max, fracmin = 0.0, fracmax = 1.0):
+    """
+    Returns the fractional-n options as a tuple of (fraction, m, n) in increasing order. Fraction is m/n with 0 < m < n <= den_max
+    and fracmin < m/n < fracmax.
+
+    Only m/n in lowest terms is included. For example 1/2 and 2/4 both result in a divide ratio of 0.5 but 1/2 is preferable as the
+    denominator is lower and so it will cause Phase Freq Comparator jitter to be at higher freq and so will be filtered more by the
+    analogue loop filter.
+
+    The fractions are generated in order by walking the Farey sequence of order den_max, starting from the term just below fracmin,
+    so no sorting or de-duplication is needed. Results are cached so the solver, header file and LUT all share the same table.
+    """
+    if den_max < 2:
+      return ()
+
+    # Largest fraction a/b <= fracmin with b <= den_max. This is the term in the sequence just before the ones we want.
+    lower = Fraction(max(fracmin, 0.0))
+    a, b = 0, 1
+    for den in range(1, den_max+1):
+      num = math.floor(lower * den)
+      if num * b > a * den:
+        a, b = num, den
+
+    # The next term c/d is the smallest fraction above a/b with d <= den_max
+    c, d = a // b + 1, 1
+    for den in range(2, den_max+1):
+      num = (a * den) // b + 1
+      if num * d < c * den:
+        c, d = num, den
 
+    frac_list = []
+    while c < d:
+      frac = float(c)/float(d)
+      if (frac >= fracmax):
+        break
+      if (fracmin < frac):
+        frac_list.append((frac, c, d)) # We store the fraction as a float plus the integer numerator and denominator.
+      # Next term in the Farey sequence from the previous two
+      k = (den_max + b) // d
+      a, b, c, d = c, d, k * c - a, k * d - b
+
+    return tuple(frac_list)
+
+def write_frac_header(frac_list, den_max, filename = "fractions.h"):
+    """
+    Output a header file containing the list of fractions as register values
+    """
+    with open(filename, "w") as f:
+      print("// Header file listing fraction options searched", file=f)
+      print("// These values to go in the bottom 16 bits of the secondary PLL fractional-n divider register.", file=f)
+      print("short frac_values_" + str(den_max) + "[" + str(len(frac_list)) +"] = {", file=f)
+      for index, item in enumerate(frac_list):
+        frac_str = str(item[1]) + "/" + str(item[2])
+        frac_str_line = "Index: {:>3} ".format(index) + 'Fraction: {:>5}'.format(frac_str) + " = {0:.4f}".format(item[0])
+        print("0x" + format(  (((item[1]-1) << 8) | (item[2]-1)),'>04X') + ", // " + frac_str_line, file=f)
+      print("};", file=f)
+
+def _iter_fb_div(frac_list, pc_freq):
+    """
+    Lazily generate the feedback divider options [value, m, n] in increasing order. Only integer parts for which the
+    VCO could be in range for this PFC frequency are generated and nothing is stored, so memory use does not depend on den_max.
+    """
+    fb_int_lo = max(1, math.floor(vco_freq_min / pc_freq) - 1)
+    fb_int_hi = min(fb_div_max, math.ceil(vco_freq_max / pc_freq) + 1)
+    for i in range(fb_int_lo, fb_int_hi+1):
+      yield [i,0,0] # This is when not using frac-n mode.
+      for item in frac_list:
+        yield [i+item[0], item[1], item[2]]
+
+def _loop_ref_div(input_freq, ref_div, output_target, ppm_error_max, frac_list, pc_freq_min, maxsol, app):
+    """
+    Reference search for a single reference divider which walks every divider combination in turn. Slow but simple.
+    """
     # PLL Output divider (OD) 1-8
-    op_div_list = list(range(1,9))
+    op_div_list = range(1,op_div_max+1)
 
     # Post PLL output divider (FOD) 1-65536
-    fin_op_div_list = list(range(1,65537))
+    fin_op_div_list = range(1,fin_op_div_max+1)
+
+    raw_solutions = []
+
+    pc_freq = input_freq/ref_div
+    if (pc_freq_min <= pc_freq <= pc_freq_max): # Check pc clock is in valid freq range.
+      for fb_div in _iter_fb_div(frac_list, pc_freq): # Feedback divider 1-8192, integer and fractional portions.
+        vco_freq = pc_freq * fb_div[0]
+        if (vco_freq_min <= vco_freq <= vco_freq_max): # Check vco is in valid freq range.
+          for op_div in op_div_list:
+            pll_out_freq = vco_freq/(2*op_div)
+            if (pll_out_freq <= pll_out_max): # Check PLL out freq is in valid freq range.
+              for fin_op_div in fin_op_div_list:
+                if (len(raw_solutions) >= maxsol): # Stop when we've reached the max number of raw solutions
+                  break
+                # See if our output freq is what we want?
+                out_freq = vco_freq/(2*op_div*fin_op_div)
+                if app:
+                  out_freq = out_freq / 2 # fixed /2 for 50/50 duty cycle on app_clk output
+                # Calculate parts per million error
+                ppm_error = ((out_freq - output_target)/output_target) * 1000000.0
+                if (abs(ppm_error) <= (ppm_error_max+0.01)): # Hack a tiny additional error in to handle the floating point calc errors.
+                  raw_solutions.append({'ppm_error':ppm_error, 'input_freq':input_freq, 'out_freq':out_freq, 'vco_freq':vco_freq, 'ref_div':ref_div, 'fb_div':fb_div, 'op_div':op_div, 'fin_op_div':fin_op_div})
+                if (out_freq < output_target):
+                  break
+
+    return raw_solutions
+
+def _inverse_ref_div(input_freq, ref_div, output_target, ppm_error_max, frac_list, pc_freq_min, maxsol, app, frac_values = None):
+    """
+    Inverse solve for a single reference divider. Rather than walking every feedback divider, for each (OD, FOD) we
+    calculate the feedback ratio needed to hit the target and bisect the sorted fraction values for the few candidates
+    close to it. Every candidate is then checked using exactly the same calculation as _search_loop so the solutions
+    and their ordering are identical, just found much faster.
+    """
+    pc_freq = input_freq/ref_div
+    if not (pc_freq_min <= pc_freq <= pc_freq_max): # Check pc clock is in valid freq range.
+      return []
+
+    if frac_values is None:
+      frac_values = [item[0] for item in frac_list]
+
+    # Search window slightly wider than the ppm limit. The exact check below decides what is kept.
+    rel_window = (ppm_error_max + 0.01) / 1000000.0 + 1e-9
+    app_div = 2 if app else 1
+
+    candidates = []
+    for op_div in range(1,op_div_max+1):
+      vco_max = min(vco_freq_max, pll_out_max * 2 * op_div)
+      # Range of FOD that can get from a valid VCO frequency to the target
+      fin_op_div_lo = max(1, math.floor(vco_freq_min / (2 * op_div * app_div * output_target * (1 + rel_window))) - 1)
+      fin_op_div_hi = min(fin_op_div_max, math.ceil(vco_max / (2 * op_div * app_div * output_target * (1 - rel_window))) + 1)
+
+      for fin_op_div in range(fin_op_div_lo, fin_op_div_hi+1):
+        # Feedback ratio needed to exactly hit the target, and the window around it
+        fb_target = output_target * (2 * op_div * fin_op_div * app_div) / pc_freq
+        fb_lo = fb_target * (1 - rel_window)
+        fb_hi = fb_target * (1 + rel_window)
+
+        for i in range(max(1, math.floor(fb_lo)), min(fb_div_max, math.floor(fb_hi)) + 1):
+          if fb_lo <= i:
+            candidates.append(((i, 0), [i,0,0], op_div, fin_op_div))
+          for idx in range(bisect.bisect_left(frac_values, fb_lo - i), bisect.bisect_right(frac_values, fb_hi - i)):
+            item = frac_list[idx]
+            candidates.append(((i, idx + 1), [i+item[0], item[1], item[2]], op_div, fin_op_div))
+
+    # Put into the same order the loop search finds them: FD, OD then FOD
+    candidates.sort(key=lambda c: (c[0], c[2], c[3]))
+
+    solutions = []
+    for _, fb_div, op_div, fin_op_div in candidates:
+      vco_freq = pc_freq * fb_div[0]
+      if not (vco_freq_min <= vco_freq <= vco_freq_max) or (vco_freq/(2*op_div) > pll_out_max):
+        continue
+      out_freq = vco_freq/(2*op_div*fin_op_div)
+      if app:
+        out_freq = out_freq / 2
+      ppm_error = ((out_freq - output_target)/output_target) * 1000000.0
+      if (abs(ppm_error) > (ppm_error_max+0.01)):
+        continue
+      if (out_freq < output_target) and (fin_op_div > 1):
+        # The loop search stops at the first FOD below target so only keep this if the previous one was above
+        prev_out_freq = vco_freq/(2*op_div*(fin_op_div-1))
+        if app:
+          prev_out_freq = prev_out_freq / 2
+        if (prev_out_freq < output_target):
+          continue
+      solutions.append({'ppm_error':ppm_error, 'input_freq':input_freq, 'out_freq':out_freq, 'vco_freq':vco_freq, 'ref_div':ref_div, 'fb_div':fb_div, 'op_div':op_div, 'fin_op_div':fin_op_div})
+
+    return solutions[:maxsol]
+
+def _search_inverse_many(input_freq, output_targets, ppm_error_max, frac_list, pc_freq_min, maxsol, app):
+    """
+    Inverse solve search for several targets at once. The fraction values and the phase comparator range check
+    of each reference divider are shared, then each target is solved in turn. Returns a list of raw solutions for
+    each target.
+    """
+    frac_values = [item[0] for item in frac_list]
+
+    raw_solutions = [[] for _ in output_targets]
+
+    for ref_div in range(1,ref_div_max+1):
+      pc_freq = input_freq/ref_div
+      if not (pc_freq_min <= pc_freq <= pc_freq_max): # Check pc clock is in valid freq range.
+        continue
+
+      for output_target, target_solutions in zip(output_targets, raw_solutions):
+        if (len(target_solutions) < maxsol):
+          target_solutions.extend(_inverse_ref_div(input_freq, ref_div, output_target, ppm_error_max, frac_list, pc_freq_min, maxsol, app, frac_values))
+
+      if all(len(target_solutions) >= maxsol for target_solutions in raw_solutions): # Stop when we've reached the max number of raw solutions
+        break
+
+    return [target_solutions[:maxsol] for target_solutions in raw_solutions]
+
+def _exact(value):
+    """
+    Exact rational version of a frequency or ppm value as written, eg. 12.288 -> 1536/125
+    """
+    return Fraction(str(value))
+
+def _vector_ref_div(input_freq, ref_div, output_target, ppm_error_max, frac_list, pc_freq_min, maxsol, app, chunk_size = 1 << 18):
+    """
+    NumPy vectorised search for a single reference divider. The whole grid of feedback dividers (integer part x fraction) inside the VCO
+    limits is held as integer numerators and denominators and evaluated in one array pass per OD, trying only the FOD
+    values near the target. All limit and ppm checks use exact integer cross multiplication rather than floats, so there
+    is no need for the +0.01ppm allowance and results do not depend on rounding. Every configuration within the ppm
+    limit is returned, so solutions right on the limit may differ from the loop and inverse searches.
+    """
+    fin = _exact(input_freq)
+    pc_freq = fin / ref_div
+    if not (_exact(pc_freq_min) <= pc_freq <= _exact(pc_freq_max)): # Check pc clock is in valid freq range.
+      return []
+
+    target = _exact(output_target)
+    ppm = _exact(ppm_error_max)
+    a, b = fin.numerator, fin.denominator
+    c, d = target.numerator, target.denominator
+    e, g = ppm.numerator, ppm.denominator
+    app_div = 2 if app else 1
+    vco_min, vco_max, out_max = _exact(vco_freq_min), _exact(vco_freq_max), _exact(pll_out_max)
+
+    # Fraction numerator and denominator for each fractional option, with 0/1 first for integer mode
+    frac_m = np.array([0] + [item[1] for item in frac_list], dtype=np.int64)
+    frac_n = np.array([1] + [item[2] for item in frac_list], dtype=np.int64)
+
+    # Use int64 if the largest product we form fits, otherwise fall back to (slower) Python ints
+    # K = 2 * OD * FOD (* 2) only gets as large as is needed to divide the highest VCO down to the target
+    n_max = int(frac_n.max())
+    k_max = min(2 * op_div_max * fin_op_div_max * app_div, math.ceil(vco_max / target * (1 + ppm / 1000000)) + 2 * op_div_max * app_div)
+    largest = max(a * (fb_div_max + 1) * n_max * d, c * b * ref_div_max * n_max * k_max) * 1000000 * max(e, g)
+    largest = max(largest, a * (fb_div_max + 1) * n_max * vco_max.denominator * out_max.denominator)
+    dtype = np.int64 if largest < 2**62 else object
+    frac_m = frac_m.astype(dtype)
+    frac_n = frac_n.astype(dtype)
+
+    # Float window used only to pick FOD values to try, the exact check decides what is kept
+    fod_window = float(ppm) / 1000000.0 + 1e-9
+    rows_per_chunk = max(1, chunk_size // frac_n.size)
+
+    raw_solutions = []
+
+    # Integer part of the feedback divider which can put the VCO in range
+    fb_int_lo = max(1, math.floor(vco_min / pc_freq) - 1)
+    fb_int_hi = min(fb_div_max, math.ceil(vco_max / pc_freq))
+
+    found = [] # (fb_int, frac index, op_div, fin_op_div) arrays
+    for chunk_start in range(fb_int_lo, fb_int_hi+1, rows_per_chunk):
+      fb_int = np.arange(chunk_start, min(chunk_start + rows_per_chunk, fb_int_hi + 1), dtype=np.int64)
+      grid_int = np.repeat(fb_int, frac_n.size)
+      grid_frac = np.tile(np.arange(frac_n.size), fb_int.size)
+      n = frac_n[grid_frac]
+
+      # VCO = a * fb_num / (b * R * n)
+      fb_num = grid_int.astype(dtype) * n + frac_m[grid_frac]
+      vco_num = a * fb_num
+      vco_den = b * ref_div * n
+      mask = (vco_num * vco_min.denominator >= vco_min.numerator * vco_den) & (vco_num * vco_max.denominator <= vco_max.numerator * vco_den)
+      if not mask.any():
+        continue
+      grid_int, grid_frac, vco_num, vco_den = grid_int[mask], grid_frac[mask], vco_num[mask], vco_den[mask]
+
+      for op_div in range(1,op_div_max+1):
+        pll_out_ok = vco_num * out_max.denominator <= out_max.numerator * 2 * op_div * vco_den
+        if not pll_out_ok.any():
+          continue
+        vn, vd = vco_num[pll_out_ok], vco_den[pll_out_ok]
+
+        # Ideal (real valued) FOD and the integer values either side of it within the ppm window
+        fod_ideal = (vn * d).astype(np.float64) / (vd * (2 * op_div * app_div * c)).astype(np.float64)
+        fod_lo = np.maximum(np.floor(fod_ideal * (1 - fod_window)), 1).astype(np.int64)
+        fod_hi = np.minimum(np.ceil(fod_ideal * (1 + fod_window)), fin_op_div_max).astype(np.int64)
+        for offset in range(int((fod_hi - fod_lo).max(initial=-1)) + 1):
+          fin_op_div = fod_lo + offset
+          in_range = fin_op_div <= fod_hi
+          # |out - target| / target * 1e6 <= ppm with out = vco / K, cross multiplied out
+          k = (2 * op_div * app_div) * fin_op_div.astype(dtype)
+          diff = vn * d - c * vd * k
+          ok = in_range & (np.abs(diff) * (1000000 * g) <= e * c * vd * k)
+          if ok.any():
+            sel = np.flatnonzero(pll_out_ok)[ok]
+            found.append((grid_int[sel], grid_frac[sel], np.full(sel.size, op_div), fin_op_div[ok]))
+
+    if found:
+      fb_ints, frac_idxs, op_divs, fin_op_divs = (np.concatenate(col) for col in zip(*found))
+      # Same ordering as the other searches: FD, OD then FOD
+      order = np.lexsort((fin_op_divs, op_divs, frac_idxs, fb_ints))
+      input_pc_freq = input_freq/ref_div
+      for fb_int, frac_idx, op_div, fin_op_div in zip(fb_ints[order].tolist(), frac_idxs[order].tolist(), op_divs[order].tolist(), fin_op_divs[order].tolist()):
+        if frac_idx == 0:
+          fb_div = [fb_int,0,0]
+        else:
+          item = frac_list[frac_idx - 1]
+          fb_div = [fb_int+item[0], item[1], item[2]]
+        vco_freq = input_pc_freq * fb_div[0]
+        out_freq = vco_freq/(2*op_div*fin_op_div)
+        if app:
+          out_freq = out_freq / 2
+        ppm_error = ((out_freq - output_target)/output_target) * 1000000.0
+        raw_solutions.append({'ppm_error':ppm_error, 'input_freq':input_freq, 'out_freq':out_freq, 'vco_freq':vco_freq, 'ref_div':ref_div, 'fb_div':fb_div, 'op_div':op_div, 'fin_op_div':fin_op_div})
+
+    return raw_solutions[:maxsol]
+
+# Available search implementations, each searching a single reference divider. loop and inverse return
+# the same solutions in the same order, vector applies the ppm limit exactly.
+solvers = {"loop": _loop_ref_div, "inverse": _inverse_ref_div, "vector": _vector_ref_div}
+
+# Part of the solution cache key. Bump a solver's version whenever its results change so that results
+# cached by the previous version are not used.
+solver_versions = {"loop": 2, "inverse": 2, "vector": 2}
+
+def _search(solver, input_freq, output_target, ppm_error_max, frac_list, pc_freq_min, maxsol, app, workers = 1):
+    """
+    Run the search over all reference dividers, lowest first, stopping once there are maxsol solutions.
+    If workers > 1, the reference dividers are shared between a pool of processes. The results are merged
+    in reference divider order so are identical to the serial search.
+    """
+    search_ref_div = functools.partial(solvers[solver], input_freq, output_target=output_target, ppm_error_max=ppm_error_max,
+                                       frac_list=frac_list, pc_freq_min=pc_freq_min, maxsol=maxsol, app=app)
+    ref_div_list = range(1,ref_div_max+1)
+
+    raw_solutions = []
+
+    if workers > 1:
+      pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+      results = pool.map(search_ref_div, ref_div_list)
+    else:
+      pool = None
+      results = map(search_ref_div, ref_div_list)
+
+    try:
+      for ref_div_solutions in results:
+        raw_solutions.extend(ref_div_solutions)
+        if (len(raw_solutions) >= maxsol): # Stop when we've reached the max number of raw solutions
+          break
+    finally:
+      if pool:
+        pool.shutdown(cancel_futures=True)
+
+    return raw_solutions[:maxsol]
+
+def _filter_solutions(raw_solutions):
+    """
+    Reduce raw solutions to one per VCO frequency and RD value, sorted by RD
+    """
+    # First filter out less desirable solutions with the same vco frequency and RD value. Keep the results with the highest PLL OD value.
+
+    solutions_sorted1 = sorted(raw_solutions, key=itemgetter('op_div'), reverse=True) # OD, higher first
+    solutions_sorted2 = sorted(solutions_sorted1, key=itemgetter('ref_div')) # Ref Div, lower first
+    solutions_sorted3 = sorted(solutions_sorted2, key=itemgetter('vco_freq'), reverse=True) # vco, higher first
+
+    filtered_solutions = []
+    for count, solution in enumerate(solutions_sorted3):
+      if count == 0:
+        filtered_solutions.append(solution)
+      else:
+        # Only keep solution If vco or ref_div values are different from last solution
+        if (solution['vco_freq'] != last_solution['vco_freq']) | (solution['ref_div'] != last_solution['ref_div']):
+          filtered_solutions.append(solution)
+      last_solution = solution
+
+    # Final overall sort with lowest ref divider first
+    return sorted(filtered_solutions, key=itemgetter('ref_div'))
+
+def _search_params(input_freq, output_target, ppm_error_max, den_max, pc_freq_min, fracmin, fracmax, maxsol, app, solver):
+    """
+    Solution cache key of a raw search
+    """
+    return {"input_freq":input_freq, "output_target":output_target, "ppm_error_max":ppm_error_max, "den_max":den_max, "pfcmin":pc_freq_min,
+            "fracmin":fracmin, "fracmax":fracmax, "maxsol":maxsol, "app":bool(app), "solver":solver,
+            "solver_version":solver_versions[solver]}
+
+def find_pll(input_freq = 24, output_target = 600, ppm_error_max = 0, den_max = 0, pfcmin = 1.0, maxsol = 200, app = 0, raw = 0, header = 0, fracmax = 1.0, fracmin = 0.0, solver = "inverse", cache = True, workers = 1):
+    if solver not in solvers:
+      raise ValueError(f"Unknown solver {solver}, must be one of {list(solvers)}")
 
     # To create the feedback divider list we need to create the list of fractions we can use for when using frac-n mode.
     # den_max is the highest number we want to use as the denominator. This is useful to set as higher den_max values will have higher jitter so ideally this should be as low as possible.
@@ -98,65 +497,19 @@ def find_pll(input_freq = 24, output_target = 600, ppm_error_max = 0, den_max =
         print("Core PLL does not have frac-n capability. Setting fraction to 0")
 
     # Fraction is m/n - m is numerator, n is denominator.
-    frac_list_raw = []
-    for m in range(1, den_max): # numerator from 1 to (den_max - 1)
-      for n in range(m+1, den_max+1): # denominator from (numerator+1) to den_max
-        frac = float(m)/float(n)
-        if (fracmin < frac < fracmax):
-          frac_list_raw.append([frac,m,n]) # We store the fraction as a float plus the integer numerator and denominator.
-
-    # Sort the fraction list based on the first element (the fractional value) then by the numerator of the fraction.
-    # This means we'll get the more desirable fraction to use first. So 1/2 comes before 2/4 even though they both produce the fraction 0.5
-
-    frac_list_sorted = sorted(frac_list_raw, key=itemgetter(0,1))
-
-    # Now we want to weed out useless fractional divide values.
-    # For example 1/2 and 2/4 both result in a divide ratio of 0.5 but 1/2 is preferable as the denominator is lower and so it will cause Phase Freq Comparator jitter to be at higher freq and so will be filtered more by the analogue loop filter.
-
-    frac_list = []
-    last_item = 0.0
-    for item in frac_list_sorted:
-      if (item[0] > last_item): # Fractional value has to be greater than the last value or not useful
-        #print("{0:.4f}".format(item[0]) + ", " + "{0:2d}".format(item[1]) + ", " + "{0:2d}".format(item[2]))
-        frac_list.append(item)
-        last_item = item[0]
+    frac_list = get_frac_list(den_max, fracmin, fracmax)
 
     # Output a header file containing the list of fractions as register values
     if header:
-      with open("fractions.h", "w") as f:
-        print("// Header file listing fraction options searched", file=f)
-        print("// These values to go in the bottom 16 bits of the secondary PLL fractional-n divider register.", file=f)
-        print("short frac_values_" + str(den_max) + "[" + str(len(frac_list)) +"] = {", file=f)
-        for index, item in enumerate(frac_list):
-          #print(item[0],item[1],item[2])
-          frac_str = str(item[1]) + "/" + str(item[2])
-          frac_str_line = "Index: {:>3} ".format(index) + 'Fraction: {:>5}'.format(frac_str) + " = {0:.4f}".format(item[0])
-          print("0x" + format(  (((item[1]-1) << 8) | (item[2]-1)),'>04X') + ", // " + frac_str_line, file=f)
-        print("};", file=f)
-
-    # Feedback divider 1-8192 - we store a total list of the integer and fractional portions.
-    fb_div_list = []
-    for i in range(1,8193):
-      fb_div_list.append([i,0,0]) # This is when not using frac-n mode.
-      for item in frac_list:
-         fb_div_list.append([i+item[0], item[1], item[2]])
+      write_frac_header(frac_list, den_max)
 
     # Actual Phase Comparator Limits
-    pc_freq_min = 0.22 # 220kHz
-    pc_freq_max = 1800.0 # 1.8GHz
+    pc_freq_min = pc_freq_min_limit
 
     # ... but for lower jitter ideally we'd use a higher minimum PC freq of ~1MHz.
-    if (0.22 <= pfcmin <= 1800.0):
+    if (pc_freq_min_limit <= pfcmin <= pc_freq_max):
       pc_freq_min = pfcmin
 
-    # Actual VCO Limits (/1 output from PLL goes from 360 - 1800MHz so before the /2 this is 720 - 3600MHz)
-    vco_freq_min = 720.0 #720MHz
-    vco_freq_max = 3600.0 #3.6GHz
-
-    # New constraint of /1 output of PLL being 800MHz max (Both Core and App PLLs)
-    # So this doesn't constrain VCO freq becuase you have the output divider.
-    pll_out_max = 800.0 # 800MHz
-
     # Print a summary of inputs
 
     print("Using " + pll_type)
@@ -168,70 +521,230 @@ def find_pll(input_freq = 24, output_target = 600, ppm_error_max = 0, den_max =
       print("Maximum denominator in frac-n config = " + str(den_max))
     print("")
 
-    # Main loop
+    # Main search
 
-    raw_solutions = []
+    search_params = _search_params(input_freq, output_target, ppm_error_max, den_max, pc_freq_min, fracmin, fracmax, maxsol, app, solver)
+    search_cache = solution_cache() if (cache and cache_enabled()) else None
 
-    for ref_div in ref_div_list:
-      pc_freq = input_freq/ref_div
-      if (pc_freq_min <= pc_freq <= pc_freq_max): # Check pc clock is in valid freq range.
-        for fb_div in fb_div_list:
-          vco_freq = pc_freq * fb_div[0]
-          if (vco_freq_min <= vco_freq <= vco_freq_max): # Check vco is in valid freq range.
-            for op_div in op_div_list:
-              pll_out_freq = vco_freq/(2*op_div)
-              if (pll_out_freq <= pll_out_max): # Check PLL out freq is in valid freq range.
-                for fin_op_div in fin_op_div_list:
-                  if (len(raw_solutions) >= maxsol): # Stop when we've reached the max number of raw solutions
-                    break
-                  # See if our output freq is what we want?
-                  out_freq = vco_freq/(2*op_div*fin_op_div)
-                  if app:
-                    out_freq = out_freq / 2 # fixed /2 for 50/50 duty cycle on app_clk output
-                  # Calculate parts per million error
-                  ppm_error = ((out_freq - output_target)/output_target) * 1000000.0
-                  if (abs(ppm_error) <= (ppm_error_max+0.01)): # Hack a tiny additional error in to handle the floating point calc errors.
-                    raw_solutions.append({'ppm_error':ppm_error, 'input_freq':input_freq, 'out_freq':out_freq, 'vco_freq':vco_freq, 'ref_div':ref_div, 'fb_div':fb_div, 'op_div':op_div, 'fin_op_div':fin_op_div})
-                  if (out_freq < output_target):
-                    break
+    raw_solutions = search_cache.get(search_params) if search_cache else None
+    if raw_solutions is None:
+      raw_solutions = _search(solver, input_freq, output_target, ppm_error_max, frac_list, pc_freq_min, maxsol, app, workers)
+      if search_cache:
+        search_cache.put(search_params, raw_solutions)
 
-    # First filter out less desirable solutions with the same vco frequency and RD value. Keep the results with the highest PLL OD value.
+    final_filtered_solutions = _filter_solutions(raw_solutions)
 
-    # print_solution_set(raw_solutions)
+    if raw:
+      print_solution_set(raw_solutions, raw, app)
+      return raw_solutions
+    else:
+      print_solution_set(final_filtered_solutions, raw, app)
+      return final_filtered_solutions
 
-    solutions_sorted1 = sorted(raw_solutions, key=itemgetter('op_div'), reverse=True) # OD, higher first
-    solutions_sorted2 = sorted(solutions_sorted1, key=itemgetter('ref_div')) # Ref Div, lower first
-    solutions_sorted3 = sorted(solutions_sorted2, key=itemgetter('vco_freq'), reverse=True) # vco, higher first
+# Compact, immutable form of a single raw solution as yielded by iter_pll_solutions
+solution_record = namedtuple("solution_record", ["ppm_error", "input_freq", "out_freq", "vco_freq", "ref_div", "fb_div", "op_div", "fin_op_div"])
+
+def iter_pll_solutions(input_freq = 24, output_target = 600, ppm_error_max = 0, den_max = 0, pfcmin = 1.0, app = 0, fracmax = 1.0, fracmin = 0.0, solver = "inverse", order = "ref_div", workers = 1):
+    """
+    Generator version of the raw search. Each solution is yielded as a solution_record, nothing is printed and
+    there is no maxsol limit. Each reference divider is searched in full when it is reached.
+    order = "ref_div" yields the same solutions, in the same order, as find_pll(raw = 1) and only searches one
+    reference divider at a time, so the caller can stop as soon as it has seen what it needs.
+    order = "fb_div" merges the reference dividers to yield the lowest feedback divider first. The merge needs the
+    head of every reference divider so the whole search is done before the first solution is yielded, and stopping
+    early only saves the merge.
+    If workers > 1 the reference dividers are searched ahead of the caller by a pool of processes.
+    """
+    if solver not in solvers:
+      raise ValueError(f"Unknown solver {solver}, must be one of {list(solvers)}")
+    if order not in ("ref_div", "fb_div"):
+      raise ValueError(f"Unknown order {order}, must be ref_div or fb_div")
+
+    if not app:
+      den_max = 0 # Core PLL does not have frac-n capability
+    frac_list = get_frac_list(den_max, fracmin, fracmax)
+
+    pc_freq_min = pc_freq_min_limit
+    if (pc_freq_min_limit <= pfcmin <= pc_freq_max):
+      pc_freq_min = pfcmin
 
-    # print_solution_set(solutions_sorted3)
+    search_ref_div = functools.partial(solvers[solver], input_freq, output_target=output_target, ppm_error_max=ppm_error_max,
+                                       frac_list=frac_list, pc_freq_min=pc_freq_min, maxsol=sys.maxsize, app=app)
+    ref_div_list = range(1,ref_div_max+1)
 
-    filtered_solutions = []
-    for count, solution in enumerate(solutions_sorted3):
-      if count == 0:
-        filtered_solutions.append(solution)
+    if workers > 1:
+      pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+      results = pool.map(search_ref_div, ref_div_list)
+    else:
+      pool = None
+      results = map(search_ref_div, ref_div_list)
+    per_ref_div = (map(_solution_record, ref_div_solutions) for ref_div_solutions in results)
+
+    try:
+      if order == "ref_div":
+        yield from itertools.chain.from_iterable(per_ref_div)
       else:
-        # Only keep solution If vco or ref_div values are different from last solution
-        if (solution['vco_freq'] != last_solution['vco_freq']) | (solution['ref_div'] != last_solution['ref_div']):
-          filtered_solutions.append(solution)
-      last_solution = solution
+        # Each reference divider is already in feedback divider order. Ties keep the lower reference divider first.
+        yield from heapq.merge(*per_ref_div, key=lambda sln: sln.fb_div[0])
+    finally:
+      if pool:
+        pool.shutdown(cancel_futures=True) # The caller may stop early
+
+def _solution_record(solution):
+    return solution_record(**{**solution, "fb_div": tuple(solution["fb_div"])})
+
+def solution_objectives(fracmin = 0.0, fracmax = 1.0):
+    """
+    Objectives which rank_pll_solutions can use, each mapping a solution_record to a value where lower is better.
+    fracmin and fracmax are the fraction range the LUT will cover.
+    """
+    frac_mid = (fracmin + fracmax) / 2
+
+    def frac_offset(sln):
+      frac = sln.fb_div[1] / sln.fb_div[2] if sln.fb_div[2] else 0.0
+      return abs(frac - frac_mid)
+
+    return {
+      "ppm_error": lambda sln: abs(sln.ppm_error),
+      "denominator": lambda sln: sln.fb_div[2], # Lower n pushes the intrinsic frac-n jitter higher in frequency
+      "pfc_freq": lambda sln: -sln.input_freq / sln.ref_div, # Higher PFC frequency gives lower jitter
+      "vco_freq": lambda sln: -sln.vco_freq,
+      "frac_offset": frac_offset, # Nominal fraction near the middle of the LUT gives range both ways
+      "lut_span": lambda sln: -(fracmax - fracmin) / sln.fb_div[0], # Proportion of the output covered by the LUT, wider has more lock range
+    }
+
+default_objectives = ("ppm_error", "frac_offset", "lut_span", "denominator", "pfc_freq", "vco_freq")
+
+def rank_pll_solutions(solutions, k = 10, objectives = default_objectives, fracmin = 0.0, fracmax = 1.0):
+    """
+    Return up to k solutions from the Pareto front of the objectives, meaning no other solution is at least as good
+    in every objective and better in one. Solutions may be solution_records or find_pll dicts and are consumed as
+    they arrive, normally from iter_pll_solutions, so there is no maxsol limit.
+
+    The front is bounded by keeping the k best in objective priority order in a heap. Once it is full, most solutions
+    are worse than the last one dropped so are rejected straight away. The result is sorted best first in priority order.
+    Each solution which is not rejected is checked for dominance against every kept solution, so ranking n solutions
+    takes O(n k) time, not O(n log k).
+
+    get_pll_solution and find_pll_config use it to pick from the solutions meeting their min_F and nominal fraction
+    criteria with select="pareto". By default they take the lowest F of those instead.
+    """
+    objective_funcs = solution_objectives(fracmin, fracmax)
+    unknown = [name for name in objectives if name not in objective_funcs]
+    if unknown:
+      raise ValueError(f"Unknown objectives {unknown}, must be from {list(objective_funcs)}")
+    objective_funcs = [objective_funcs[name] for name in objectives]
+
+    def dominates(a, b):
+      return all(x <= y for x, y in zip(a, b)) and a != b
+
+    front = [] # Max heap on the objective values of (negated values, count, values, solution)
+    bound = None # Values of the last solution dropped from a full heap. Anything not better than it is rejected.
+    for count, sln in enumerate(solutions):
+      if isinstance(sln, dict):
+        sln = _solution_record(sln)
+      values = tuple(func(sln) for func in objective_funcs)
+
+      if bound is not None and values >= bound:
+        continue
+      if any(dominates(entry[2], values) or entry[2] == values for entry in front):
+        continue # Only the first of solutions with equal objective values is kept
+
+      kept = [entry for entry in front if not dominates(values, entry[2])]
+      if len(kept) != len(front):
+        front = kept
+        heapq.heapify(front)
+      heapq.heappush(front, (tuple(-v for v in values), count, values, sln))
+      if len(front) > k:
+        bound = heapq.heappop(front)[2]
+
+    return [entry[3] for entry in sorted(front, key=lambda entry: (entry[2], entry[1]))]
+
+def find_pll_many(input_freq = 24, output_targets = (600,), ppm_error_max = 0, den_max = 0, pfcmin = 1.0, maxsol = 200, app = 0, raw = 0, header = 0, fracmax = 1.0, fracmin = 0.0, cache = True):
+    """
+    Search for several target output frequencies from the same input clock, for example both the 44.1kHz and
+    48kHz families of audio clocks. The fraction table and the reference divider range checks are shared across
+    the targets, then each target is solved in turn by the inverse solver. Returns a dict of target -> solutions,
+    each the same as find_pll with the inverse solver. Each target uses the same solution cache entry as find_pll
+    with the inverse solver, so only targets not already cached are searched.
+    """
+    output_targets = list(output_targets)
+    if not app:
+      den_max = 0
 
-    # print_solution_set(filtered_solutions)
+    frac_list = get_frac_list(den_max, fracmin, fracmax)
 
-    # Final overall sort with lowest ref divider first
-    final_filtered_solutions = sorted(filtered_solutions, key=itemgetter('ref_div'))
+    if header:
+      write_frac_header(frac_list, den_max)
 
-    if raw:
-      print_solution_set(raw_solutions, raw, app)
-      return raw_solutions
-    else:
-      print_solution_set(final_filtered_solutions, raw, app)
-      return final_filtered_solutions
+    pc_freq_min = pc_freq_min_limit
+    if (pc_freq_min_limit <= pfcmin <= pc_freq_max):
+      pc_freq_min = pfcmin
+
+    search_cache = solution_cache() if (cache and cache_enabled()) else None
+    search_params = [_search_params(input_freq, output_target, ppm_error_max, den_max, pc_freq_min, fracmin, fracmax, maxsol, app, "inverse")
+                     for output_target in output_targets]
+
+    raw_solutions = [search_cache.get(params) if search_cache else None for params in search_params]
+    missing = [i for i, solutions in enumerate(raw_solutions) if solutions is None]
+    if missing:
+      searched = _search_inverse_many(input_freq, [output_targets[i] for i in missing], ppm_error_max, frac_list, pc_freq_min, maxsol, app)
+      for i, solutions in zip(missing, searched):
+        raw_solutions[i] = solutions
+        if search_cache:
+          search_cache.put(search_params[i], solutions)
+
+    results = {}
+    for output_target, target_solutions in zip(output_targets, raw_solutions):
+      print("Target Output Frequency = " + str(output_target) + "MHz")
+      if raw:
+        results[output_target] = target_solutions
+      else:
+        results[output_target] = _filter_solutions(target_solutions)
+      print_solution_set(results[output_target], raw, app)
+
+    return results
+
+def find_shared_configs(results):
+    """
+    Given the dict of target -> solutions from find_pll_many, find the PLL settings which can reach every target by
+    only changing the output divider (ACD for the App PLL) and/or fractional register. That is, the R, F and OD settings
+    in the control register are the same. Returns a list of dicts of ref_div, fb_int, op_div and the matching solutions
+    for each target.
+    """
+    by_target = []
+    for target_solutions in results.values():
+      configs = {}
+      for solution in target_solutions:
+        configs.setdefault((solution['ref_div'], int(solution['fb_div'][0]), solution['op_div']), []).append(solution)
+      by_target.append(configs)
+
+    if not by_target:
+      return []
+
+    common = set(by_target[0]).intersection(*by_target[1:])
+    shared = []
+    for ref_div, fb_int, op_div in sorted(common):
+      shared.append({'ref_div':ref_div, 'fb_int':fb_int, 'op_div':op_div,
+                     'solutions':{target:configs[(ref_div, fb_int, op_div)] for target, configs in zip(results, by_target)}})
+
+    return shared
+
+def print_shared_configs(shared):
+    print('***  Found ' + str(len(shared)) + ' Shared Configs ***')
+    print('')
+    for config in shared:
+      print("RD " + '{:2d}'.format(config['ref_div']) + ", FD " + '{:4d}'.format(config['fb_int']) + ", OD " + '{:2d}'.format(config['op_div']))
+      for target, solutions in config['solutions'].items():
+        for solution in solutions:
+          fb_div = solution['fb_div']
+          print("  OUT " + '{:3.6f}'.format(target) + "MHz: FRAC " + '{:1.3f}'.format(fb_div[0]-int(fb_div[0])) + " (m = " + '{:3d}'.format(fb_div[1]) + ", n = " + '{:3d}'.format(fb_div[2]) + "), FOD " + '{:4d}'.format(solution['fin_op_div']) + ", ERR " + str(round((solution['ppm_error']),3)) + "ppm")
 
 # When invoked as main program, invoke the profiler on a script
 if __name__ == '__main__':
   parser = argparse.ArgumentParser(description='A script to calculate xcore.ai PLL settings to achieve desired output clock frequencies.')
   parser.add_argument("-i", "--input", type=float, help="PLL reference input frequency (MHz)", default=24.0)
-  parser.add_argument("-t", "--target", type=float, help="Target output frequency (MHz)", default=600.0)
+  parser.add_argument("-t", "--target", type=float, nargs="+", help="Target output frequency (MHz). More than one may be given", default=[600.0])
   parser.add_argument("-e", "--error", type=int, help="Allowable frequency error (ppm)", default=0)
   parser.add_argument("-m", "--denmax", type=int, help="Maximum denominator in frac-n config", default=0)
   parser.add_argument("-p", "--pfcmin", type=float, help="Minimum phase frequency comparator frequency (MHz)", default=1.0)
@@ -241,7 +754,32 @@ if __name__ == '__main__':
   parser.add_argument("--header", help="Output a header file with fraction option reg values", action="store_true")
   parser.add_argument("--fracmax", type=float, help="Maximum fraction value to use", default=1.0)
   parser.add_argument("--fracmin", type=float, help="Minimum fraction value to use", default=0.0)
+  parser.add_argument("--solver", choices=list(solvers), help="Search implementation to use. Only inverse supports more than one target", default="inverse")
+  parser.add_argument("--no-cache", help="Do not use or update the on-disk solution cache", action="store_true")
+  parser.add_argument("-j", "--jobs", type=int, help="Number of processes to share the search between. Only with a single target", default=1)
+
+  parser.add_argument("--pareto", type=int, metavar="K", help="List up to K solutions from the Pareto front of all solutions, best first. Only with a single target")
+  parser.add_argument("--shared", help="With more than one target, list configs where only the output divider and fraction differ", action="store_true")
 
   args = parser.parse_args()
 
-  find_pll(input_freq = args.input, output_target = args.target, ppm_error_max = args.error, den_max = args.denmax, pfcmin = args.pfcmin, maxsol = args.maxsol, app = args.app, raw = args.raw, header = args.header, fracmax = args.fracmax, fracmin = args.fracmin)
+  if len(args.target) > 1:
+    if args.solver != "inverse":
+      parser.error("--solver must be inverse with more than one target")
+    if args.jobs > 1:
+      parser.error("--jobs is only supported with a single target")
+    if args.pareto:
+      parser.error("--pareto is only supported with a single target")
+  elif args.shared:
+    parser.error("--shared needs more than one target")
+
+  if len(args.target) > 1:
+    results = find_pll_many(input_freq = args.input, output_targets = args.target, ppm_error_max = args.error, den_max = args.denmax, pfcmin = args.pfcmin, maxsol = args.maxsol, app = args.app, raw = args.raw, header = args.header, fracmax = args.fracmax, fracmin = args.fracmin, cache = not args.no_cache)
+    if args.shared:
+      print_shared_configs(find_shared_configs(results))
+  elif args.pareto:
+    solutions = iter_pll_solutions(input_freq = args.input, output_target = args.target[0], ppm_error_max = args.error, den_max = args.denmax, pfcmin = args.pfcmin, app = args.app, fracmax = args.fracmax, fracmin = args.fracmin, solver = args.solver, workers = args.jobs)
+    ranked = rank_pll_solutions(solutions, k = args.pareto, fracmin = args.fracmin, fracmax = args.fracmax)
+    print_solution_set([sln._asdict() for sln in ranked], 1, args.app)
+  else:
+    find_pll(input_freq = args.input, output_target = args.target[0], ppm_error_max = args.error, den_max = args.denmax, pfcmin = args.pfcmin, maxsol = args.maxsol, app = args.app, raw = args.raw, header = args.header, fracmax = args.fracmax, fracmin = args.fracmin, solver = args.solver, cache = not args.no_cache, workers = args.jobs)
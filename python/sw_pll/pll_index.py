@@ -0,0 +1,181 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+# This file contains a pre-computed index of every App PLL output frequency which can be reached from a given
+# input frequency, for answering "what is the nearest frequency I can hit" queries during system planning
+# without running a pll_calc search each time.
+#
+# Each entry holds the register settings (F, R, f, p, OD, ACD as used by app_pll_frac_calc) and the output
+# frequency, calculated in the same way as app_pll_frac_calc.calc_frequency so the values match exactly.
+# Entries are sorted by frequency so queries are a binary search. The index may be saved as a .npy file
+# (with a small .json file of the build parameters alongside) and loaded memory mapped so only the parts
+# which are queried are read from disk.
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+from sw_pll.pll_calc import get_frac_list
+
+
+index_dtype = np.dtype([("freq", "<f8"), ("R", "u1"), ("F", "<u2"), ("f", "u1"), ("p", "u1"), ("OD", "u1"), ("ACD", "<u2"), ("frac_enable", "u1")])
+
+index_version = 1
+
+# Register limits, as checked by app_pll_frac_calc.calc_frequency
+F_max = 8191
+R_max = 63
+OD_max = 7
+ACD_max = 65535
+intermediate_freq_min = 360000000.0
+intermediate_freq_max = 1800000000.0
+
+
+class pll_index:
+    """
+        Sorted table of reachable App PLL output frequencies and their register settings.
+        Create using pll_index.build() or pll_index.load().
+    """
+
+    def __init__(self, entries, params):
+        """
+        Wrap an already sorted array of index_dtype entries and the parameters used to build it
+        """
+        self.entries = entries
+        self.params = params
+
+    @classmethod
+    def build(cls, input_frequency, min_frequency, max_frequency, max_denom=80, fracmin=0.0, fracmax=1.0, pfc_min=6000000.0, max_entries=50000000):
+        """
+        Enumerate every valid App PLL setting with an output frequency between min_frequency and max_frequency.
+
+        input_frequency         - The xcore clock frequency, normally the XTAL frequency
+        min_frequency           - Lowest output frequency to include
+        max_frequency           - Highest output frequency to include
+        max_denom               - (Optional) The maximum fractional denominator. 0 for integer settings only
+        fracmin                 - (Optional) The minimum fractional multiplier
+        fracmax                 - (Optional) The maximum fractional multiplier
+        pfc_min                 - (Optional) The minimum phase comparator frequency (input_frequency / (R + 1))
+        max_entries             - (Optional) Raise ValueError rather than build an index larger than this
+
+        The number of entries grows with the frequency range, max_denom and the number of R values allowed
+        by pfc_min, so keep these as tight as the planning allows. Each entry is 16 bytes.
+        """
+        frac_list = get_frac_list(max_denom, fracmin, fracmax)
+        # Integer setting first, then the fractions. f and p are register values so one less than m and n.
+        frac_values = np.array([0.0] + [m / n for _, m, n in frac_list])
+        frac_f = np.array([0] + [m - 1 for _, m, n in frac_list], dtype=np.uint8)
+        frac_p = np.array([0] + [n - 1 for _, m, n in frac_list], dtype=np.uint8)
+        frac_enable = np.array([0] + [1] * len(frac_list), dtype=np.uint8)
+
+        chunks = []
+        num_entries = 0
+        for R in range(0, R_max + 1):
+            if input_frequency / (R + 1.0) < pfc_min:
+                break
+
+            F = np.arange(1, F_max + 1)
+            intermediate_freq = input_frequency * (F + 1.0) / 2.0 / (R + 1.0)
+            F = F[(intermediate_freq >= intermediate_freq_min) & (intermediate_freq <= intermediate_freq_max)]
+
+            # All combinations of F and fraction, F major
+            F_all = np.repeat(F, len(frac_values))
+            frac_idx = np.tile(np.arange(len(frac_values)), len(F))
+            fb_div = F_all + 1.0 + frac_values[frac_idx]
+
+            for OD in range(0, OD_max + 1):
+                ratio = fb_div / 2.0 / (R + 1.0) / (OD + 1.0)
+
+                # ACD range for the output band, one wider each side then checked exactly below
+                acd_lo = np.maximum(np.ceil(input_frequency * ratio / (2.0 * max_frequency)) - 2, 0).astype(np.int64)
+                acd_hi = np.minimum(np.floor(input_frequency * ratio / (2.0 * min_frequency)), ACD_max).astype(np.int64)
+                counts = np.maximum(acd_hi - acd_lo + 1, 0)
+                num_entries += counts.sum()
+                if num_entries > max_entries:
+                    raise ValueError(f"Index would have more than {max_entries} entries, reduce the frequency range, max_denom or R range")
+                if not counts.any():
+                    continue
+
+                src = np.repeat(np.arange(len(ratio)), counts)
+                ACD = acd_lo[src] + np.arange(len(src)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+                # Same calculation, in the same order, as app_pll_frac_calc.calc_frequency
+                freq = input_frequency * (fb_div[src] / 2.0 / (R + 1.0) / (OD + 1.0) / (2.0 * (ACD + 1)))
+                keep = (freq >= min_frequency) & (freq <= max_frequency)
+                src, ACD, freq = src[keep], ACD[keep], freq[keep]
+
+                chunk = np.empty(len(freq), dtype=index_dtype)
+                chunk["freq"] = freq
+                chunk["R"] = R
+                chunk["F"] = F_all[src]
+                chunk["f"] = frac_f[frac_idx[src]]
+                chunk["p"] = frac_p[frac_idx[src]]
+                chunk["OD"] = OD
+                chunk["ACD"] = ACD
+                chunk["frac_enable"] = frac_enable[frac_idx[src]]
+                chunks.append(chunk)
+
+        entries = np.concatenate(chunks) if chunks else np.empty(0, dtype=index_dtype)
+        entries = entries[np.argsort(entries["freq"], kind="stable")]
+
+        params = {"version": index_version, "input_frequency": input_frequency, "min_frequency": min_frequency, "max_frequency": max_frequency,
+                  "max_denom": max_denom, "fracmin": fracmin, "fracmax": fracmax, "pfc_min": pfc_min}
+
+        return cls(entries, params)
+
+    def save(self, filename):
+        """
+        Save as a .npy file which can be memory mapped, plus a .json file of the build parameters
+        """
+        path = Path(filename).with_suffix(".npy")
+        np.save(path, self.entries)
+        path.with_suffix(".json").write_text(json.dumps(self.params))
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        """
+        Load a saved index. By default the entries are memory mapped read only rather than read into memory.
+        """
+        path = Path(filename).with_suffix(".npy")
+        params = json.loads(path.with_suffix(".json").read_text())
+        if params.get("version") != index_version:
+            raise ValueError(f"{path} is index version {params.get('version')}, expected {index_version}")
+
+        entries = np.load(path, mmap_mode="r" if mmap else None)
+        if entries.dtype != index_dtype:
+            raise ValueError(f"{path} does not contain a PLL index")
+
+        return cls(entries, params)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def in_range(self, min_frequency, max_frequency):
+        """
+        All settings with an output frequency between min_frequency and max_frequency inclusive, lowest first
+        """
+        freq = self.entries["freq"]
+        lo = np.searchsorted(freq, min_frequency, side="left")
+        hi = np.searchsorted(freq, max_frequency, side="right")
+        return self.entries[lo:hi]
+
+    def within_ppm(self, target_frequency, ppm):
+        """
+        All settings within +/- ppm of the target frequency, lowest first
+        """
+        return self.in_range(target_frequency * (1 - ppm / 1e6), target_frequency * (1 + ppm / 1e6))
+
+    def nearest(self, target_frequency):
+        """
+        The settings whose output frequency is closest to the target. There may be several settings
+        giving exactly that frequency so all of them are returned. Empty if the index is empty.
+        """
+        freq = self.entries["freq"]
+        i = np.searchsorted(freq, target_frequency)
+        if len(freq) == 0:
+            return self.entries[0:0]
+
+        if i == len(freq) or (i > 0 and target_frequency - freq[i - 1] <= freq[i] - target_frequency):
+            i -= 1
+        return self.in_range(freq[i], freq[i])
@@ -0,0 +1,107 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+# This file contains a scheduler for simulations made of stages running at different rates, for example
+# the control loop at 100Hz, the SDM at 1MHz and the audio modulation at 6.144MHz.
+#
+# Time is counted in integer ticks of a base rate which is the lowest common multiple of the stage rates,
+# so every stage runs at exact times however long the simulation. Event stages are called once per step
+# of their own. Block stages are called with the contiguous run of their steps up to the next event, so
+# they can do the work for many steps with vector operations.
+
+from fractions import Fraction
+from math import gcd, lcm
+
+
+class sim_stage:
+    """
+    A stage added to a sim_scheduler
+    """
+    def __init__(self, rate_hz, callback, block, start):
+        self.rate_hz = rate_hz
+        self.callback = callback
+        self.block = block
+        self.next_step = start
+        self.period = None # In ticks, set by the scheduler
+
+
+class sim_scheduler:
+    """
+    Runs simulation stages at their own rates on an exact integer tick base.
+
+    At each tick where one or more events are due, the event stages are called in the order they were added
+    and then the block stages are called, in the order they were added, with their steps from that tick up to
+    the next event. So a control event at a tick affects the block steps at that tick onwards.
+    """
+    def __init__(self, max_denominator=1000000):
+        """
+        Rates given as floats are converted to fractions with a denominator of up to max_denominator.
+        """
+        self.max_denominator = max_denominator
+        self.stages = []
+        self.tick = 0
+
+    def _fraction(self, rate_hz):
+        return Fraction(rate_hz).limit_denominator(self.max_denominator) if isinstance(rate_hz, float) else Fraction(rate_hz)
+
+    def add_stage(self, rate_hz, callback, block=False, start=0):
+        """
+        Add a stage running at rate_hz, starting at its step number start (so at time start / rate_hz).
+        An event stage is called as callback(step) at each of its steps. A block stage is called
+        as callback(step, n) for its steps step to step + n - 1. Returns the stage.
+        """
+        assert self.tick == 0, "Stages must be added before running"
+        stage = sim_stage(self._fraction(rate_hz), callback, block, start)
+        assert stage.rate_hz > 0, f"Invalid rate: {rate_hz}"
+        self.stages.append(stage)
+
+        return stage
+
+    @property
+    def tick_rate_hz(self):
+        """
+        The base tick rate, which is the lowest common multiple of the stage rates
+        """
+        rates = [stage.rate_hz for stage in self.stages]
+
+        return Fraction(lcm(*(rate.numerator for rate in rates)), gcd(*(rate.denominator for rate in rates)))
+
+    def ticks(self, seconds):
+        """
+        The whole number of ticks nearest to a time in seconds
+        """
+        return round(self._fraction(seconds) * self.tick_rate_hz)
+
+    def seconds(self, tick):
+        """
+        The time of a tick in seconds
+        """
+        return float(tick / self.tick_rate_hz)
+
+    def run(self, duration_s=None, end_tick=None):
+        """
+        Run the stages from the current tick up to, but not including, the end given as a time or a tick.
+        May be called again to continue.
+        """
+        tick_rate_hz = self.tick_rate_hz
+        for stage in self.stages:
+            stage.period = int(tick_rate_hz / stage.rate_hz)
+        end_tick = self.ticks(duration_s) if end_tick is None else end_tick
+
+        events = [stage for stage in self.stages if not stage.block]
+        blocks = [stage for stage in self.stages if stage.block]
+
+        while self.tick < end_tick:
+            for stage in events:
+                if stage.next_step * stage.period == self.tick:
+                    stage.callback(stage.next_step)
+                    stage.next_step += 1
+
+            next_tick = min([end_tick] + [stage.next_step * stage.period for stage in events])
+            for stage in blocks:
+                end_step = -(-next_tick // stage.period) # Steps before next_tick
+                if end_step > stage.next_step:
+                    stage.callback(stage.next_step, end_step - stage.next_step)
+                    stage.next_step = end_step
+
+            self.tick = next_tick
@@ -0,0 +1,349 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+# This file contains a recorder for simulation traces such as the output frequency, lock status and
+# control value. Each channel is a preallocated typed array, optionally decimated as it is recorded, so
+# a long simulation has bounded memory and does no allocation per step.
+#
+# For runs too long to keep in memory, trace_writer streams channels to disk in chunks, one .npy file
+# per chunk per channel plus a trace.json file of metadata, and trace_reader memory maps any window of
+# a run back without loading the rest of it.
+#
+# Decimation modes, with decimation N:
+#
+# -   every:  keep every Nth value, starting with the first
+# -   mean:   keep the mean of each bucket of N values
+# -   minmax: keep the minimum and maximum of each bucket of N values, as two columns
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+decimation_modes = ("every", "mean", "minmax")
+
+
+class trace_channel:
+    """
+    A single channel of a trace_recorder
+    """
+    def __init__(self, num_samples, decimation=1, mode="every", dtype=np.float64):
+        assert mode in decimation_modes, f"Invalid decimation mode: {mode}"
+        assert decimation >= 1, f"Invalid decimation: {decimation}"
+
+        self.decimation = int(decimation)
+        self.mode = mode
+        self.dtype = np.dtype(np.float64 if mode == "mean" else dtype)
+        self.capacity = -(-int(num_samples) // self.decimation)
+
+        shape = (self.capacity, 2) if mode == "minmax" else self.capacity
+        self.data = np.empty(shape, dtype=self.dtype)
+        self.count = 0          # Values written to data
+        self.num_samples = 0    # Values recorded
+
+        # Start of the current bucket, for mean and minmax. Allocated when first needed.
+        self._pending = None
+        self._pending_count = 0
+
+    @property
+    def values(self):
+        """
+        The values recorded so far, not including any partial mean or minmax bucket
+        """
+        return self.data[:self.count]
+
+    def _write(self, values):
+        if self.count + len(values) > self.capacity:
+            raise ValueError(f"Trace channel full after {self.num_samples} samples")
+        self.data[self.count:self.count + len(values)] = values
+        self.count += len(values)
+
+    def _reduce(self, buckets):
+        if self.mode == "mean":
+            return buckets.mean(axis=1)
+        return np.stack((buckets.min(axis=1), buckets.max(axis=1)), axis=1)
+
+    def record(self, values):
+        """
+        Record a value or an array of values
+        """
+        if np.isscalar(values):
+            # Single values, as recorded each step, go straight into the data or the current bucket
+            if self.mode == "every":
+                if self.num_samples % self.decimation == 0:
+                    if self.count == self.capacity:
+                        raise ValueError(f"Trace channel full after {self.num_samples} samples")
+                    self.data[self.count] = values
+                    self.count += 1
+            else:
+                if self._pending is None:
+                    self._pending = np.empty(self.decimation, dtype=self.dtype)
+                self._pending[self._pending_count] = values
+                self._pending_count += 1
+                if self._pending_count == self.decimation:
+                    self._write(self._reduce(self._pending[np.newaxis]))
+                    self._pending_count = 0
+            self.num_samples += 1
+            return
+
+        values = np.atleast_1d(values)
+        decimation = self.decimation
+        num_samples = len(values)
+
+        if decimation == 1:
+            self._write(values if self.mode == "every" else self._reduce(values[:, np.newaxis]))
+        elif self.mode == "every":
+            self._write(values[-self.num_samples % decimation::decimation])
+        else:
+            if self._pending is None:
+                self._pending = np.empty(decimation, dtype=self.dtype)
+            if self._pending_count:
+                fill = min(decimation - self._pending_count, len(values))
+                self._pending[self._pending_count:self._pending_count + fill] = values[:fill]
+                self._pending_count += fill
+                values = values[fill:]
+                if self._pending_count == decimation:
+                    self._write(self._reduce(self._pending[np.newaxis]))
+                    self._pending_count = 0
+
+            full = len(values) // decimation * decimation
+            if full:
+                self._write(self._reduce(values[:full].reshape(-1, decimation)))
+            self._pending[:len(values) - full] = values[full:]
+            self._pending_count += len(values) - full
+
+        self.num_samples += num_samples
+
+    def flush(self):
+        """
+        Write any partial mean or minmax bucket, for example at the end of a simulation
+        """
+        if self._pending_count:
+            self._write(self._reduce(self._pending[np.newaxis, :self._pending_count]))
+            self._pending_count = 0
+
+
+class trace_recorder:
+    """
+    Records named channels of simulation traces into preallocated arrays. Channels are added with
+    add_channel, each with its own type, decimation and mode, and may be disabled so that recording
+    to them costs nothing.
+    """
+    def __init__(self, num_samples, decimation=1, mode="every"):
+        """
+        num_samples is the most values each channel will be given. decimation and mode are the defaults for
+        channels which do not set their own.
+        """
+        self.num_samples = num_samples
+        self.decimation = decimation
+        self.mode = mode
+        self.channels = {}
+        self.enabled = {}
+
+    def add_channel(self, name, dtype=np.float64, decimation=None, mode=None, enabled=True):
+        """
+        Add a channel. Nothing is allocated for a disabled channel.
+        """
+        decimation = self.decimation if decimation is None else decimation
+        mode = self.mode if mode is None else mode
+        self.enabled[name] = enabled
+        self.channels[name] = trace_channel(self.num_samples if enabled else 0, decimation, mode, dtype)
+
+        return self.channels[name]
+
+    def record(self, **values):
+        """
+        Record a value or array of values to each named channel, for example record(frequency=f, lock_status=l)
+        """
+        for name, value in values.items():
+            if self.enabled[name]:
+                self.channels[name].record(value)
+
+    def flush(self):
+        """
+        Write the partial buckets of every channel
+        """
+        for channel in self.channels.values():
+            channel.flush()
+
+    def __getitem__(self, name):
+        """
+        The values recorded to a channel
+        """
+        return self.channels[name].values
+
+    def __contains__(self, name):
+        return name in self.channels and self.enabled[name]
+
+
+trace_version = 1
+
+
+class trace_writer:
+    """
+    Streams named channels to a directory in chunks of chunk_samples values. Has the same record and flush
+    interface as trace_recorder, so memory use is one chunk per channel however long the run.
+
+    The metadata file is rewritten after each chunk so a run in progress can be read. With append=True
+    an existing run in the directory is continued.
+    """
+    def __init__(self, path, sample_rate_hz=None, chunk_samples=1 << 20, metadata=None, append=False):
+        """
+        sample_rate_hz is the default rate of the channels, used to read time windows. metadata is
+        a dict of anything JSON serialisable to save with the run, such as the simulation parameters.
+        """
+        self.path = Path(path)
+        self.chunk_samples = int(chunk_samples)
+        self.sample_rate_hz = sample_rate_hz
+        self.channels = {}
+        self._buffers = {}
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta_path = self.path / "trace.json"
+        if append and meta_path.exists():
+            self.meta = json.loads(meta_path.read_text())
+            if self.meta.get("version") != trace_version:
+                raise ValueError(f"{path} is trace version {self.meta.get('version')}, expected {trace_version}")
+            self.meta["metadata"].update(metadata or {})
+            for name, channel in self.meta["channels"].items():
+                self._buffers[name] = [np.empty(self.chunk_samples, dtype=channel["dtype"]), 0]
+        else:
+            if meta_path.exists(): # Replace the run already there
+                for name, channel in json.loads(meta_path.read_text()).get("channels", {}).items():
+                    for chunk in range(len(channel["chunks"])):
+                        (self.path / f"{name}_{chunk:06d}.npy").unlink(missing_ok=True)
+            self.meta = {"version": trace_version, "metadata": metadata or {}, "channels": {}}
+
+    def add_channel(self, name, dtype=np.float64, sample_rate_hz=None, start_s=0.0):
+        """
+        Add a channel, or when appending check it matches the existing one. start_s is the time of the
+        channel's first sample, for example one period for a control loop which first runs after a period.
+        """
+        dtype = np.dtype(dtype).str
+        sample_rate_hz = self.sample_rate_hz if sample_rate_hz is None else sample_rate_hz
+        if name in self.meta["channels"]:
+            channel = self.meta["channels"][name]
+            if channel["dtype"] != dtype:
+                raise ValueError(f"Channel {name} is {channel['dtype']}, not {dtype}")
+            return
+
+        self.meta["channels"][name] = {"dtype": dtype, "sample_rate_hz": sample_rate_hz, "start_s": float(start_s), "chunks": []}
+        self._buffers[name] = [np.empty(self.chunk_samples, dtype=dtype), 0]
+
+    def record(self, **values):
+        """
+        Record a value or array of values to each named channel
+        """
+        for name, value in values.items():
+            buffer = self._buffers[name]
+            if np.isscalar(value):
+                buffer[0][buffer[1]] = value
+                buffer[1] += 1
+                if buffer[1] == self.chunk_samples:
+                    self._write_chunk(name)
+                    self._write_meta()
+                continue
+
+            value = np.atleast_1d(value)
+            while len(value):
+                n = min(self.chunk_samples - buffer[1], len(value))
+                buffer[0][buffer[1]:buffer[1] + n] = value[:n]
+                buffer[1] += n
+                value = value[n:]
+                if buffer[1] == self.chunk_samples:
+                    self._write_chunk(name)
+                    self._write_meta()
+
+    def _write_chunk(self, name):
+        data, count = self._buffers[name]
+        if count:
+            chunks = self.meta["channels"][name]["chunks"]
+            np.save(self.path / f"{name}_{len(chunks):06d}.npy", data[:count])
+            chunks.append(count)
+            self._buffers[name][1] = 0
+
+    def _write_meta(self):
+        tmp_path = self.path / f"trace.{os.getpid()}.tmp"
+        tmp_path.write_text(json.dumps(self.meta, indent=1))
+        os.replace(tmp_path, self.path / "trace.json") # Atomic so readers never see a partial file
+
+    def flush(self):
+        """
+        Write the partial chunk of every channel
+        """
+        for name in self._buffers:
+            self._write_chunk(name)
+        self._write_meta()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class trace_reader:
+    """
+    Reads a run written by trace_writer. Chunks are memory mapped so only the parts read are loaded.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "trace.json").read_text())
+        if self.meta.get("version") != trace_version:
+            raise ValueError(f"{path} is trace version {self.meta.get('version')}, expected {trace_version}")
+
+        self.metadata = self.meta["metadata"]
+        self.channels = list(self.meta["channels"])
+        self._starts = {name: np.concatenate(([0], np.cumsum(channel["chunks"], dtype=np.int64)))
+                        for name, channel in self.meta["channels"].items()}
+
+    def num_samples(self, name):
+        return int(self._starts[name][-1])
+
+    def sample_rate_hz(self, name):
+        return self.meta["channels"][name]["sample_rate_hz"]
+
+    def start_s(self, name):
+        return self.meta["channels"][name].get("start_s", 0.0)
+
+    def read(self, name, start=0, stop=None):
+        """
+        Samples start to stop - 1 of a channel. A window within one chunk is a read only memory mapped
+        view, otherwise the window is copied from each chunk it covers.
+        """
+        starts = self._starts[name]
+        start, stop, _ = slice(start, stop).indices(int(starts[-1]))
+        stop = max(start, stop)
+
+        first = max(int(np.searchsorted(starts, start, side="right")) - 1, 0)
+        last = max(int(np.searchsorted(starts, stop, side="left")), first + 1)
+        pieces = [np.load(self.path / f"{name}_{chunk:06d}.npy", mmap_mode="r")[max(start - starts[chunk], 0):stop - starts[chunk]]
+                  for chunk in range(first, min(last, len(starts) - 1))]
+        if len(pieces) == 1:
+            return pieces[0]
+
+        return np.concatenate(pieces) if pieces else np.empty(0, dtype=self.meta["channels"][name]["dtype"])
+
+    def read_time(self, name, start_s, end_s):
+        """
+        The samples of a channel from start_s up to end_s, using its sample rate and the time of its first sample
+        """
+        sample_rate_hz = self.sample_rate_hz(name)
+        assert sample_rate_hz is not None, f"Channel {name} has no sample rate"
+
+        # The tolerance stops times given as floats, such as 0.07 * 100 = 7.000000000000001, rounding up a sample
+        first_s = self.start_s(name)
+        start, stop = (max(int(np.ceil((time_s - first_s) * sample_rate_hz - 1e-6)), 0) for time_s in (start_s, end_s))
+
+        return self.read(name, start, stop)
+
+    def __getitem__(self, name):
+        """
+        The whole of a channel
+        """
+        return self.read(name)
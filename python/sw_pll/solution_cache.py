@@ -0,0 +1,127 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+# This file contains a persistent on-disk cache of pll_calc search results so that
+# repeated searches with the same parameters (for example every test session or
+# simulator run) do not need to search the whole solution space again.
+#
+# Results are stored as one JSON file per search, named by a hash of the search
+# parameters and a version tag. Callers include the version of the solver in the
+# parameters (pll_calc.solver_versions) so changing a solver does not return the
+# results of its previous version. The least recently used files are removed once the
+# cache grows beyond a set number of entries or size.
+#
+# Set the environment variable SW_PLL_NO_CACHE=1 to disable the cache, or
+# SW_PLL_CACHE_DIR to change where it is stored.
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+
+# Bump this if the format of the entries or how callers select from the search changes so that
+# old entries are not used. Changes to a solver bump its entry in pll_calc.solver_versions instead.
+cache_version = 2
+
+
+def default_cache_dir():
+    """
+    User cache directory, following the XDG convention
+    """
+    if "SW_PLL_CACHE_DIR" in os.environ:
+        return Path(os.environ["SW_PLL_CACHE_DIR"])
+    cache_home = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(cache_home) / "sw_pll"
+
+
+def cache_enabled():
+    """
+    The cache may be turned off for all callers from the environment
+    """
+    return os.environ.get("SW_PLL_NO_CACHE", "0").lower() in ("", "0", "false", "no")
+
+
+class solution_cache:
+    """
+    Content addressed cache of PLL search results keyed by the search parameters.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def _path(self, params):
+        """
+        File for a set of search parameters. The file name is a hash of the parameters and cache version.
+        """
+        key = json.dumps({"version": cache_version, **params}, sort_keys=True)
+        return self.cache_dir / (hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def get(self, params):
+        """
+        Return the cached solutions for these parameters or None if not present
+        """
+        path = self._path(params)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("params") != params:
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return entry["solutions"]
+
+    def put(self, params, solutions):
+        """
+        Store solutions for these parameters, removing old entries if the cache is full.
+        Failure to write is not an error, the cache is just not used.
+        """
+        path = self._path(params)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump({"params": params, "solutions": solutions}, f)
+            os.replace(tmp_path, path) # Atomic so concurrent readers never see a partial file
+        except (OSError, TypeError, ValueError):
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until within the entry count and size limits
+        """
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort(key=lambda e: e[0])
+
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+
+    def clear(self):
+        """
+        Remove all entries
+        """
+        for path in self.cache_dir.glob("*.json"):
+            path.unlink(missing_ok=True)
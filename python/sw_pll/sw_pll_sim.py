@@ -1,17 +1,21 @@
 # Copyright 2023-2025 XMOS LIMITED.
 # This Software is subject to the terms of the XMOS Public Licence: Version 1.
 
-from sw_pll.app_pll_model import get_pll_solution
+from sw_pll.app_pll_model import find_pll_config
 from sw_pll.pfd_model import port_timer_pfd
-from sw_pll.dco_model import lut_dco, sigma_delta_dco, lock_status_lookup
+from sw_pll.dco_model import lut_dco, sdm, sigma_delta_dco, lock_status_lookup, lock_count_threshold
 from sw_pll.controller_model import lut_pi_ctrl, sdm_pi_ctrl
-from sw_pll.analysis_tools import audio_modulator
+from sw_pll.analysis_tools import streaming_audio_modulator
+from sw_pll.sim_scheduler import sim_scheduler
+from sw_pll.sim_trace import trace_recorder, trace_writer
+from sw_pll import kernels
 import matplotlib.pyplot as plt
 import numpy as np
 import sys
 
 
 def plot_simulation(freq_log, target_freq_log, real_time_log, name="sw_pll_tracking.png"):
+    target_freq_log = np.broadcast_to(target_freq_log, np.shape(real_time_log)) # May be a constant
     plt.clf()
     plt.plot(real_time_log, freq_log, color='red', marker='.', label='actual frequency')
     plt.plot(real_time_log, target_freq_log, color='blue', marker='.', label='target frequency')
@@ -39,14 +43,16 @@ class sim_sw_pll_lut:
                     nominal_nominal_control_rate_frequency,
                     Kp,
                     Ki,
-                    Kii=None):
+                    Kii=None,
+                    config=None):
         """
-        Init a Lookup Table based SW_PLL instance
+        Init a Lookup Table based SW_PLL instance. The PLL settings and LUT are read from register_setup.h
+        and fractions.h unless a pll_config from app_pll_model.find_pll_config is passed.
         """
 
         self.pfd = port_timer_pfd(target_output_frequency, nominal_nominal_control_rate_frequency)
-        self.controller = lut_pi_ctrl(Kp, Ki, Kii=Kii, verbose=False)
-        self.dco = lut_dco(verbose=False)
+        self.controller = lut_pi_ctrl(Kp, Ki, Kii=Kii, verbose=False, config=config)
+        self.dco = lut_dco(verbose=False, config=config)
 
         self.target_output_frequency = target_output_frequency
         self.time = 0.0
@@ -76,9 +82,126 @@ class sim_sw_pll_lut:
 
 
 
-def run_lut_sw_pll_sim():
+class sim_sw_pll_lut_batch:
+    """
+    Many independent Look Up Table SW_PLL instances run in lockstep. The state of every instance
+    (PFD count, PI accumulators, lock state and output frequency) is held in arrays and each call to
+    do_control_loop advances all of them with vector operations. The instances share the LUT but each
+    may have its own Kp, Ki and Kii. Each lane gives exactly the same results as a sim_sw_pll_lut
+    with the same settings and inputs.
+    """
+    def __init__(   self,
+                    target_output_frequency,
+                    nominal_nominal_control_rate_frequency,
+                    Kp,
+                    Ki,
+                    Kii=None,
+                    config=None):
+        """
+        Init the batch. Kp, Ki and Kii may be scalars or arrays, which are broadcast together to give one instance
+        per element. The PLL settings and LUT are as for sim_sw_pll_lut.
+        """
+        self.dco = lut_dco(verbose=False, config=config)
+        lut_size = self.dco.get_lut_size()
+
+        self.Kp, self.Ki, self.Kii = (np.array(gain, dtype=np.float64) for gain in np.broadcast_arrays(Kp, Ki, 0.0 if Kii is None else Kii))
+        self.num_instances = self.Kp.size
+        self.Kp, self.Ki, self.Kii = self.Kp.ravel(), self.Ki.ravel(), self.Kii.ravel()
+
+        # As lut_pi_ctrl. The windup limit is 0 where the gain is 0
+        self.base_lut_index = lut_size // 2
+        self.i_windup_limit = np.divide(lut_size, self.Ki, out=np.zeros(self.num_instances), where=self.Ki != 0.0)
+        self.ii_windup_limit = np.divide(lut_size, self.Kii, out=np.zeros(self.num_instances), where=self.Kii != 0.0)
+        self.error_accum = np.zeros(self.num_instances)
+        self.error_accum_accum = np.zeros(self.num_instances)
+
+        # As port_timer_pfd
+        self.ppm_range = 1000
+        self.expected_output_clock_count_inc = target_output_frequency / nominal_nominal_control_rate_frequency
+        self.output_count_last = np.zeros(self.num_instances)
+
+        # As lut_dco
+        self.last_output_frequency = np.full(self.num_instances, self.dco.last_output_frequency)
+        self.lock_status = np.full(self.num_instances, -1, dtype=np.int8)
+        self.lock_count = np.full(self.num_instances, lock_count_threshold, dtype=np.int32)
+
+        self.target_output_frequency = target_output_frequency
+        self.nominal_control_rate_frequency = nominal_nominal_control_rate_frequency
+        self.control_time_inc = 1 / nominal_nominal_control_rate_frequency
+
+    def do_control_loop(self, output_clock_counts, period_fractions=1.0):
+        """
+        This should be called once every control period with the output clock count of every instance.
+        Returns arrays of the output frequencies and lock statuses, as sim_sw_pll_lut.do_control_loop.
+        """
+        # PFD
+        output_count_int = np.trunc(np.asarray(output_clock_counts, dtype=np.float64))
+        error = (output_count_int - self.output_count_last) / period_fractions - int(self.expected_output_clock_count_inc)
+        first_loop = np.abs(error) > (self.ppm_range / 1e6) * self.expected_output_clock_count_inc
+        self.output_count_last = output_count_int
+
+        # Controller. The first loop resets the accumulators and gives no new DCO setting
+        error = np.where(first_loop, 0.0, error)
+        self.error_accum = np.clip(np.where(first_loop, 0.0, self.error_accum) + error, -self.i_windup_limit, self.i_windup_limit)
+        self.error_accum_accum = np.clip(np.where(first_loop, 0.0, self.error_accum_accum) + self.error_accum, -self.ii_windup_limit, self.ii_windup_limit)
+        dco_ctrl = self.base_lut_index - (self.Kp * error + self.Ki * self.error_accum + self.Kii * self.error_accum_accum)
+
+        # DCO
+        num_entries = self.dco.get_lut_size()
+        set_point = np.trunc(dco_ctrl)
+        low, high = set_point < 0, set_point >= num_entries
+        in_range = ~(low | high | first_loop)
+        low &= ~first_loop
+        high &= ~first_loop
+
+        self.lock_status[low] = -1
+        self.lock_status[high] = 1
+        self.lock_count[low | high] = lock_count_threshold
+        counting = in_range & (self.lock_count > 0)
+        self.lock_count[counting] -= 1
+        self.lock_status[in_range & ~counting] = 0
+
+        set_point = np.clip(np.where(first_loop, 0, set_point), 0, num_entries - 1).astype(np.int64)
+        self.last_output_frequency = np.where(first_loop, self.last_output_frequency, self.dco.frequencies[set_point])
+
+        lock_status = np.where(first_loop, -1, self.lock_status) # We cannot claim to be locked if the PFD sees an error
+
+        return self.last_output_frequency.copy(), lock_status
+
+    def run(self, simulation_iterations, ppm_shift=0.0, jitter_amplitude=0.0, rng=None):
+        """
+        Run all of the instances for simulation_iterations control periods against a reference offset by
+        ppm_shift, with the output clock count sampled up to +/- jitter_amplitude / 2 counts early or late,
+        which is passed on as the period fraction. ppm_shift and jitter_amplitude may be scalars or an array
+        of one per instance. Returns the output frequency and lock status logs with shape
+        (simulation_iterations, num_instances).
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        ppm_shift = np.broadcast_to(ppm_shift, self.num_instances)
+        jitter_amplitude = np.broadcast_to(jitter_amplitude, self.num_instances)
+
+        freq_log = np.empty((simulation_iterations, self.num_instances))
+        lock_log = np.empty((simulation_iterations, self.num_instances), dtype=np.int8)
+
+        output_clock_count = np.zeros(self.num_instances)
+        period_fraction = np.ones(self.num_instances)
+        for loop in range(simulation_iterations):
+            output_frequency, lock_status = self.do_control_loop(output_clock_count, period_fractions=period_fraction)
+            freq_log[loop], lock_log[loop] = output_frequency, lock_status
+
+            measured_clock_count_inc = output_frequency / self.nominal_control_rate_frequency * (1 - ppm_shift / 1e6)
+            clock_count_sampling_jitter = jitter_amplitude * (rng.random(self.num_instances) - 0.5)
+            period_fraction = (measured_clock_count_inc + clock_count_sampling_jitter) / measured_clock_count_inc
+            output_clock_count += measured_clock_count_inc * period_fraction
+
+        return freq_log, lock_log
+
+
+
+def run_lut_sw_pll_sim(trace_path=None):
     """
     Test program / example showing how to run the simulator object    
+    If trace_path is given the full traces are also streamed to that directory, see sim_trace.trace_reader.
     """
 
     # Example profiles to produce typical frequencies seen in audio systems. ALl assume 24MHz input clock to the hardware PLL. 
@@ -100,9 +223,10 @@ def run_lut_sw_pll_sim():
 
     nominal_output_hz = profile["target_output_frequency"]
 
-    # This generates the needed header files read later by sim_sw_pll_lut
+    # This finds the PLL settings and LUT used by sim_sw_pll_lut, and saves them as header files for the firmware
     # 12.288MHz with 48kHz ref (note also works with 16kHz ref), +-500PPM, 30.4Hz steps, 826B LUT size
-    get_pll_solution(24000000, nominal_output_hz, max_denom=80, min_F=200, ppm_max=5, fracmin=0.695, fracmax=0.905)
+    config = find_pll_config(24000000, nominal_output_hz, max_denom=80, min_F=200, ppm_max=5, fracmin=0.695, fracmax=0.905)
+    config.write_headers()
             
     output_frequency = nominal_output_hz
     nominal_control_rate_hz = profile["nominal_ref_frequency"] / 512
@@ -111,24 +235,36 @@ def run_lut_sw_pll_sim():
     Ki = 1.0
     Kii = 0.0
 
-    sw_pll = sim_sw_pll_lut(nominal_output_hz, nominal_control_rate_hz, Kp, Ki, Kii=Kii)
+    sw_pll = sim_sw_pll_lut(nominal_output_hz, nominal_control_rate_hz, Kp, Ki, Kii=Kii, config=config)
     sw_pll.dco.print_stats(nominal_output_hz)
     
-    output_clock_count = 0
-
     test_tone_hz = 1000
-    audio = audio_modulator(simulation_iterations * 1 / nominal_control_rate_hz, sample_rate=48000, test_tone_hz=test_tone_hz)
-
-    
-    freq_log = []
-    target_freq_log = []
-    real_time_log = []
-    real_time = 0.0
-    period_fraction = 1.0
+    duration_s = simulation_iterations / nominal_control_rate_hz
+    # skip the first half of the tone in the FFT so we ignore the inital lock period
+    audio = streaming_audio_modulator(sample_rate=48000, test_tone_hz=test_tone_hz, wav_file="modulated_tone_1000Hz_lut.wav", analyse_from_s=duration_s / 2, duration_s=duration_s)
 
     ppm_shift = +50
+    target_output_frequency = nominal_output_hz * (1 + ppm_shift / 1e6)
 
-    for loop in range(simulation_iterations):
+    trace = trace_recorder(simulation_iterations)
+    trace.add_channel("time")
+    trace.add_channel("frequency")
+    trace.add_channel("lock_status", dtype=np.int8)
+
+    sink = None
+    if trace_path is not None:
+        sink = trace_writer(trace_path, sample_rate_hz=nominal_control_rate_hz,
+                            metadata={"sim": "lut", "nominal_output_hz": nominal_output_hz, "Kp": Kp, "Ki": Ki, "Kii": Kii, "ppm_shift": ppm_shift})
+        for name in ("frequency", "error_accum", "error_accum_accum"):
+            sink.add_channel(name)
+        sink.add_channel("lock_status", dtype=np.int8)
+
+    output_clock_count = 0
+    period_fraction = 1.0
+    scaled_frequency_shift = 0.0
+
+    def control_loop(loop):
+        nonlocal output_clock_count, period_fraction, scaled_frequency_shift
         output_frequency, lock_status = sw_pll.do_control_loop(output_clock_count, period_fraction=period_fraction, verbose=False)
 
         # Now work out how many output clock counts this translates to
@@ -141,23 +277,29 @@ def run_lut_sw_pll_sim():
 
         output_clock_count += measured_clock_count_inc * period_fraction
 
-        real_time_log.append(real_time)
-        target_output_frequency = nominal_output_hz * (1 + ppm_shift / 1e6)
-        target_freq_log.append(target_output_frequency)
-        freq_log.append(output_frequency)
-
-        time_inc = 1 / nominal_control_rate_hz
+        trace.record(time=loop / nominal_control_rate_hz, frequency=output_frequency, lock_status=lock_status)
+        if sink is not None:
+            sink.record(frequency=output_frequency, lock_status=lock_status, error_accum=sw_pll.controller.error_accum,
+                        error_accum_accum=sw_pll.controller.error_accum_accum)
         scaled_frequency_shift = test_tone_hz * (output_frequency - target_output_frequency) / target_output_frequency
-        audio.apply_frequency_deviation(real_time, real_time + time_inc, scaled_frequency_shift)
 
-        real_time += time_inc
+    def modulate_tone(sample, n):
+        audio.add_segment(n, scaled_frequency_shift)
 
+    # The tone is modulated from each control loop until the next
+    scheduler = sim_scheduler()
+    scheduler.add_stage(nominal_control_rate_hz, control_loop)
+    scheduler.add_stage(audio.sample_rate, modulate_tone, block=True)
+    scheduler.run(duration_s)
+    if sink is not None:
+        sink.close()
 
-    plot_simulation(freq_log, target_freq_log, real_time_log, "tracking_lut.png")
+
+    plot_simulation(trace["frequency"], target_output_frequency, trace["time"], "tracking_lut.png")
     
-    audio.modulate_waveform()
-    audio.save_modulated_wav("modulated_tone_1000Hz_lut.wav")
-    audio.plot_modulated_fft("modulated_fft_lut.png", skip_s=real_time / 2) # skip so we ignore the inital lock period
+    audio.close()
+    metrics = audio.plot_modulated_fft("modulated_fft_lut.png")
+    print(f"Modulated tone: {metrics}")
 
 
 
@@ -233,17 +375,194 @@ class sim_sw_pll_sd:
 
         return frequncy
 
+    def do_sigma_delta_block(self, n):
+        """
+        Run the SDM n times with the current control setting and return the SDM steps as a uint8
+        array. self.dco.codes_to_frequency gives the same frequencies as n calls to do_sigma_delta.
+        """
+        return self.dco.modulate_block(self.control_setting, n)
+
+
+class sim_sw_pll_sd_batch:
+    """
+    Many independent Sigma Delta Modulator SW_PLL instances run in lockstep, with the PFD, controller and
+    modulator state of every instance held in arrays and advanced with vector operations. The instances share
+    the DCO profile but each may have its own Kp, Ki and Kii. Each lane gives exactly the same results as a
+    sim_sw_pll_sd with the same settings and inputs.
+    """
+
+    # Up to this many instances, without the compiled kernels, the SDM of each instance is run in turn by
+    # sdm.modulate_block rather than a step at a time across all of them. A step across all of them costs
+    # about 30us whatever the number of instances, up to a few hundred, and sdm.modulate_block about 0.8us
+    # per instance, so they break even at about 35 instances. The compiled kernels take about 6ns per
+    # instance per step so are always used when enabled.
+    per_instance_max = 35
+
+    def __init__(   self,
+                    target_output_frequency,
+                    nominal_nominal_control_rate_frequency,
+                    Kp,
+                    Ki,
+                    Kii=None):
+        """
+        Init the batch. Kp, Ki and Kii may be scalars or arrays, which are broadcast together to give one
+        instance per element.
+        """
+        if target_output_frequency == 24576000:
+            self.dco = sigma_delta_dco("24.576_1M")
+        elif target_output_frequency == 22579200:
+            self.dco = sigma_delta_dco("22.5792_1M")
+        else:
+            assert False, f"Inavlid target_output_frequency: {target_output_frequency}"
+
+        self.Kp, self.Ki, self.Kii = (np.array(gain, dtype=np.float64) for gain in np.broadcast_arrays(Kp, Ki, 0.0 if Kii is None else Kii))
+        self.num_instances = self.Kp.size
+        self.Kp, self.Ki, self.Kii = self.Kp.ravel(), self.Ki.ravel(), self.Kii.ravel()
+
+        # As port_timer_pfd
+        self.expected_output_clock_count_inc = target_output_frequency / nominal_nominal_control_rate_frequency
+        self.output_count_last = np.zeros(self.num_instances)
+
+        # As sdm_pi_ctrl, which has no windup limits
+        self.error_accum = np.zeros(self.num_instances)
+        self.error_accum_accum = np.zeros(self.num_instances)
+        self.iir_y = np.zeros(self.num_instances, dtype=np.int64)
+        self.initial_setting = (self.dco.sdm_in_max + self.dco.sdm_in_min) / 2
+        self.lock_status = np.full(self.num_instances, -1, dtype=np.int8)
+        self.lock_count = np.full(self.num_instances, lock_count_threshold, dtype=np.int32)
+
+        # As sdm
+        self.sdm_x1 = np.zeros(self.num_instances, dtype=np.int64)
+        self.sdm_x2 = np.zeros(self.num_instances, dtype=np.int64)
+        self.sdm_x3 = np.zeros(self.num_instances, dtype=np.int64)
+        self._instance_sdms = None
+
+        self.target_output_frequency = target_output_frequency
+        self.control_time_inc = 1 / nominal_nominal_control_rate_frequency
+
+        self.control_setting = np.full(self.num_instances, self.initial_setting)
+
+    def do_control_loop(self, output_clock_counts):
+        """
+        Run the control loop of every instance. This should be called once every control period.
+        Returns the array of new control settings, as sim_sw_pll_sd.do_control_loop.
+        """
+        # PFD. The SDM controller does not use first_loop
+        output_count_int = np.trunc(np.asarray(output_clock_counts, dtype=np.float64))
+        error = (output_count_int - self.output_count_last) - int(self.expected_output_clock_count_inc)
+        self.output_count_last = output_count_int
+
+        # Controller
+        error = -error
+        self.error_accum = self.error_accum + error
+        self.error_accum_accum = self.error_accum_accum + self.error_accum
+        x = np.trunc(self.Kp * error + self.Ki * self.error_accum + self.Kii * self.error_accum_accum).astype(np.int64)
+        self.iir_y += (x - self.iir_y) >> 3 # This matches the firmware
+
+        sdm_in = self.initial_setting + self.iir_y
+        high, low = sdm_in > self.dco.sdm_in_max, sdm_in < self.dco.sdm_in_min
+        in_range = ~(high | low)
+
+        self.lock_status[high] = 1
+        self.lock_status[low] = -1
+        self.lock_count[high | low] = lock_count_threshold
+        counting = in_range & (self.lock_count > 0)
+        self.lock_count[counting] -= 1
+        self.lock_status[in_range & ~counting] = 0
+
+        self.control_setting = np.clip(sdm_in, self.dco.sdm_in_min, self.dco.sdm_in_max).astype(np.float64)
 
-def run_sd_sw_pll_sim(nominal_output_hz):
+        return self.control_setting
+
+    def do_sigma_delta_block(self, n):
+        """
+        Run the SDM of every instance n times with its current control setting. Returns the SDM steps
+        as a uint8 array of shape (num_instances, n), which self.dco.codes_to_frequency converts to frequencies.
+        The instances are run one after another by the compiled kernels if enabled, or by sdm.modulate_block
+        for up to per_instance_max instances, otherwise in lockstep with vector operations.
+        """
+        sdm_in = np.trunc(self.control_setting).astype(np.int64)
+        x1, x2, x3 = self.sdm_x1, self.sdm_x2, self.sdm_x3
+
+        if kernels.jit_enabled():
+            return kernels.sdm_batch_block(sdm_in, int(n), x1, x2, x3)
+
+        if self.num_instances <= self.per_instance_max:
+            if self._instance_sdms is None:
+                self._instance_sdms = [sdm() for _ in range(self.num_instances)]
+            codes = np.empty((self.num_instances, n), dtype=np.uint8)
+            for lane, instance in enumerate(self._instance_sdms):
+                # Setting the same state keeps the cycle modulate_block has found for the same input
+                instance.sdm_x1, instance.sdm_x2, instance.sdm_x3 = int(x1[lane]), int(x2[lane]), int(x3[lane])
+                codes[lane] = instance.modulate_block(int(sdm_in[lane]), n)
+                x1[lane], x2[lane], x3[lane] = instance.sdm_x1, instance.sdm_x2, instance.sdm_x3
+            return codes
+
+        codes = np.empty((n, self.num_instances), dtype=np.uint8)
+        sdm_out, tmp = np.empty_like(x1), np.empty_like(x1)
+
+        # As sdm.do_sigma_delta_int, in place to avoid allocating per step. x3 * 18 and sdm_out * 768 are its sums of shifts
+        for step in range(n):
+            np.multiply(x3, 18, out=sdm_out)
+            np.right_shift(sdm_out, 13, out=sdm_out)
+            np.clip(sdm_out, 0, 8, out=sdm_out)
+            codes[step] = sdm_out
+
+            np.right_shift(x2, 5, out=tmp)
+            x3 += tmp
+            np.multiply(sdm_out, 768, out=tmp)
+            x3 -= tmp
+            np.right_shift(x1, 5, out=tmp)
+            x2 += tmp
+            np.left_shift(sdm_out, 14, out=tmp)
+            x2 -= tmp
+            x1 += sdm_in
+            np.left_shift(sdm_out, 17, out=tmp)
+            x1 -= tmp
+
+        return codes.T
+
+    def run(self, control_periods, sdm_steps_per_control=10000, ppm_shift=0.0):
+        """
+        Run all of the instances for control_periods control periods of sdm_steps_per_control SDM steps each,
+        against a reference offset by ppm_shift, which may be a scalar or an array of one per instance.
+        The control loop runs after each period. Returns the mean output frequency over each period and the
+        lock status and control setting after it, each with shape (control_periods, num_instances).
+        """
+        ppm_shift = np.broadcast_to(ppm_shift, self.num_instances)
+        sdm_rate_hz = sdm_steps_per_control / self.control_time_inc
+
+        freq_log = np.empty((control_periods, self.num_instances))
+        lock_log = np.empty((control_periods, self.num_instances), dtype=np.int8)
+        control_log = np.empty((control_periods, self.num_instances))
+
+        output_clock_count = np.zeros((self.num_instances, 1))
+        for period in range(control_periods):
+            output_frequency = self.dco.codes_to_frequency(self.do_sigma_delta_block(sdm_steps_per_control))
+
+            # Accumulate the real number of output clocks one step at a time
+            output_clocks = output_frequency / sdm_rate_hz * (1 - ppm_shift[:, np.newaxis] / 1e6)
+            output_clock_count = np.cumsum(np.concatenate((output_clock_count, output_clocks), axis=1), axis=1)[:, -1:]
+
+            freq_log[period] = output_frequency.mean(axis=1)
+            control_log[period] = self.do_control_loop(output_clock_count[:, 0])
+            lock_log[period] = self.lock_status
+
+        return freq_log, lock_log, control_log
+
+
+
+def run_sd_sw_pll_sim(nominal_output_hz, simulation_iterations=1000000, trace_path=None):
     """
     Test program / example showing how to run the simulator object
+    If trace_path is given the SDM steps and the control loop state are also streamed to that directory,
+    see sim_trace.trace_reader.
     """
 
     nominal_control_rate_hz = 100
     nominal_sd_rate_hz = 1e6
     output_frequency = nominal_output_hz
     
-    simulation_iterations = 1000000
     Kp = 0.0
     Ki = 32.0
     Kii = 0.25
@@ -252,55 +571,77 @@ def run_sd_sw_pll_sim(nominal_output_hz):
     sw_pll.dco.write_register_file()
     sw_pll.dco.print_stats()
 
-    output_clock_count = 0
-
     test_tone_hz = 1000
-    audio = audio_modulator(simulation_iterations * 1 / nominal_sd_rate_hz, sample_rate=6144000, test_tone_hz=test_tone_hz)
-
-    freq_log = []
-    target_freq_log = []
-    real_time_log = []
-    real_time = 0.0
+    duration_s = simulation_iterations / nominal_sd_rate_hz
+    # skip the first half of the tone in the FFT so we ignore the inital lock period
+    audio = streaming_audio_modulator(sample_rate=6144000, test_tone_hz=test_tone_hz, wav_file="modulated_tone_1000Hz_sdm.wav", analyse_from_s=duration_s / 2, duration_s=duration_s)
 
     ppm_shift = +50
-
-    # For working out when to do control calls
-    control_time_inc = 1 / nominal_control_rate_hz
-    control_time_trigger = control_time_inc
-
-    for loop in range(simulation_iterations):
-
-        output_frequency = sw_pll.do_sigma_delta()
-
-        # Log results
-        freq_log.append(output_frequency)
-        target_output_frequency = nominal_output_hz * (1 + ppm_shift / 1e6)
-        target_freq_log.append(target_output_frequency)
-        real_time_log.append(real_time)
-
-        # Modulate tone
-        sdm_time_inc = 1 / nominal_sd_rate_hz
-        scaled_frequency_shift = test_tone_hz * (output_frequency - target_output_frequency) / target_output_frequency
-        audio.apply_frequency_deviation(real_time, real_time + sdm_time_inc, scaled_frequency_shift)
+    target_output_frequency = nominal_output_hz * (1 + ppm_shift / 1e6)
+
+    # The frequency is averaged over 100 SDM steps to plot
+    trace = trace_recorder(simulation_iterations, decimation=100, mode="mean")
+    trace.add_channel("time", mode="every")
+    trace.add_channel("frequency")
+
+    sink = None
+    if trace_path is not None:
+        sink = trace_writer(trace_path, sample_rate_hz=nominal_control_rate_hz,
+                            metadata={"sim": "sdm", "nominal_output_hz": nominal_output_hz, "Kp": Kp, "Ki": Ki, "Kii": Kii, "ppm_shift": ppm_shift,
+                                      "sdm_step_frequencies": sw_pll.dco.frequencies.tolist()})
+        sink.add_channel("sdm_step", dtype=np.uint8, sample_rate_hz=nominal_sd_rate_hz)
+        # The control loop first runs after one control period
+        for name in ("control_setting", "error_accum", "error_accum_accum"):
+            sink.add_channel(name, start_s=1 / nominal_control_rate_hz)
+        sink.add_channel("lock_status", dtype=np.int8, start_s=1 / nominal_control_rate_hz)
+
+    output_clock_count = 0.0
+    sdm_block = (0, np.zeros(1, dtype=np.uint8)) # First step and SDM steps of the latest block, for the tone
+
+    def control_loop(_):
+        control_setting = sw_pll.do_control_loop(output_clock_count)
+        if sink is not None:
+            sink.record(control_setting=control_setting, lock_status=sw_pll.controller.lock_status,
+                        error_accum=sw_pll.controller.error_accum, error_accum_accum=sw_pll.controller.error_accum_accum)
+
+    def sigma_delta(step, n):
+        # The SDM input only changes when the control loop runs so each block has a constant input
+        nonlocal output_clock_count, sdm_block
+        codes = sw_pll.do_sigma_delta_block(n)
+        output_frequency = sw_pll.dco.codes_to_frequency(codes)
+        trace.record(time=np.arange(step, step + n) / nominal_sd_rate_hz, frequency=output_frequency)
+        if sink is not None:
+            sink.record(sdm_step=codes)
+
+        # Keep the step before too, which is still running at the start of the block if that is between steps
+        sdm_block = (step - 1, np.concatenate((sdm_block[1][-1:], codes)))
 
         # Accumulate the real number of output clocks
-        output_clock_count += output_frequency / nominal_sd_rate_hz * (1 - ppm_shift / 1e6)
-
-        # Check for control loop run ready
-        if real_time > control_time_trigger:
-            control_time_trigger += control_time_inc
-
-            # Now work out how many output clock counts this translates to
-            sw_pll.do_control_loop(output_clock_count)
-
-        real_time += sdm_time_inc
-
-
-    plot_simulation(freq_log, target_freq_log, real_time_log, "tracking_sdm.png")
-
-    audio.modulate_waveform()
-    audio.save_modulated_wav("modulated_tone_1000Hz_sdm.wav")
-    audio.plot_modulated_fft("modulated_fft_sdm.png", skip_s=real_time / 2) # skip so we ignore the inital lock period
+        output_clocks = output_frequency / nominal_sd_rate_hz * (1 - ppm_shift / 1e6)
+        output_clock_count = float(np.cumsum(np.concatenate(([output_clock_count], output_clocks)))[-1])
+
+    def modulate_tone(sample, n):
+        # The SDM step running at each audio sample, which has already been run
+        steps = np.arange(sample, sample + n) * int(nominal_sd_rate_hz) // audio.sample_rate
+        output_frequency = sw_pll.dco.codes_to_frequency(sdm_block[1][steps - sdm_block[0]])
+        audio.add_samples(test_tone_hz * (output_frequency - target_output_frequency) / target_output_frequency)
+
+    # The first control loop is after one control period
+    scheduler = sim_scheduler()
+    scheduler.add_stage(nominal_control_rate_hz, control_loop, start=1)
+    scheduler.add_stage(nominal_sd_rate_hz, sigma_delta, block=True)
+    scheduler.add_stage(audio.sample_rate, modulate_tone, block=True)
+    scheduler.run(duration_s)
+    if sink is not None:
+        sink.close()
+
+
+    trace.flush()
+    plot_simulation(trace["frequency"], target_output_frequency, trace["time"], "tracking_sdm.png")
+
+    audio.close()
+    metrics = audio.plot_modulated_fft("modulated_fft_sdm.png")
+    print(f"Modulated tone: {metrics}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,14 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def solution_cache_dir(tmp_path_factory):
+    """
+    Keep the PLL solutions cached by the tests out of the user's own cache directory
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("SW_PLL_CACHE_DIR", str(tmp_path_factory.mktemp("sw_pll_cache")))
+        yield
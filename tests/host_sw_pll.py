@@ -0,0 +1,249 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+"""
+Host (native) build of lib_sw_pll so the equivalence tests can run without xsim
+or the XMOS tools.
+
+The library sources are compiled unchanged with the system C compiler against the
+hardware stubs in test_host/include and loaded using ctypes. Each Host* class
+has the same interface as the xsim Dut it stands in for, plus a batch method
+which runs a whole vector of inputs in one call.
+"""
+
+import ctypes
+import os
+import shutil
+import subprocess
+from functools import cache
+from pathlib import Path
+
+import numpy as np
+import pytest
+from numpy.ctypeslib import ndpointer
+
+from sw_pll.app_pll_model import app_pll_frac_calc
+
+LIB_SW_PLL = Path(__file__).parents[1] / "lib_sw_pll"
+HOST_DIR = Path(__file__).parent / "test_host"
+HOST_LIB = Path(__file__).parent / "bin" / "host" / "libsw_pll_host.so"
+HOST_CC = os.environ.get("CC", "gcc")
+
+requires_host_build = pytest.mark.skipif(shutil.which(HOST_CC) is None, reason=f"No host C compiler ({HOST_CC})")
+
+
+def _array(dtype):
+    return ndpointer(dtype, flags="C_CONTIGUOUS")
+
+
+def build_host_lib():
+    """
+    Compile the host library if it is missing or older than any of its sources
+    """
+    sources = [*sorted((LIB_SW_PLL / "src").glob("*.c")), HOST_DIR / "sw_pll_host.c"]
+    headers = [*(LIB_SW_PLL / "src").glob("*.h"), *(LIB_SW_PLL / "api").glob("*.h"), *HOST_DIR.rglob("*.h")]
+    if HOST_LIB.exists() and HOST_LIB.stat().st_mtime >= max(f.stat().st_mtime for f in sources + headers):
+        return HOST_LIB
+
+    HOST_LIB.parent.mkdir(parents=True, exist_ok=True)
+    tmp_lib = HOST_LIB.with_suffix(f".{os.getpid()}.tmp")
+    cmd = [HOST_CC, "-O2", "-shared", "-fPIC",
+           "-fno-semantic-interposition",      # Allows the always_inline functions in the library to be inlined
+           "-D__XS3A__",                        # Compile the library sources as for the device
+           "-I", HOST_DIR / "include", "-I", LIB_SW_PLL / "api", "-I", LIB_SW_PLL / "src",
+           *sources, "-o", tmp_lib]
+    subprocess.run([str(arg) for arg in cmd], check=True)
+    os.replace(tmp_lib, HOST_LIB)
+
+    return HOST_LIB
+
+
+@cache
+def host_lib():
+    """
+    Build if needed and load the host library
+    """
+    lib = ctypes.CDLL(str(build_host_lib()))
+    state = ctypes.c_void_p
+    size_t = ctypes.c_size_t
+
+    lib.sw_pll_host_state_size.restype = size_t
+    lib.sw_pll_host_state_size.argtypes = []
+    lib.sw_pll_host_read_sswitch_reg.restype = ctypes.c_uint32
+    lib.sw_pll_host_read_sswitch_reg.argtypes = [ctypes.c_uint]
+
+    lib.sw_pll_host_lut_init.restype = None
+    lib.sw_pll_host_lut_init.argtypes = [state, ctypes.c_float, ctypes.c_float, ctypes.c_float, size_t, size_t, ctypes.c_uint32,
+                                         _array(np.int16), size_t, ctypes.c_uint32, ctypes.c_uint32, ctypes.c_uint, ctypes.c_uint]
+    lib.sw_pll_host_lut_do_control.restype = None
+    lib.sw_pll_host_lut_do_control.argtypes = [state, _array(np.uint16), _array(np.uint16), size_t, _array(np.int32), _array(np.uint16),
+                                               _array(np.int16), _array(np.int32), _array(np.int32), _array(np.uint8)]
+    lib.sw_pll_host_lut_do_control_from_error.restype = None
+    lib.sw_pll_host_lut_do_control_from_error.argtypes = [state, _array(np.int16), size_t, _array(np.int32), _array(np.uint16),
+                                                          _array(np.int32), _array(np.int32), _array(np.uint8)]
+
+    lib.sw_pll_host_sdm_init.restype = None
+    lib.sw_pll_host_sdm_init.argtypes = [state, ctypes.c_float, ctypes.c_float, ctypes.c_float, size_t, size_t, ctypes.c_uint32,
+                                         ctypes.c_uint32, ctypes.c_uint32, ctypes.c_uint32, ctypes.c_int32, ctypes.c_uint]
+    lib.sw_pll_host_sdm_control_from_mclk_diff.restype = None
+    lib.sw_pll_host_sdm_control_from_mclk_diff.argtypes = [state, _array(np.int16), size_t, _array(np.int32), _array(np.int32), _array(np.int32)]
+    lib.sw_pll_host_sdm_do_control.restype = None
+    lib.sw_pll_host_sdm_do_control.argtypes = [state, _array(np.uint16), _array(np.uint16), size_t, _array(np.uint8), _array(np.int32), _array(np.int32)]
+
+    lib.sw_pll_host_init_sigma_delta.restype = None
+    lib.sw_pll_host_init_sigma_delta.argtypes = [state]
+    lib.sw_pll_host_do_sigma_delta.restype = None
+    lib.sw_pll_host_do_sigma_delta.argtypes = [state, _array(np.int32), size_t, _array(np.int32), _array(np.uint32)]
+
+    return lib
+
+
+def _port_count(values):
+    """
+    Wrap counts to 16 bits as the xsim Duts do
+    """
+    return (np.asarray(values, dtype=np.int64) % 2**16).astype(np.uint16)
+
+
+class _host_state:
+    """
+    A sw_pll_state_t owned by Python
+    """
+    def __init__(self):
+        self.lib = host_lib()
+        words = -(-self.lib.sw_pll_host_state_size() // 8)
+        self._state = np.zeros(words, dtype=np.uint64) # 8 byte aligned
+        self.state = self._state.ctypes.data
+
+    def __enter__(self):
+        """support context manager"""
+        return self
+
+    def __exit__(self, *_):
+        """Support context manager. Nothing to do"""
+
+    def close(self):
+        pass
+
+
+class HostDut(_host_state):
+    """
+    Native build of the LUT sw_pll. Same interface as test_lib_sw_pll.Dut, which runs the same code in xsim.
+    xe_file is accepted for compatibility and ignored, as both test apps share the init.
+    """
+
+    def __init__(self, args, pll, xe_file=None):
+        super().__init__()
+        self.pll = pll
+        self.lut = np.ascontiguousarray(np.asarray(args.lut).astype(np.int16)) # Kept alive as the C state points to it
+
+        self.lib.sw_pll_host_lut_init(self.state, args.kp, args.ki, args.kii, int(args.loop_rate_count), int(args.pll_ratio),
+                                      int(args.ref_clk_expected_inc), self.lut, len(self.lut), int(args.app_pll_ctl_reg_val),
+                                      int(args.app_pll_div_reg_val), int(args.nominal_lut_idx), int(args.ppm_range))
+
+    def do_control_batch(self, mclk_pts, ref_pts):
+        """
+        Run sw_pll_lut_do_control for each pair of counts. Returns a dict of arrays of the lock status, register value,
+        mclk_diff, error_accum, error_accum_accum and first_loop after each call.
+        """
+        mclk_pts, ref_pts = _port_count(mclk_pts), _port_count(ref_pts)
+        n = len(mclk_pts)
+        result = {"locked": np.empty(n, np.int32), "reg": np.empty(n, np.uint16), "mclk_diff": np.empty(n, np.int16),
+                  "error_accum": np.empty(n, np.int32), "error_accum_accum": np.empty(n, np.int32), "first_loop": np.empty(n, np.uint8)}
+        self.lib.sw_pll_host_lut_do_control(self.state, mclk_pts, ref_pts, n, *result.values())
+
+        return result
+
+    def do_control_from_error_batch(self, errors):
+        """
+        Run sw_pll_lut_do_control_from_error for each error. Returns a dict of arrays as do_control_batch
+        with mclk_diff being the error passed in.
+        """
+        errors = _port_count(errors).view(np.int16)
+        n = len(errors)
+        result = {"locked": np.empty(n, np.int32), "reg": np.empty(n, np.uint16),
+                  "error_accum": np.empty(n, np.int32), "error_accum_accum": np.empty(n, np.int32), "first_loop": np.empty(n, np.uint8)}
+        self.lib.sw_pll_host_lut_do_control_from_error(self.state, errors, n, *result.values())
+        result["mclk_diff"] = errors
+
+        return result
+
+    def _step(self, result):
+        self.pll.update_frac_reg(int(result["reg"][0]) | app_pll_frac_calc.frac_enable_mask)
+        return (int(result["locked"][0]), self.pll.get_output_frequency(), int(result["mclk_diff"][0]),
+                int(result["error_accum"][0]), int(result["error_accum_accum"][0]), int(result["first_loop"][0]), 0)
+
+    def do_control(self, mclk_pt, ref_pt):
+        """
+        returns lock_state, reg_val, mclk_diff, error_acum, error_acum_acum, first_loop, ticks
+        """
+        return self._step(self.do_control_batch([mclk_pt], [ref_pt]))
+
+    def do_control_from_error(self, error):
+        """
+        returns lock_state, reg_val, mclk_diff, error_acum, error_acum_acum, first_loop, ticks
+        """
+        return self._step(self.do_control_from_error_batch([error]))
+
+
+class HostDut_SDM_CTRL(_host_state):
+    """
+    Native build of the SDM controller. Same interface as test_sdm_ctrl_equiv.Dut_SDM_CTRL.
+    """
+
+    def __init__(self, args):
+        super().__init__()
+        self.lib.sw_pll_host_sdm_init(self.state, args.kp, args.ki, args.kii, int(args.loop_rate_count), int(args.pll_ratio),
+                                      int(args.ref_clk_expected_inc), int(args.app_pll_ctl_reg_val), int(args.app_pll_div_reg_val),
+                                      int(args.app_pll_frac_reg_val), int(args.ctrl_mid_point), int(args.ppm_range))
+
+    def do_control_batch(self, mclk_diffs):
+        """
+        Run the PI controller and SDM post processing for each mclk_diff. Returns arrays of the
+        controller error, dco control value and lock status after each.
+        """
+        mclk_diffs = _port_count(mclk_diffs).view(np.int16)
+        n = len(mclk_diffs)
+        error, dco_ctl, locked = np.empty(n, np.int32), np.empty(n, np.int32), np.empty(n, np.int32)
+        self.lib.sw_pll_host_sdm_control_from_mclk_diff(self.state, mclk_diffs, n, error, dco_ctl, locked)
+
+        return error, dco_ctl, locked
+
+    def do_control(self, mclk_diff):
+        """
+        returns sigma delta out, calculated frac val, lock status and timing
+        """
+        error, dco_ctl, locked = self.do_control_batch([mclk_diff])
+
+        return int(error[0]), int(dco_ctl[0]), int(locked[0]), 0
+
+
+class HostDut_SDM_DCO(_host_state):
+    """
+    Native build of the sigma delta modulator. Same interface as test_sdm_dco_equiv.Dut_SDM_DCO.
+    """
+
+    def __init__(self, pll, args=None):
+        super().__init__()
+        self.pll = pll.app_pll
+        self.lib.sw_pll_host_init_sigma_delta(self.state)
+
+    def modulate_batch(self, sdm_ins):
+        """
+        Run the modulator for each input. Returns arrays of the modulator output and the
+        fractional register value written after each step.
+        """
+        sdm_ins = np.ascontiguousarray(np.asarray(sdm_ins).astype(np.int32)) # Truncates as the test app's sscanf does
+        n = len(sdm_ins)
+        sdm_out, frac_val = np.empty(n, np.int32), np.empty(n, np.uint32)
+        self.lib.sw_pll_host_do_sigma_delta(self.state, sdm_ins, n, sdm_out, frac_val)
+
+        return sdm_out, frac_val
+
+    def do_modulate(self, sdm_in):
+        """
+        returns sigma delta out, calculated frac val and timing
+        """
+        sdm_out, frac_val = self.modulate_batch([sdm_in])
+        frequency = self.pll.update_frac_reg(int(frac_val[0]))
+
+        return int(sdm_out[0]), int(frac_val[0]), frequency, 0
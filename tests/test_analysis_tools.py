@@ -0,0 +1,115 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+"""
+Tests for the audio analysis tools. These run on the host only
+and do not need xsim.
+"""
+
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+from sw_pll.analysis_tools import audio_modulator, streaming_audio_modulator, spectral_metrics
+
+
+@pytest.mark.parametrize("chunk_samples", [1000, 4096, 1 << 16])
+def test_streaming_modulator_matches(tmp_path, chunk_samples):
+    """
+    Streaming must give exactly the same wav file and the same spectrum as modulating the whole tone at once
+    """
+    sample_rate = 48000
+    rng = np.random.default_rng(24)
+    edges = np.concatenate(([0], np.sort(rng.choice(np.arange(1, 2 * sample_rate), 60, replace=False)), [2 * sample_rate]))
+    deviations = rng.normal(0, 5, len(edges) - 1)
+    per_sample = rng.normal(0, 5, sample_rate)
+
+    audio = audio_modulator(3, sample_rate=sample_rate)
+    for start, end, deviation in zip(edges, edges[1:], deviations):
+        audio.modulator[start:end] += deviation
+    audio.modulator[2 * sample_rate:] += per_sample
+    audio.modulate_waveform()
+    audio.save_modulated_wav(tmp_path / "whole.wav")
+
+    with streaming_audio_modulator(sample_rate=sample_rate, wav_file=tmp_path / "stream.wav", chunk_samples=chunk_samples, analyse_from_s=1.5) as stream:
+        for start, end, deviation in zip(edges, edges[1:], deviations):
+            if start % 2:
+                stream.add_segment(end - start, deviation)
+            else:
+                stream.add_segment_until((end + 0.5) / sample_rate, deviation)
+        for start in range(0, sample_rate, 777):
+            stream.add_samples(per_sample[start:start + 777])
+
+    assert stream.num_samples == 3 * sample_rate
+    assert np.array_equal(wavfile.read(tmp_path / "stream.wav")[1], wavfile.read(tmp_path / "whole.wav")[1])
+
+    streamed = stream.get_spectral_metrics()
+    whole = audio.get_spectral_metrics(skip_s=1.5)
+    assert np.array_equal(streamed.frequencies, whole.frequencies)
+    assert np.allclose(streamed.psd, whole.psd, rtol=1e-9, atol=1e-12 * whole.psd.max())
+    assert (streamed.snr_db, streamed.thd_n_db, streamed.spur_hz) == (pytest.approx(whole.snr_db), pytest.approx(whole.thd_n_db), whole.spur_hz)
+
+
+def test_streaming_modulator_memory():
+    """
+    Only one Welch segment of the tone is held, however long it is
+    """
+    with streaming_audio_modulator(sample_rate=48000, chunk_samples=1000, analyse_from_s=0.0) as stream:
+        stream.add_segment(48000 * 20, 0.0)
+
+    assert stream.welch.num_segments == (48000 * 20 - stream.nperseg) // stream.welch.step + 1
+    assert stream.welch.segment.nbytes == 8 * stream.nperseg
+    assert not hasattr(stream, "waveform")
+
+    with pytest.raises(ValueError):
+        streaming_audio_modulator().get_spectral_metrics()
+
+    # A tone shorter than one segment at the resolution needs its duration, as spectral_metrics has the whole tone
+    audio = audio_modulator(0.1)
+    audio.modulate_waveform()
+    with streaming_audio_modulator(analyse_from_s=0.05, duration_s=0.1) as stream:
+        stream.add_segment(4800, 0.0)
+    assert np.allclose(stream.get_spectral_metrics().psd, audio.get_spectral_metrics(skip_s=0.05).psd, rtol=1e-9, atol=1e-15)
+
+
+def test_spectral_metrics():
+    """
+    The metrics of a tone with a known harmonic, spur and noise must match their levels
+    """
+    sample_rate = 48000
+    t = np.arange(2 * sample_rate) / sample_rate
+    rng = np.random.default_rng(25)
+    noise_rms = 1e-5
+    tone = 0.5 * np.sin(2 * np.pi * 1000 * t) + 5e-4 * np.sin(2 * np.pi * 3000 * t) + rng.normal(0, noise_rms, len(t))
+    tone_power = 0.5**2 / 2
+
+    metrics = spectral_metrics(tone, sample_rate, 1000)
+    noise_dbc = 10 * np.log10(noise_rms**2 * (20000 - 20) / (sample_rate / 2) / tone_power)
+
+    assert metrics.tone_hz == pytest.approx(1000)
+    assert metrics.thd_db == pytest.approx(-60, abs=0.1)
+    assert metrics.snr_db == pytest.approx(-noise_dbc, abs=0.5)
+    assert metrics.thd_n_db == pytest.approx(10 * np.log10(1e-6 + 10**(noise_dbc / 10)), abs=0.1)
+    assert (metrics.spur_hz, metrics.spur_dbc) == (3000, pytest.approx(-60, abs=0.1))
+    for level in metrics.noise_floor.values():
+        assert level == pytest.approx(10 * np.log10(noise_rms**2 / (sample_rate / 2) / tone_power), abs=1)
+
+    # A spur which is not a harmonic counts as noise
+    spur = 1e-3 * np.sin(2 * np.pi * 7777 * t)
+    metrics = spectral_metrics(tone + spur, sample_rate, 1000)
+    assert (metrics.spur_hz, metrics.spur_dbc) == (pytest.approx(7777, abs=5), pytest.approx(20 * np.log10(1e-3 / 0.5), abs=0.1))
+    assert metrics.snr_db == pytest.approx(-10 * np.log10(4e-6 + 10**(noise_dbc / 10)), abs=0.1)
+
+
+def test_spectral_metrics_fm(tmp_path):
+    """
+    The sidebands of a frequency modulated tone must be measured and plotting must use the metrics
+    """
+    audio = audio_modulator(1, sample_rate=96000)
+    t = np.arange(len(audio.modulator)) / audio.sample_rate
+    audio.modulator += 0.15 * np.cos(2 * np.pi * 150 * t) # 0.001 radian phase deviation at 150Hz
+    audio.modulate_waveform()
+
+    metrics = audio.plot_modulated_fft(tmp_path / "fft.png", skip_s=0.1)
+    assert (tmp_path / "fft.png").exists()
+    assert abs(metrics.spur_hz - 1000) == pytest.approx(150, abs=5)
+    assert metrics.spur_dbc == pytest.approx(20 * np.log10(0.001 / 2), abs=0.2)
@@ -0,0 +1,143 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+"""
+Tests for the App PLL frequency model. These run on the host only
+and do not need xsim.
+"""
+
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+from sw_pll.app_pll_model import app_pll_frac_calc, find_pll_config
+from sw_pll.dco_model import lut_dco, sigma_delta_dco
+from sw_pll.sw_pll_sim import sim_sw_pll_lut
+
+PLL_SETTINGS = [(24000000, 203, 1, 3, 4, 1, 24), (24000000, 588, 3, 77, 94, 2, 11)]
+PLL_SETTINGS += [tuple(profile[k] for k in ("input_freq", "F", "R", "f", "p", "OD", "ACD")) for profile in sigma_delta_dco.profiles.values()]
+
+
+@pytest.mark.parametrize("settings", PLL_SETTINGS)
+def test_frequencies_from_frac_regs(settings):
+    """
+    The vectorised calculation must give exactly the same frequencies as update_frac_reg, with and without frac enabled
+    """
+    rng = np.random.default_rng(1)
+    regs = rng.integers(0, 1 << 16, 2000) | (rng.integers(0, 2, 2000) * app_pll_frac_calc.frac_enable_mask)
+
+    batch_pll = app_pll_frac_calc(*settings)
+    frequencies = batch_pll.frequencies_from_frac_regs(regs)
+
+    pll = app_pll_frac_calc(*settings)
+    expected = [pll.update_frac_reg(int(reg)) for reg in regs]
+
+    assert frequencies.tolist() == expected
+    assert batch_pll.get_output_frequency() == app_pll_frac_calc(*settings).get_output_frequency() # State unchanged
+
+
+def test_frequencies_from_frac():
+    pll = app_pll_frac_calc(*PLL_SETTINGS[0])
+    f = np.arange(10)
+    frequencies = pll.frequencies_from_frac(f, 9, f % 2 == 0)
+
+    assert frequencies.tolist() == [pll.update_frac(int(f_i), 9, bool(f_i % 2 == 0)) for f_i in f]
+
+    with pytest.raises(AssertionError):
+        pll.frequencies_from_frac([256], [0])
+
+
+@pytest.mark.parametrize("settings", PLL_SETTINGS)
+def test_fast_path_matches_strict(settings):
+    """
+    The precomputed calculation used for fractional updates must match the fully checked one exactly,
+    including after the integer settings change
+    """
+    fast_pll = app_pll_frac_calc(*settings)
+    strict_pll = app_pll_frac_calc(*settings, strict=True)
+
+    rng = np.random.default_rng(2)
+    for reg in rng.integers(0, 1 << 16, 500) | (rng.integers(0, 2, 500) * app_pll_frac_calc.frac_enable_mask):
+        assert fast_pll.update_frac_reg(int(reg)) == strict_pll.update_frac_reg(int(reg))
+
+    F, R, OD, ACD = settings[1] + 1, settings[2], settings[5], settings[6] + 1
+    assert fast_pll.update_all(F, R, OD, ACD, 3, 7) == strict_pll.update_all(F, R, OD, ACD, 3, 7)
+
+
+def test_integer_settings_checked():
+    """
+    Invalid integer settings are still rejected when only they change, but per call type checks need strict
+    """
+    pll = app_pll_frac_calc(*PLL_SETTINGS[0])
+    pll.F = 8192
+    with pytest.raises(AssertionError):
+        pll.update_frac(1, 2)
+
+    with pytest.raises(AssertionError):
+        app_pll_frac_calc(*PLL_SETTINGS[0], strict=True).update_frac(1.0, 2)
+
+
+def test_pll_config_in_memory(tmp_path, monkeypatch):
+    """
+    A pll_config should give the same DCO as the header files, without any files being written until asked
+    """
+    monkeypatch.chdir(tmp_path)
+    config = find_pll_config(24000000, 12288000, max_denom=80, min_F=200, ppm_max=5, fracmin=0.695, fracmax=0.905, cache=False)
+    assert list(tmp_path.iterdir()) == []
+
+    config_dco = lut_dco(config=config)
+    config.write_headers()
+    header_dco = lut_dco()
+
+    assert config_dco.lut.tolist() == header_dco.lut.tolist()
+    assert (config_dco.min_frac, config_dco.max_frac) == pytest.approx((header_dco.min_frac, header_dco.max_frac), abs=1e-4)
+    for dco_ctrl in [None, -5, 0, 100, 300, 10000]:
+        assert config_dco.get_frequency_from_dco_control(dco_ctrl) == header_dco.get_frequency_from_dco_control(dco_ctrl)
+
+    register_text = (tmp_path / "register_setup.h").read_text()
+    for name, value in config.get_regs().items():
+        assert f"#define {name}  \t0x{value:08X}\n" in register_text
+
+
+def test_sim_from_pll_config(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = find_pll_config(24000000, 12288000, max_denom=80, min_F=200, ppm_max=5, fracmin=0.695, fracmax=0.905, cache=False)
+    sim = sim_sw_pll_lut(12288000, 48000 / 512, 0.0, 1.0, Kii=0.0, config=config)
+
+    output_clock_count = 0
+    for _ in range(10):
+        output_frequency, lock_status = sim.do_control_loop(output_clock_count)
+        output_clock_count += int(output_frequency / (48000 / 512))
+
+    assert list(tmp_path.iterdir()) == []
+    assert output_frequency == pytest.approx(12288000, rel=1e-3)
+
+
+def test_pll_config_threads_with_cache(tmp_path, monkeypatch):
+    """
+    Threads finding the same configuration with the cache enabled should all get it and leave one complete cache entry
+    """
+    monkeypatch.setenv("SW_PLL_CACHE_DIR", str(tmp_path))
+    find = lambda _: find_pll_config(24000000, 12288000, max_denom=80, min_F=200, ppm_max=5, fracmin=0.695, fracmax=0.905)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        configs = list(pool.map(find, range(8)))
+
+    assert len({(tuple(config.get_regs().items()), config.solution_index) for config in configs}) == 1
+    assert [path.suffix for path in tmp_path.iterdir()] == [".json"]
+
+
+def test_pll_config_select_pareto():
+    """
+    select="pareto" should pick a suitable solution with no larger ppm error than the default lowest F one
+    """
+    kwargs = dict(max_denom=80, min_F=200, ppm_max=5, fracmin=0.695, fracmax=0.905, cache=False)
+    lowest_F = find_pll_config(24000000, 12288000, **kwargs)
+    pareto = find_pll_config(24000000, 12288000, select="pareto", **kwargs)
+
+    assert pareto.F + 1 > 200
+    assert (pareto.f + 1) / (pareto.p + 1) == pytest.approx(0.8, rel=0.10)
+    assert abs(pareto.ppm) <= abs(lowest_F.ppm)
+
+    with pytest.raises(ValueError):
+        find_pll_config(24000000, 12288000, select="best", **kwargs)
@@ -0,0 +1,104 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+"""
+Tests for the DCO models. These run on the host only
+and do not need xsim.
+"""
+
+import copy
+import numpy as np
+import pytest
+
+from sw_pll.app_pll_model import app_pll_frac_calc, find_pll_config
+from sw_pll.dco_model import lut_dco, sdm, sigma_delta_dco
+
+
+@pytest.fixture(scope="module")
+def pll_config():
+    return find_pll_config(24000000, 12288000, max_denom=80, min_F=200, ppm_max=5, fracmin=0.843, fracmax=0.95, cache=False)
+
+
+def test_lut_frequency_table(pll_config):
+    """
+    The precomputed frequencies must match the full PLL calculation for every LUT entry
+    """
+    dco = lut_dco(config=pll_config)
+    pll = pll_config.get_app_pll()
+
+    for set_point, register in enumerate(dco.get_lut()):
+        expected = pll.update_frac_reg(int(register) | app_pll_frac_calc.frac_enable_mask)
+        assert dco.get_frequency_from_dco_control(set_point)[0] == expected
+
+
+def test_lut_dco_controls_trajectory(pll_config):
+    """
+    The vectorised lookup must give the same frequencies, lock statuses and final state as stepping one value at a time
+    """
+    dco = lut_dco(config=pll_config)
+    lut_size = dco.get_lut_size()
+
+    rng = np.random.default_rng(3)
+    dco_ctrls = rng.normal(lut_size / 2, lut_size / 3, 3000)
+    dco_ctrls[rng.integers(0, 3000, 100)] = np.nan                   # None
+    dco_ctrls[rng.integers(0, 3000, 100)] = rng.uniform(-1, 1, 100)   # Truncates to 0, not out of range
+    dco_ctrls[500:540] = lut_size / 2                                # Long enough in range to lock
+
+    vector_dco = copy.deepcopy(dco)
+    for start, end in [(0, 0), (0, 1), (1, 1700), (1700, 3000)]: # In pieces to check the state carries over
+        frequencies, lock_statuses = vector_dco.get_frequencies_from_dco_controls(dco_ctrls[start:end])
+
+        expected = [dco.get_frequency_from_dco_control(None if np.isnan(ctrl) else ctrl) for ctrl in dco_ctrls[start:end]]
+        assert frequencies.tolist() == [frequency for frequency, _ in expected]
+        assert lock_statuses.tolist() == [lock_status for _, lock_status in expected]
+        assert (vector_dco.lock_status, vector_dco.lock_count, vector_dco.last_output_frequency) == (dco.lock_status, dco.lock_count, dco.last_output_frequency)
+
+    assert set(lock_statuses.tolist()) == {-1, 0, 1}
+
+
+def test_sdm_block_matches_scalar():
+    """
+    Block modulation must give the same steps and state as do_sigma_delta_int, including once a cycle has been
+    found and replayed, when the input changes and when scalar calls are mixed in
+    """
+    block_sdm = sdm()
+    scalar_sdm = sdm()
+
+    rng = np.random.default_rng(4)
+    inputs = [524288] * 6 + [500000] * 5 + [478152] * 9 + list(rng.integers(sdm.sdm_in_min, sdm.sdm_in_max, 4)) + [500000.7] * 4
+    for block, sdm_in in enumerate(inputs):
+        if block in (5, 10):
+            assert block_sdm._cycle is not None
+            assert block_sdm.do_sigma_delta_int(sdm_in) == scalar_sdm.do_sigma_delta_int(sdm_in)
+
+        codes = block_sdm.modulate_block(sdm_in, 5000 + block)
+        assert codes.dtype == np.uint8
+        assert codes.tolist() == [scalar_sdm.do_sigma_delta_int(sdm_in) for _ in range(5000 + block)]
+        assert (block_sdm.sdm_x1, block_sdm.sdm_x2, block_sdm.sdm_x3) == (scalar_sdm.sdm_x1, scalar_sdm.sdm_x2, scalar_sdm.sdm_x3)
+
+    assert block_sdm.modulate_block(500000, 0).tolist() == []
+
+
+@pytest.mark.parametrize("profile", sigma_delta_dco.profiles.keys())
+def test_sdm_dco_frequency_table(profile):
+    """
+    The table must give the frequencies the App PLL calculates for each SDM step
+    """
+    dco = sigma_delta_dco(profile)
+    pll = app_pll_frac_calc(*(sigma_delta_dco.profiles[profile][k] for k in ("input_freq", "F", "R", "f", "p", "OD", "ACD")), strict=True)
+
+    expected = [pll.update_frac(max(step - 1, 0), dco.p_value - 1, step > 0) for step in range(dco.p_value + 1)]
+    assert dco.frequencies.tolist() == expected
+    assert dco.codes_to_frequency(np.array([8, 0, 3], dtype=np.uint8)).tolist() == [expected[8], expected[0], expected[3]]
+
+
+@pytest.mark.parametrize("profile", sigma_delta_dco.profiles.keys())
+def test_sdm_dco_modulate_block(profile):
+    block_dco = sigma_delta_dco(profile)
+    scalar_dco = sigma_delta_dco(profile)
+
+    for sdm_in in [sigma_delta_dco.profiles[profile]["mod_init"], sdm.sdm_in_min, sdm.sdm_in_max, 520000.5]:
+        frequencies = block_dco.codes_to_frequency(block_dco.modulate_block(sdm_in, 2000))
+        assert frequencies.tolist() == [scalar_dco.do_modulate(sdm_in) for _ in range(2000)]
+        assert (block_dco.sdm_out, block_dco.f) == (scalar_dco.sdm_out, scalar_dco.f)
+        assert block_dco.app_pll.get_frac_reg() == scalar_dco.app_pll.get_frac_reg()
+        assert block_dco.app_pll.get_output_frequency() == scalar_dco.app_pll.get_output_frequency()
@@ -0,0 +1,10 @@
+// Copyright 2026 XMOS LIMITED.
+// This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+// Host stand in for xcore/assert.h
+
+#pragma once
+
+#include <assert.h>
+
+#define xassert(e) assert(e)
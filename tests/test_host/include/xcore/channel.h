@@ -0,0 +1,6 @@
+// Copyright 2026 XMOS LIMITED.
+// This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+// Host stand in for xcore/channel.h. Nothing is needed from it by lib_sw_pll.
+
+#pragma once
@@ -0,0 +1,10 @@
+// Copyright 2026 XMOS LIMITED.
+// This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+// Host stand in for xcore/hwtimer.h. The reference time is simulated by sw_pll_host.c.
+
+#pragma once
+
+#include <stdint.h>
+
+uint32_t get_reference_time(void);
@@ -0,0 +1,19 @@
+// Copyright 2026 XMOS LIMITED.
+// This Software is subject to the terms of the XMOS Public Licence: Version 1.
+
+// Host stand in for xs1.h so lib_sw_pll can be built natively. Register writes are
+// captured by sw_pll_host.c rather than going to the switch.
+
+#pragma once
+
+#include <stdint.h>
+
+#define XS1_TIMER_MHZ                               100
+
+#define XS1_SSWITCH_SS_APP_PLL_CTL_NUM              0x6
+#define XS1_SSWITCH_SS_APP_PLL_FRAC_N_DIVIDER_NUM   0x7
+#define XS1_SSWITCH_SS_APP_CLK_DIVIDER_NUM          0x8
+
+int write_sswitch_reg(unsigned tileid, unsigned reg, unsigned data);
+int write_sswitch_reg_no_ack(unsigned tileid, unsigned reg, unsigned data);
+unsigned get_local_tile_id(void);
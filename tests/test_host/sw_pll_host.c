@@ -0,0 +1,213 @@
+// Copyright 2026 XMOS LIMITED.
+// This Software is subject to the terms of the XMOS Public Licence: Version 1.
+///
+/// Host (native) build support for lib_sw_pll so the equivalence tests can run
+/// without xsim. This provides the hardware functions declared by the stub
+/// headers in include/ and batch versions of the calls made by the xsim test
+/// apps, each of which runs a whole vector of inputs and records the same
+/// values the test apps print.
+///
+/// Built and loaded by host_sw_pll.py with -D__XS3A__ so the library sources
+/// are compiled unchanged.
+///
+#include <stddef.h>
+#include <stdint.h>
+#include <sw_pll.h>
+
+#define NUM_SSWITCH_REGS 16
+
+extern int32_t sw_pll_sdm_post_control_proc(sw_pll_state_t * const sw_pll, int32_t error);
+
+// Last value written to each switch register and a simulated reference timer
+static uint32_t sswitch_regs[NUM_SSWITCH_REGS];
+static uint32_t reference_time;
+
+
+int write_sswitch_reg(unsigned tileid, unsigned reg, unsigned data)
+{
+    (void)tileid;
+    if(reg < NUM_SSWITCH_REGS){
+        sswitch_regs[reg] = data;
+    }
+    return 1;
+}
+
+int write_sswitch_reg_no_ack(unsigned tileid, unsigned reg, unsigned data)
+{
+    return write_sswitch_reg(tileid, reg, data);
+}
+
+unsigned get_local_tile_id(void)
+{
+    return 0;
+}
+
+uint32_t get_reference_time(void)
+{
+    // Advance 1us per read so blocking delays finish quickly
+    reference_time += XS1_TIMER_MHZ;
+    return reference_time;
+}
+
+uint32_t sw_pll_host_read_sswitch_reg(unsigned reg)
+{
+    return reg < NUM_SSWITCH_REGS ? sswitch_regs[reg] : 0;
+}
+
+size_t sw_pll_host_state_size(void)
+{
+    return sizeof(sw_pll_state_t);
+}
+
+
+/// LUT. Same init as test_app and test_app_low_level_api.
+void sw_pll_host_lut_init(  sw_pll_state_t * const sw_pll,
+                            float kp,
+                            float ki,
+                            float kii,
+                            size_t loop_rate_count,
+                            size_t pll_ratio,
+                            uint32_t ref_clk_expected_inc,
+                            const int16_t * const lut_table_base,
+                            size_t num_lut_entries,
+                            uint32_t app_pll_ctl_reg_val,
+                            uint32_t app_pll_div_reg_val,
+                            unsigned nominal_lut_idx,
+                            unsigned ppm_range)
+{
+    sw_pll_lut_init(sw_pll,
+                    SW_PLL_15Q16(kp),
+                    SW_PLL_15Q16(ki),
+                    SW_PLL_15Q16(kii),
+                    loop_rate_count,
+                    pll_ratio,
+                    ref_clk_expected_inc,
+                    lut_table_base,
+                    num_lut_entries,
+                    app_pll_ctl_reg_val,
+                    app_pll_div_reg_val,
+                    nominal_lut_idx,
+                    ppm_range);
+}
+
+/// Runs sw_pll_lut_do_control for each port timer pair, as test_app does per line
+void sw_pll_host_lut_do_control(sw_pll_state_t * const sw_pll,
+                                const uint16_t *mclk_pt,
+                                const uint16_t *ref_pt,
+                                size_t n,
+                                int32_t *lock_status,
+                                uint16_t *reg_val,
+                                int16_t *mclk_diff,
+                                int32_t *error_accum,
+                                int32_t *error_accum_accum,
+                                uint8_t *first_loop)
+{
+    for(size_t i = 0; i < n; i++){
+        lock_status[i] = sw_pll_lut_do_control(sw_pll, mclk_pt[i], ref_pt[i]);
+        reg_val[i] = sw_pll->lut_state.current_reg_val;
+        mclk_diff[i] = sw_pll->pfd_state.mclk_diff;
+        error_accum[i] = sw_pll->pi_state.error_accum;
+        error_accum_accum[i] = sw_pll->pi_state.error_accum_accum;
+        first_loop[i] = sw_pll->first_loop;
+    }
+}
+
+/// Runs sw_pll_lut_do_control_from_error for each error, as test_app_low_level_api does per line
+void sw_pll_host_lut_do_control_from_error( sw_pll_state_t * const sw_pll,
+                                            const int16_t *error,
+                                            size_t n,
+                                            int32_t *lock_status,
+                                            uint16_t *reg_val,
+                                            int32_t *error_accum,
+                                            int32_t *error_accum_accum,
+                                            uint8_t *first_loop)
+{
+    for(size_t i = 0; i < n; i++){
+        lock_status[i] = sw_pll_lut_do_control_from_error(sw_pll, error[i]);
+        reg_val[i] = sw_pll->lut_state.current_reg_val;
+        error_accum[i] = sw_pll->pi_state.error_accum;
+        error_accum_accum[i] = sw_pll->pi_state.error_accum_accum;
+        first_loop[i] = sw_pll->first_loop;
+    }
+}
+
+
+/// SDM controller. Same init as test_app_sdm_ctrl.
+void sw_pll_host_sdm_init(  sw_pll_state_t * const sw_pll,
+                            float kp,
+                            float ki,
+                            float kii,
+                            size_t loop_rate_count,
+                            size_t pll_ratio,
+                            uint32_t ref_clk_expected_inc,
+                            uint32_t app_pll_ctl_reg_val,
+                            uint32_t app_pll_div_reg_val,
+                            uint32_t app_pll_frac_reg_val,
+                            int32_t ctrl_mid_point,
+                            unsigned ppm_range)
+{
+    sw_pll_sdm_init(sw_pll,
+                    SW_PLL_15Q16(kp),
+                    SW_PLL_15Q16(ki),
+                    SW_PLL_15Q16(kii),
+                    loop_rate_count,
+                    pll_ratio,
+                    ref_clk_expected_inc,
+                    app_pll_ctl_reg_val,
+                    app_pll_div_reg_val,
+                    app_pll_frac_reg_val,
+                    ctrl_mid_point,
+                    ppm_range);
+}
+
+/// Runs the PI controller and post processing for each mclk diff, as test_app_sdm_ctrl does per line
+void sw_pll_host_sdm_control_from_mclk_diff(sw_pll_state_t * const sw_pll,
+                                            const int16_t *mclk_diff,
+                                            size_t n,
+                                            int32_t *error,
+                                            int32_t *dco_ctl,
+                                            int32_t *lock_status)
+{
+    for(size_t i = 0; i < n; i++){
+        error[i] = sw_pll_do_pi_ctrl(sw_pll, -mclk_diff[i]);
+        dco_ctl[i] = sw_pll_sdm_post_control_proc(sw_pll, error[i]);
+        lock_status[i] = sw_pll->lock_status;
+    }
+}
+
+/// Runs sw_pll_sdm_do_control for each port timer pair
+void sw_pll_host_sdm_do_control(sw_pll_state_t * const sw_pll,
+                                const uint16_t *mclk_pt,
+                                const uint16_t *ref_pt,
+                                size_t n,
+                                uint8_t *control_done,
+                                int32_t *dco_ctl,
+                                int32_t *lock_status)
+{
+    for(size_t i = 0; i < n; i++){
+        control_done[i] = sw_pll_sdm_do_control(sw_pll, mclk_pt[i], ref_pt[i]);
+        dco_ctl[i] = sw_pll->sdm_state.current_ctrl_val;
+        lock_status[i] = sw_pll->lock_status;
+    }
+}
+
+
+/// SDM DCO. Same as test_app_sdm_dco, except the fractional register value is the one written
+/// to the App PLL. These are the steps of sw_pll_do_sigma_delta, which does not return ds_out.
+void sw_pll_host_init_sigma_delta(sw_pll_state_t * const sw_pll)
+{
+    sw_pll_init_sigma_delta(&sw_pll->sdm_state);
+}
+
+void sw_pll_host_do_sigma_delta(sw_pll_state_t * const sw_pll,
+                                const int32_t *ds_in,
+                                size_t n,
+                                int32_t *ds_out,
+                                uint32_t *frac_val)
+{
+    for(size_t i = 0; i < n; i++){
+        ds_out[i] = sw_pll_calc_sigma_delta(&sw_pll->sdm_state, ds_in[i]);
+        sw_pll_write_frac_reg((tileref_t)get_local_tile_id(), sw_pll_sdm_out_to_frac_reg(ds_out[i]));
+        frac_val[i] = sswitch_regs[XS1_SSWITCH_SS_APP_PLL_FRAC_N_DIVIDER_NUM];
+    }
+}
@@ -0,0 +1,130 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+"""
+Tests that the model kernels give bit exact results with each backend. These run on the host
+only and do not need xsim.
+
+The "kernels" backend routes the models through sw_pll.kernels, which are plain Python functions
+when Numba is not installed, so the dispatch and the kernel arithmetic are checked either way.
+"""
+
+import numpy as np
+import pytest
+
+from sw_pll import kernels
+from sw_pll.app_pll_model import find_pll_config
+from sw_pll.controller_model import pi_ctrl
+from sw_pll.dco_model import lut_dco, sdm
+
+
+@pytest.fixture(scope="module")
+def pll_config():
+    return find_pll_config(24000000, 12288000, max_denom=80, min_F=200, ppm_max=5, fracmin=0.843, fracmax=0.95, cache=False)
+
+
+@pytest.fixture(params=["python", "kernels"])
+def backend(request, monkeypatch):
+    """
+    Run the test once with the pure Python models and once using the kernels, compiled if Numba is installed
+    """
+    monkeypatch.setattr(kernels, "_enabled", request.param == "kernels")
+    return request.param
+
+
+def _reference(run, *args):
+    """
+    Run with the pure Python models
+    """
+    previous = kernels.set_jit_enabled(False)
+    try:
+        return run(*args)
+    finally:
+        kernels._enabled = previous
+
+
+def _run_sdm(sdm_ins):
+    dco = sdm()
+    outputs = [dco.do_sigma_delta_int(sdm_in) for sdm_in in sdm_ins]
+    block = dco.modulate_block(sdm_ins[-1], 2000)
+    return outputs, block.tolist(), (dco.sdm_x1, dco.sdm_x2, dco.sdm_x3)
+
+
+def _run_pi(errors, i_windup_limit, ii_windup_limit):
+    ctrl = pi_ctrl(0.7, 2.3, Kii=0.01, i_windup_limit=i_windup_limit, ii_windup_limit=ii_windup_limit)
+    return [(ctrl.do_control_from_error(error), ctrl.error_accum, ctrl.error_accum_accum) for error in errors]
+
+
+def _run_lut(pll_config, dco_ctrls):
+    dco = lut_dco(config=pll_config)
+    results = [dco.get_frequency_from_dco_control(ctrl) for ctrl in dco_ctrls]
+    return results, (dco.lock_status, dco.lock_count, dco.last_output_frequency)
+
+
+def test_sdm_backends(backend):
+    rng = np.random.default_rng(11)
+    sdm_ins = np.repeat(rng.integers(60000, 980000, 40), rng.integers(1, 500, 40))
+
+    assert _run_sdm(sdm_ins) == _reference(_run_sdm, sdm_ins)
+
+
+@pytest.mark.parametrize("windup_limits", [(None, None), (300.0, 2000.0), (0.0, 0.0)])
+def test_pi_ctrl_backends(backend, windup_limits):
+    rng = np.random.default_rng(12)
+    errors = np.concatenate((rng.normal(0, 50, 2000), rng.integers(-200, 200, 500)))
+
+    assert _run_pi(errors, *windup_limits) == _reference(_run_pi, errors, *windup_limits)
+
+
+def test_lut_backends(backend, pll_config):
+    rng = np.random.default_rng(14)
+    lut_size = lut_dco(config=pll_config).get_lut_size()
+    dco_ctrls = list(rng.normal(lut_size / 2, lut_size / 3, 3000))
+    dco_ctrls[500:540] = [lut_size / 2] * 40 # Long enough in range to lock
+    for i in rng.integers(0, 3000, 100):
+        dco_ctrls[i] = None
+
+    assert _run_lut(pll_config, dco_ctrls) == _reference(_run_lut, pll_config, dco_ctrls)
+
+
+def test_compiled_kernels(pll_config):
+    """
+    With Numba installed the kernels must be compiled, and the compiled models must match the pure Python ones
+    """
+    pytest.importorskip("numba")
+    assert kernels.jit_available
+
+    for kernel in (kernels.sdm_step, kernels.sdm_block, kernels.sdm_batch_block, kernels.sdm_cycle_search, kernels.pi_step, kernels.lut_step):
+        assert hasattr(kernel, "py_func"), f"{kernel} is not compiled"
+
+    state = (1 << 20, -(1 << 18), 12345)
+    codes, *compiled_state = kernels.sdm_block(500000, 3000, *state)
+    py_codes, *py_state = kernels.sdm_block.py_func(500000, 3000, *state)
+    assert codes.tolist() == py_codes.tolist() and compiled_state == py_state
+
+    sdm_ins = np.array([60000, 500000, 980000])
+    compiled_state = [np.array([value] * 3) for value in state]
+    py_state = [np.array([value] * 3) for value in state]
+    codes = kernels.sdm_batch_block(sdm_ins, 3000, *compiled_state)
+    py_codes = kernels.sdm_batch_block.py_func(sdm_ins, 3000, *py_state)
+    assert codes.tolist() == py_codes.tolist()
+    assert [x.tolist() for x in compiled_state] == [x.tolist() for x in py_state]
+
+    search = (500000, 3000, *state, *state, 1, 0)
+    compiled = kernels.sdm_cycle_search(*search)
+    py = kernels.sdm_cycle_search.py_func(*search)
+    assert compiled[0].tolist() == py[0].tolist() and compiled[1:] == py[1:]
+
+    rng = np.random.default_rng(15)
+    sdm_ins = np.repeat(rng.integers(60000, 980000, 20), rng.integers(1, 500, 20))
+    errors = rng.normal(0, 50, 2000)
+    lut_size = lut_dco(config=pll_config).get_lut_size()
+    dco_ctrls = list(rng.normal(lut_size / 2, lut_size / 3, 2000))
+
+    previous = kernels.set_jit_enabled(True)
+    try:
+        assert kernels.jit_enabled()
+        compiled = (_run_sdm(sdm_ins), _run_pi(errors, 300.0, 2000.0), _run_lut(pll_config, dco_ctrls))
+    finally:
+        kernels._enabled = previous
+
+    assert compiled == _reference(lambda: (_run_sdm(sdm_ins), _run_pi(errors, 300.0, 2000.0), _run_lut(pll_config, dco_ctrls)))
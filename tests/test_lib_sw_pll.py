@@ -24,6 +24,8 @@ from itertools import product
 from pathlib import Path
 from matplotlib import pyplot as plt
 
+from host_sw_pll import HostDut, requires_host_build
+
 DUT_XE = Path(__file__).parent / "test_app/bin/test_app.xe"
 BIN_PATH = Path(__file__).parent/"bin"
 
@@ -178,11 +180,13 @@ def bin_dir():
     return d
 
 # pytest params for fixtures aren't as flexible as with tests as far as I can tell
-# so manually doing the combination here, 16k and 48k for both xsim and python versions.
-BASIC_TEST_PARAMS = list(product([16000, 48000], [Dut, SimDut]))
+# so manually doing the combination here, 16k and 48k for xsim, python and host build versions.
+BASIC_TEST_PARAMS = list(product([16000, 48000], [Dut, SimDut, HostDut]))
 
 @pytest.fixture(
-    scope="module", params=BASIC_TEST_PARAMS, ids=[str(i) for i in BASIC_TEST_PARAMS]
+    scope="module",
+    params=[pytest.param(p, marks=requires_host_build) if p[1] is HostDut else p for p in BASIC_TEST_PARAMS],
+    ids=[str(i) for i in BASIC_TEST_PARAMS]
 )
 def basic_test_vector(request, solution_12288, bin_dir):
     """
@@ -9,6 +9,7 @@ from sw_pll.app_pll_model import pll_solution, app_pll_frac_calc
 from sw_pll.sw_pll_sim import sim_sw_pll_lut
 
 from test_lib_sw_pll import SimDut, Dut, DutArgs, solution_12288, bin_dir
+from host_sw_pll import HostDut, requires_host_build
 
 from pathlib import Path
 from matplotlib import pyplot as plt
@@ -17,7 +18,8 @@ DUT_XE_LOW_LEVEL = Path(__file__).parent / "test_app_low_level_api/bin/test_app_
 BIN_PATH = Path(__file__).parent/"bin"
 
 
-def test_low_level_equivalence(solution_12288, bin_dir):
+@pytest.mark.parametrize("c_dut_class", [Dut, pytest.param(HostDut, marks=requires_host_build)])
+def test_low_level_equivalence(solution_12288, bin_dir, c_dut_class):
     """
     Simple low level test of equivalence using do_control_from_error
     Feed in random numbers into C and Python DUTs and see if we get the same results
@@ -67,7 +69,7 @@ def test_low_level_equivalence(solution_12288, bin_dir):
         "ticks": []
     }
     names = ["C", "Python"]
-    duts = [Dut(args, pll, xe_file=DUT_XE_LOW_LEVEL), SimDut(args, pll)]
+    duts = [c_dut_class(args, pll, xe_file=DUT_XE_LOW_LEVEL), SimDut(args, pll)]
     
     results = {}
     for name in names:
@@ -110,7 +112,7 @@ def test_low_level_equivalence(solution_12288, bin_dir):
     plt.legend(loc="upper left")
     plt.xlabel("Iteration")
     plt.ylabel("mclk")
-    plt.savefig(bin_dir/f"c-vs-python-low-level-equivalence-mclk.png")
+    plt.savefig(bin_dir/f"c-vs-python-low-level-equivalence-mclk-{c_dut_class.__name__}.png")
     plt.close()
 
     # Check for equivalence
@@ -125,3 +127,41 @@ def test_low_level_equivalence(solution_12288, bin_dir):
 
     print("TEST PASSED!")
 
+
+
+@requires_host_build
+def test_low_level_batch_equivalence(solution_12288):
+    """
+    As test_low_level_equivalence but a longer run through the host build in one call
+    """
+    _, xtal_freq, target_mclk_f, sol = solution_12288
+    lut_size = len(sol.lut)
+
+    args = DutArgs(
+        target_output_frequency=target_mclk_f,
+        kp=0.0,
+        ki=2.0,
+        kii=1.0,
+        loop_rate_count=1,
+        pll_ratio=int(target_mclk_f / 48000),
+        ref_clk_expected_inc=0,
+        app_pll_ctl_reg_val=0,
+        app_pll_div_reg_val=sol.lut[0],
+        nominal_lut_idx=lut_size//2,
+        ppm_range=int(lut_size * 2),
+        lut=sol.lut,
+    )
+    pll = app_pll_frac_calc(xtal_freq, sol.F, sol.R, 1, 2, sol.OD, sol.ACD)
+
+    rng = np.random.default_rng(7)
+    input_errors = rng.integers(-lut_size // 10, lut_size // 10, size=5000)
+    results = HostDut(args, pll).do_control_from_error_batch(input_errors)
+
+    sim = SimDut(args, pll)
+    expected = [sim.do_control_from_error(input_error) for input_error in input_errors]
+
+    mclk = pll.frequencies_from_frac_regs(results["reg"].astype(np.int64) | app_pll_frac_calc.frac_enable_mask)
+    assert np.allclose(mclk, [e[1] for e in expected])
+    assert np.allclose(results["error_accum"], [e[3] for e in expected])
+    assert np.allclose(results["error_accum_accum"], [e[4] for e in expected])
+    assert results["locked"].tolist() == [e[0] for e in expected]
@@ -0,0 +1,77 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+"""
+Tests for the binary copy of the LUT headers. These run on the host only
+and do not need xsim.
+"""
+
+import numpy as np
+import pytest
+
+from sw_pll.app_pll_model import find_pll_config
+from sw_pll.dco_model import lut_dco
+from sw_pll import lut_sidecar
+from sw_pll.lut_sidecar import sidecar_path
+
+
+@pytest.fixture
+def headers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = find_pll_config(24000000, 12288000, max_denom=80, min_F=200, ppm_max=5, fracmin=0.695, fracmax=0.905, cache=False)
+    config.write_headers()
+    return config
+
+
+def test_sidecar_matches_headers(headers):
+    sidecar_dco = lut_dco()
+    assert isinstance(sidecar_dco.lut, np.memmap)
+
+    sidecar_path("fractions.h").unlink()
+    text_dco = lut_dco()
+    assert not isinstance(text_dco.lut, np.memmap)
+
+    assert sidecar_dco.lut.tolist() == text_dco.lut.tolist()
+    for dco_ctrl in [None, -5, 0, 100, 300, 10000]:
+        assert sidecar_dco.get_frequency_from_dco_control(dco_ctrl) == text_dco.get_frequency_from_dco_control(dco_ctrl)
+
+
+def test_sidecar_shared(headers):
+    assert lut_dco().lut is lut_dco().lut
+
+
+def test_sidecar_ignored_when_stale(headers, tmp_path):
+    """
+    Changing either header after the sidecar was written means the text must be parsed
+    """
+    register_setup = tmp_path / "register_setup.h"
+    register_setup.write_text(register_setup.read_text().replace(f"ACD: {headers.ACD}", f"ACD: {headers.ACD + 1}"))
+
+    dco = lut_dco()
+    assert not isinstance(dco.lut, np.memmap)
+    assert dco.app_pll.ACD == headers.ACD + 1
+
+
+def test_sidecar_headers_hashed_when_changed(headers, tmp_path, monkeypatch):
+    """
+    The headers are only read to check the sidecar is up to date when their size or modification time changes
+    """
+    hashed = []
+    source_hash = lut_sidecar._source_hash
+    monkeypatch.setattr(lut_sidecar, "_source_hash", lambda filename: hashed.append(filename) or source_hash(filename))
+
+    assert isinstance(lut_dco().lut, np.memmap)
+    assert len(hashed) == 2
+    assert isinstance(lut_dco().lut, np.memmap)
+    assert len(hashed) == 2
+
+    register_setup = tmp_path / "register_setup.h"
+    register_setup.write_text(register_setup.read_text() + "\n")
+    assert not isinstance(lut_dco().lut, np.memmap)
+    assert len(hashed) == 4
+
+
+def test_sidecar_ignored_when_truncated(headers):
+    path = sidecar_path("fractions.h")
+    path.write_bytes(path.read_bytes()[:-8])
+
+    assert not isinstance(lut_dco().lut, np.memmap)
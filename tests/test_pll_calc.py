@@ -0,0 +1,268 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+"""
+Tests for the pll_calc solution search. These run on the host only
+and do not need xsim.
+"""
+
+import os
+import pytest
+from math import gcd
+
+from sw_pll import pll_calc
+from sw_pll.pll_calc import find_pll, find_pll_many, find_shared_configs, get_frac_list, iter_pll_solutions, rank_pll_solutions, solution_objectives, write_frac_header
+from sw_pll.dco_model import lut_dco
+from sw_pll.solution_cache import solution_cache
+
+# Small search spaces so the reference loop search completes quickly
+SEARCH_PARAMS = [
+    dict(input_freq=24, output_target=12.288, ppm_error_max=10, den_max=12, pfcmin=6.0, maxsol=500, app=1, raw=1, fracmin=0.5, fracmax=0.9),
+    dict(input_freq=24, output_target=24.576, ppm_error_max=50, den_max=16, pfcmin=2.0, maxsol=500, app=1, raw=0),
+    dict(input_freq=24, output_target=600, ppm_error_max=0, den_max=0, pfcmin=1.0, maxsol=200, app=0, raw=1),
+    dict(input_freq=24, output_target=11.2896, ppm_error_max=10, den_max=12, pfcmin=1.0, maxsol=20, app=1, raw=1),
+]
+
+
+@pytest.mark.parametrize("params", SEARCH_PARAMS)
+def test_inverse_solver_matches_loop(params):
+    """
+    The inverse solver must find exactly the same solutions, in the same order, as the reference loop search
+    """
+    loop_solutions = find_pll(**params, solver="loop", cache=False)
+    inverse_solutions = find_pll(**params, solver="inverse", cache=False)
+
+    assert len(loop_solutions) > 0, "Expected some solutions"
+    assert inverse_solutions == loop_solutions
+
+
+@pytest.mark.parametrize("solver", ["loop", "vector"])
+@pytest.mark.parametrize("params", [SEARCH_PARAMS[0], SEARCH_PARAMS[3]])
+def test_parallel_search(params, solver):
+    """
+    Sharing the search between processes must give the same result as the serial search, including maxsol truncation
+    """
+    serial_solutions = find_pll(**params, solver=solver, cache=False)
+    parallel_solutions = find_pll(**params, solver=solver, cache=False, workers=2)
+
+    assert parallel_solutions == serial_solutions
+
+
+@pytest.mark.parametrize("params", SEARCH_PARAMS[:2] + SEARCH_PARAMS[3:])
+def test_vector_solver_matches_inverse(params):
+    """
+    Away from the limits the exact vector search agrees with the float based searches
+    """
+    inverse_solutions = find_pll(**params, solver="inverse", cache=False)
+    vector_solutions = find_pll(**params, solver="vector", cache=False)
+
+    assert vector_solutions == inverse_solutions
+
+
+def test_vector_solver_exact_limits():
+    """
+    24MHz / 17 * 2550 is exactly the 3.6GHz VCO limit but is just over it in floating point.
+    The exact integer checks should keep this solution.
+    """
+    params = SEARCH_PARAMS[2]
+    inverse_solutions = find_pll(**params, solver="inverse", cache=False)
+    vector_solutions = find_pll(**params, solver="vector", cache=False)
+
+    extra = [sln for sln in vector_solutions if sln not in inverse_solutions]
+    assert [(sln["ref_div"], sln["fb_div"][0], sln["op_div"], sln["fin_op_div"]) for sln in extra] == [(17, 2550, 3, 1)]
+    assert all(sln in vector_solutions for sln in inverse_solutions)
+
+
+@pytest.mark.parametrize("den_max, fracmin, fracmax", [(80, 0.65, 0.95), (120, 0.764, 0.884), (17, 0.0, 1.0), (12, 1/3, 2/3), (1, 0.0, 1.0)])
+def test_frac_list(den_max, fracmin, fracmax):
+    """
+    Check the Farey walk produces every reduced fraction in range, in order
+    """
+    expected = sorted((m / n, m, n) for n in range(2, den_max + 1) for m in range(1, n) if gcd(m, n) == 1 and fracmin < m / n < fracmax)
+
+    assert list(get_frac_list(den_max, fracmin, fracmax)) == expected
+
+
+def test_lut_from_frac_list(tmp_path):
+    """
+    A LUT built directly from the fraction table should match the one read back from the header
+    """
+    frac_list = get_frac_list(80, 0.65, 0.95)
+    header = tmp_path / "fractions.h"
+    write_frac_header(frac_list, 80, header)
+
+    lut_header = [int(line.split(",")[0], 16) for line in header.read_text().splitlines() if line.startswith("0x")]
+    lut_table, min_frac, max_frac = lut_dco._lut_from_frac_list(frac_list)
+
+    assert lut_table.tolist() == lut_header
+    assert (min_frac, max_frac) == (frac_list[0][0], frac_list[-1][0])
+
+
+AUDIO_TARGETS = [11.2896, 12.288, 22.5792, 24.576]
+
+@pytest.mark.parametrize("raw", [0, 1])
+def test_find_pll_many(raw):
+    """
+    Searching for several targets at once should give the same as searching for each in turn
+    """
+    params = dict(input_freq=24, ppm_error_max=5, den_max=40, pfcmin=1.0, maxsol=2000, app=1, raw=raw)
+    results = find_pll_many(output_targets=AUDIO_TARGETS, **params)
+
+    assert list(results) == AUDIO_TARGETS
+    for target in AUDIO_TARGETS:
+        assert results[target] == find_pll(output_target=target, **params, cache=False)
+
+
+def test_find_pll_many_cache(tmp_path, monkeypatch):
+    """
+    find_pll_many shares cache entries with find_pll using the inverse solver and only searches the targets not cached
+    """
+    monkeypatch.setenv("SW_PLL_CACHE_DIR", str(tmp_path))
+    params = dict(input_freq=24, ppm_error_max=5, den_max=40, pfcmin=1.0, maxsol=2000, app=1, raw=1)
+    expected = {target: find_pll(output_target=target, **params, solver="inverse") for target in AUDIO_TARGETS[:2]}
+
+    searched = []
+    search_inverse_many = pll_calc._search_inverse_many
+    def record_search(input_freq, output_targets, *args):
+        searched.extend(output_targets)
+        return search_inverse_many(input_freq, output_targets, *args)
+    monkeypatch.setattr(pll_calc, "_search_inverse_many", record_search)
+
+    results = find_pll_many(output_targets=AUDIO_TARGETS, **params)
+    assert searched == AUDIO_TARGETS[2:]
+    for target in AUDIO_TARGETS[:2]:
+        assert results[target] == expected[target]
+    assert results[AUDIO_TARGETS[2]] == find_pll(output_target=AUDIO_TARGETS[2], **params)
+
+    searched.clear()
+    assert find_pll_many(output_targets=AUDIO_TARGETS, **params) == results
+    assert searched == []
+
+
+def test_find_shared_configs():
+    """
+    From 24MHz, R=5 F=225 OD=1 reaches all four audio clocks by only changing the fraction and ACD
+    """
+    results = find_pll_many(input_freq=24, output_targets=AUDIO_TARGETS, ppm_error_max=5, den_max=40, pfcmin=1.0, maxsol=2000, app=1, raw=1)
+    shared = find_shared_configs(results)
+
+    assert [(c["ref_div"], c["fb_int"], c["op_div"]) for c in shared] == [(5, 225, 1)]
+    for target, solutions in shared[0]["solutions"].items():
+        assert solutions
+        for solution in solutions:
+            assert solution in results[target]
+            assert (solution["ref_div"], int(solution["fb_div"][0]), solution["op_div"]) == (5, 225, 1)
+
+
+def test_solution_cache(tmp_path, monkeypatch):
+    """
+    A repeated search should be served from the cache and give the same solutions
+    """
+    monkeypatch.setenv("SW_PLL_CACHE_DIR", str(tmp_path))
+    params = SEARCH_PARAMS[1]
+
+    first = find_pll(**params, solver="loop")
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+    # Make the solver unusable to prove the second search comes from the cache
+    monkeypatch.setitem(pll_calc.solvers, "loop", None)
+    assert find_pll(**params, solver="loop") == first
+
+    # Results cached by a previous version of the solver must not be used
+    version = pll_calc.solver_versions["loop"]
+    monkeypatch.setitem(pll_calc.solver_versions, "loop", version + 1)
+    with pytest.raises(TypeError):
+        find_pll(**params, solver="loop")
+    monkeypatch.setitem(pll_calc.solver_versions, "loop", version)
+
+    # Opting out means the solver must run
+    with pytest.raises(TypeError):
+        find_pll(**params, solver="loop", cache=False)
+    monkeypatch.setenv("SW_PLL_NO_CACHE", "1")
+    with pytest.raises(TypeError):
+        find_pll(**params, solver="loop")
+
+
+def test_solution_cache_eviction(tmp_path):
+    """
+    Least recently used entries are removed once the cache is full
+    """
+    cache = solution_cache(tmp_path, max_entries=2)
+    cache.put({"target": 1}, [1])
+    cache.put({"target": 2}, [2])
+    os.utime(cache._path({"target": 1}), (0, 0))
+    os.utime(cache._path({"target": 2}), (1, 1))
+
+    assert cache.get({"target": 1}) == [1] # Now the most recently used
+    cache.put({"target": 3}, [3])
+
+    assert cache.get({"target": 2}) is None
+    assert cache.get({"target": 1}) == [1]
+    assert cache.get({"target": 3}) == [3]
+
+
+@pytest.mark.parametrize("params", SEARCH_PARAMS)
+def test_iter_pll_solutions(params):
+    """
+    The generator yields the raw search results in the same order as find_pll, or lowest feedback divider first
+    """
+    search_params = {k: v for k, v in params.items() if k not in ("maxsol", "raw")}
+    raw_solutions = find_pll(**{**params, "maxsol": 100000, "raw": 1}, cache=False)
+
+    by_ref_div = [sln._asdict() for sln in iter_pll_solutions(**search_params)]
+    by_fb_div = [sln._asdict() for sln in iter_pll_solutions(**search_params, order="fb_div")]
+    for solution in raw_solutions:
+        solution["fb_div"] = tuple(solution["fb_div"])
+
+    assert by_ref_div == raw_solutions
+    assert by_fb_div == sorted(raw_solutions, key=lambda sln: sln["fb_div"][0])
+
+
+def test_iter_pll_solutions_early_stop():
+    """
+    Stopping early, including while a process pool is still searching, gives the start of the full sequence
+    """
+    params = SEARCH_PARAMS[1]
+    search_params = {k: v for k, v in params.items() if k not in ("maxsol", "raw")}
+    expected = list(iter_pll_solutions(**search_params))
+
+    solutions = iter_pll_solutions(**search_params, solver="loop", workers=2)
+    first = [next(solutions) for _ in range(5)]
+    solutions.close()
+
+    assert first == expected[:5]
+
+
+@pytest.mark.parametrize("objectives", [("ppm_error", "frac_offset", "lut_span", "denominator", "pfc_freq", "vco_freq"), ("vco_freq", "ppm_error")])
+def test_rank_pll_solutions(objectives):
+    """
+    Check the bounded ranking against a brute force Pareto front of every solution
+    """
+    params = dict(input_freq=24, output_target=12.288, ppm_error_max=10, den_max=20, pfcmin=2.0, app=1, fracmin=0.6, fracmax=0.9)
+    solutions = list(iter_pll_solutions(**params))
+    funcs = solution_objectives(params["fracmin"], params["fracmax"])
+    values = {sln: tuple(funcs[name](sln) for name in objectives) for sln in solutions}
+
+    expected = []
+    for sln in solutions:
+        dominated = any(all(x <= y for x, y in zip(values[other], values[sln])) and values[other] != values[sln] for other in solutions)
+        if not dominated and values[sln] not in [values[e] for e in expected]:
+            expected.append(sln)
+    expected.sort(key=lambda sln: values[sln])
+
+    assert rank_pll_solutions(solutions, k=len(solutions), objectives=objectives, fracmin=0.6, fracmax=0.9) == expected
+
+    # When bounded, the result is still on the front and contains the best solution
+    ranked = rank_pll_solutions(iter(solutions), k=3, objectives=objectives, fracmin=0.6, fracmax=0.9)
+    assert 0 < len(ranked) <= 3
+    assert ranked[0] == expected[0]
+    assert all(sln in expected for sln in ranked)
+
+
+def test_rank_pll_solutions_unknown_objective():
+    with pytest.raises(ValueError):
+        rank_pll_solutions([], objectives=("nonexistent",))
+
+
+def test_unknown_solver():
+    with pytest.raises(ValueError):
+        find_pll(solver="nonexistent")
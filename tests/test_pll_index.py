@@ -0,0 +1,87 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+"""
+Tests for the index of reachable App PLL frequencies. These run on the host only
+and do not need xsim.
+"""
+
+from math import gcd
+
+import numpy as np
+import pytest
+
+from sw_pll.app_pll_model import app_pll_frac_calc
+from sw_pll.pll_index import pll_index
+
+INDEX_PARAMS = dict(input_frequency=24e6, min_frequency=12.2e6, max_frequency=12.4e6, max_denom=4, pfc_min=24e6)
+
+# The second allows R from 0 to 3, with a narrower band to keep the brute force search quick
+BRUTE_FORCE_PARAMS = [INDEX_PARAMS, dict(input_frequency=24e6, min_frequency=12.28e6, max_frequency=12.3e6, max_denom=3, pfc_min=6e6)]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return pll_index.build(**INDEX_PARAMS)
+
+
+@pytest.mark.parametrize("params", BRUTE_FORCE_PARAMS)
+def test_index_matches_brute_force(params):
+    """
+    Walk every setting in turn, stopping each ACD walk once the output drops below the band
+    """
+    index = pll_index.build(**params)
+    input_frequency = params["input_frequency"]
+
+    # (enable, f, p) of the integer setting and every reduced fraction m / n with n up to max_denom
+    fracs = [(0, 0, 0)] + [(1, m - 1, n - 1) for n in range(2, params["max_denom"] + 1) for m in range(1, n) if gcd(m, n) == 1]
+    expected = set()
+    for R in range(64):
+        if input_frequency / (R + 1) < params["pfc_min"]:
+            break
+        for F in range(1, 8192):
+            if not (360e6 <= input_frequency * (F + 1.0) / 2.0 / (R + 1.0) <= 1800e6):
+                continue
+            for enable, f, p in fracs:
+                for OD in range(8):
+                    for ACD in range(65536):
+                        pll = app_pll_frac_calc(input_frequency, F, R, f, p, OD, ACD)
+                        pll.fractional_enable = bool(enable)
+                        freq = pll.calc_frequency()
+                        if freq < params["min_frequency"]:
+                            break
+                        if freq <= params["max_frequency"]:
+                            expected.add((freq, R, F, f, p, OD, ACD, enable))
+
+    assert {entry[1] for entry in expected} == set(range(int(input_frequency // params["pfc_min"])))
+    assert len(index) == len(expected)
+    assert set(index.entries.tolist()) == expected
+    assert np.all(np.diff(index.entries["freq"]) >= 0)
+
+
+def test_index_queries(index):
+    freq = index.entries["freq"]
+
+    nearest = index.nearest(12.288e6)
+    assert len(nearest) > 0 and np.all(nearest["freq"] == nearest["freq"][0])
+    assert np.min(np.abs(freq - 12.288e6)) == abs(nearest["freq"][0] - 12.288e6)
+
+    window = index.within_ppm(12.288e6, 100)
+    assert np.array_equal(window, index.entries[np.abs(freq - 12.288e6) <= 12.288e6 * 100e-6])
+
+    assert len(index.nearest(1e6)) > 0 and index.nearest(1e6)["freq"][0] == freq[0]
+    assert len(index.in_range(13e6, 14e6)) == 0
+
+
+def test_index_save_load(index, tmp_path):
+    index.save(tmp_path / "index")
+    loaded = pll_index.load(tmp_path / "index")
+
+    assert isinstance(loaded.entries, np.memmap)
+    assert loaded.params == index.params
+    assert np.array_equal(loaded.entries, index.entries)
+    assert np.array_equal(loaded.nearest(12.3e6), index.nearest(12.3e6))
+
+
+def test_index_size_limit():
+    with pytest.raises(ValueError):
+        pll_index.build(**INDEX_PARAMS, max_entries=100)
@@ -16,6 +16,7 @@ import re
 from sw_pll.dco_model import sigma_delta_dco
 from sw_pll.controller_model import sdm_pi_ctrl
 from test_lib_sw_pll import bin_dir
+from host_sw_pll import HostDut_SDM_CTRL, requires_host_build
 
 
 DUT_XE_SDM_CTRL = Path(__file__).parent / "test_app_sdm_ctrl/bin/test_app_sdm_ctrl.xe"
@@ -96,7 +97,8 @@ def read_register_file(reg_file):
         return int(app_pll_ctl_reg_val, 16), int(app_pll_div_reg_val, 16), int(app_pll_frac_reg_val, 16), int(ctrl_mid_point)
 
 
-def test_sdm_ctrl_equivalence(bin_dir):
+@pytest.mark.parametrize("dut_class", [Dut_SDM_CTRL, pytest.param(HostDut_SDM_CTRL, marks=requires_host_build)])
+def test_sdm_ctrl_equivalence(bin_dir, dut_class):
     """
     Simple low level test of equivalence using do_control_from_error
     Feed in random numbers into C and Python DUTs and see if we get the same results
@@ -142,7 +144,7 @@ def test_sdm_ctrl_equivalence(bin_dir):
             )
 
 
-            ctrl_dut = Dut_SDM_CTRL(args)
+            ctrl_dut = dut_class(args)
 
             max_ticks = 0
 
@@ -165,7 +167,38 @@ def test_sdm_ctrl_equivalence(bin_dir):
                 assert dco_ctl_sim == dco_ctl_dut
                 assert lock_status_sim == lock_status_dut
 
-            tr.write(f"SDM Control {profile_used} max ticks: {max_ticks}\n")
+            if dut_class is Dut_SDM_CTRL: # No timing from the host build
+                tr.write(f"SDM Control {profile_used} max ticks: {max_ticks}\n")
 
             print(f"{profile_used} TEST PASSED!")
 
+
+
+@requires_host_build
+def test_sdm_ctrl_batch_equivalence():
+    """
+    A long run of the controller through the host build in one call, including time spent clipped at the limits
+    """
+    profile = sigma_delta_dco.profiles["24.576_1M"]
+    Kp = 0.0
+    Ki = 32.0
+    Kii = 0.0
+
+    ctrl_sim = sdm_pi_ctrl(profile["mod_init"], sigma_delta_dco.sdm_in_max, sigma_delta_dco.sdm_in_min, Kp, Ki)
+
+    args = DutSDMCTRLArgs(kp=Kp, ki=Ki, kii=Kii, loop_rate_count=1, pll_ratio=512, ref_clk_expected_inc=0,
+                          app_pll_ctl_reg_val=0, app_pll_div_reg_val=0, app_pll_frac_reg_val=0,
+                          ctrl_mid_point=profile["mod_init"], ppm_range=1000, target_output_frequency=profile["output_frequency"])
+    ctrl_dut = HostDut_SDM_CTRL(args)
+
+    rng = np.random.default_rng(6)
+    mclk_diffs = np.concatenate([rng.integers(-10, 10, 10000), np.full(200, 100), rng.integers(-10, 10, 2000), np.full(400, -100)])
+    error_dut, dco_ctl_dut, lock_status_dut = ctrl_dut.do_control_batch(mclk_diffs)
+
+    expected = []
+    for mclk_diff in mclk_diffs:
+        dco_ctl_sim, lock_status_sim = ctrl_sim.do_control_from_error(mclk_diff)
+        expected.append((ctrl_sim.total_error, dco_ctl_sim, lock_status_sim))
+
+    assert list(zip(error_dut.tolist(), dco_ctl_dut.tolist(), lock_status_dut.tolist())) == expected
+    assert set(lock_status_dut.tolist()) == {-1, 0, 1}
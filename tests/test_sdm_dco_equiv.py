@@ -13,6 +13,7 @@ from subprocess import Popen, PIPE
 from sw_pll.dco_model import sigma_delta_dco
 
 from test_lib_sw_pll import bin_dir
+from host_sw_pll import HostDut_SDM_DCO, requires_host_build
 
 
 DUT_XE_SDM_DCO = Path(__file__).parent / "test_app_sdm_dco/bin/test_app_sdm_dco.xe"
@@ -73,7 +74,8 @@ class Dut_SDM_DCO:
         self._process.stdin.close()
         self._process.wait()
 
-def test_sdm_dco_equivalence(bin_dir):
+@pytest.mark.parametrize("dut_class", [Dut_SDM_DCO, pytest.param(HostDut_SDM_DCO, marks=requires_host_build)])
+def test_sdm_dco_equivalence(bin_dir, dut_class):
     """
     Simple low level test of equivalence using do_modulate
     Feed in a sweep of DCO control vals into C and Python DUTs and see if we get the same results
@@ -95,7 +97,7 @@ def test_sdm_dco_equivalence(bin_dir):
             dco_sim.print_stats()
 
             dut_pll = sigma_delta_dco(profile)
-            dco_dut = Dut_SDM_DCO(dut_pll, args)
+            dco_dut = dut_class(dut_pll, args)
 
             max_ticks = 0
 
@@ -114,7 +116,30 @@ def test_sdm_dco_equivalence(bin_dir):
                 assert frac_reg_sim == frac_reg_dut
                 assert frequency_sim == frequency_dut
 
-            tr.write(f"SDM DCO {profile} max ticks: {max_ticks}\n")
+            if dut_class is Dut_SDM_DCO: # No timing from the host build
+                tr.write(f"SDM DCO {profile} max ticks: {max_ticks}\n")
 
             print(f"{profile} TEST PASSED!")
 
+
+
+@requires_host_build
+@pytest.mark.parametrize("profile", sigma_delta_dco.profiles.keys())
+def test_sdm_dco_batch_equivalence(profile):
+    """
+    Run a long input sequence through the host build in one call and check the modulator
+    output and register writes against the block model
+    """
+    dco_sim = sigma_delta_dco(profile)
+    dco_dut = HostDut_SDM_DCO(dco_sim)
+
+    rng = np.random.default_rng(5)
+    sdm_ins = np.repeat(rng.integers(dco_sim.sdm_in_min, dco_sim.sdm_in_max, 100), 10000) # Held for a control period as in the firmware
+    sdm_out_dut, frac_reg_dut = dco_dut.modulate_batch(sdm_ins)
+
+    sdm_out_sim = np.concatenate([dco_sim.modulate_block(sdm_in, 10000) for sdm_in in sdm_ins[::10000]])
+    assert np.array_equal(sdm_out_dut, sdm_out_sim)
+
+    frac_reg_sim = np.where(sdm_out_sim == 0, 0x00000007, ((sdm_out_sim.astype(np.uint32) - 1) << 8) | 0x80000007)
+    assert np.array_equal(frac_reg_dut, frac_reg_sim)
+    assert np.array_equal(dco_sim.app_pll.frequencies_from_frac_regs(frac_reg_dut), dco_sim.codes_to_frequency(sdm_out_sim))
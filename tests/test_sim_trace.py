@@ -0,0 +1,150 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+"""
+Tests for the simulation trace recorder. These run on the host only
+and do not need xsim.
+"""
+
+import numpy as np
+import pytest
+
+from sw_pll.sim_trace import trace_recorder, trace_writer, trace_reader
+from sw_pll.sw_pll_sim import run_lut_sw_pll_sim, run_sd_sw_pll_sim
+
+
+@pytest.mark.parametrize("decimation", [1, 7, 100])
+def test_trace_decimation(decimation):
+    """
+    Recording in irregular pieces, including single values, must give the same result as decimating the whole trace
+    """
+    rng = np.random.default_rng(22)
+    signal = rng.normal(0, 1, 1003)
+    lock = rng.integers(-1, 2, 1003).astype(np.int8)
+
+    trace = trace_recorder(len(signal), decimation=decimation)
+    trace.add_channel("every", mode="every")
+    trace.add_channel("mean", mode="mean")
+    trace.add_channel("minmax", dtype=np.int8, mode="minmax")
+    trace.add_channel("full", decimation=1)
+
+    # Single values for the first 250, then irregular pieces
+    edges = np.concatenate((np.arange(250), np.sort(rng.choice(np.arange(250, len(signal)), 40, replace=False)), [len(signal)]))
+    for start, end in zip(edges, edges[1:]):
+        if end - start == 1:
+            trace.record(every=signal[start], mean=signal[start], minmax=lock[start], full=signal[start])
+        else:
+            trace.record(every=signal[start:end], mean=signal[start:end], minmax=lock[start:end], full=signal[start:end])
+    trace.flush()
+
+    buckets = [slice(i, i + decimation) for i in range(0, len(signal), decimation)]
+    assert np.array_equal(trace["every"], signal[::decimation])
+    assert np.allclose(trace["mean"], [signal[bucket].mean() for bucket in buckets], rtol=0, atol=1e-12)
+    assert np.array_equal(trace["minmax"], [(lock[bucket].min(), lock[bucket].max()) for bucket in buckets])
+    assert trace["minmax"].dtype == np.int8
+    assert np.array_equal(trace["full"], signal)
+
+
+def test_trace_disabled_and_full():
+    """
+    A disabled channel must record nothing and a channel must not grow past its allocation
+    """
+    disabled = trace_recorder(10**9, decimation=1000, mode="mean").add_channel("frequency", enabled=False)
+    assert disabled.data.nbytes == 0 and disabled._pending is None
+
+    trace = trace_recorder(10)
+    trace.add_channel("frequency")
+    trace.add_channel("lock_status", dtype=np.int8, enabled=False)
+
+    trace.record(frequency=np.arange(10.0), lock_status=np.zeros(10))
+    assert "lock_status" not in trace
+    assert len(trace["lock_status"]) == 0
+    with pytest.raises(ValueError):
+        trace.record(frequency=1.0)
+
+
+def test_trace_writer_reader(tmp_path):
+    """
+    Any window read back must match what was streamed, within a chunk or across several
+    """
+    rng = np.random.default_rng(23)
+    frequency = rng.normal(24576000, 100, 10007)
+    lock_status = rng.integers(-1, 2, 25).astype(np.int8)
+
+    with trace_writer(tmp_path, sample_rate_hz=1e6, chunk_samples=1000, metadata={"Ki": 32.0}) as sink:
+        sink.add_channel("frequency")
+        sink.add_channel("lock_status", dtype=np.int8, sample_rate_hz=100)
+        sink.add_channel("error_accum", sample_rate_hz=100, start_s=0.01)
+        for value in range(2500): # One at a time across chunks, as the simulations record
+            sink.record(error_accum=float(value))
+        for start in range(0, len(frequency), 777):
+            sink.record(frequency=frequency[start:start + 777])
+        for status in lock_status:
+            sink.record(lock_status=status)
+
+    reader = trace_reader(tmp_path)
+    assert reader.metadata == {"Ki": 32.0}
+    assert reader.num_samples("frequency") == len(frequency)
+    assert np.array_equal(reader["frequency"], frequency)
+    assert np.array_equal(reader["lock_status"], lock_status)
+    assert reader["lock_status"].dtype == np.int8
+    assert np.array_equal(reader["error_accum"], np.arange(2500))
+
+    for start, stop in [(0, 10), (1000, 2000), (999, 1001), (2500, 7777), (9990, 20000), (5, 5), (-7, None)]:
+        assert np.array_equal(reader.read("frequency", start, stop), frequency[start:stop])
+    assert isinstance(reader.read("frequency", 1200, 1300), np.memmap) # Not copied
+    assert np.array_equal(reader.read_time("frequency", 0.002, 0.0035), frequency[2000:3500])
+    assert np.array_equal(reader.read_time("lock_status", 0.1, 0.2), lock_status[10:20])
+    assert np.array_equal(reader.read_time("lock_status", 0.07, 0.13), lock_status[7:13])
+
+    # Sample i of a channel starting at 10ms is at 10ms + i / 100Hz
+    assert reader.start_s("error_accum") == 0.01
+    assert np.array_equal(reader.read_time("error_accum", 0.07, 0.13), np.arange(6, 12))
+    assert np.array_equal(reader.read_time("error_accum", 0.0, 0.035), np.arange(0, 3))
+
+
+def test_trace_writer_append(tmp_path):
+    """
+    Appending must continue the run. Otherwise the old run must be replaced.
+    """
+    for part in range(3):
+        with trace_writer(tmp_path, chunk_samples=64, append=True) as sink:
+            sink.add_channel("error_accum")
+            sink.record(error_accum=np.arange(part * 100, (part + 1) * 100))
+    assert np.array_equal(trace_reader(tmp_path)["error_accum"], np.arange(300))
+
+    with trace_writer(tmp_path, chunk_samples=64) as sink:
+        sink.add_channel("error_accum")
+        sink.record(error_accum=np.arange(10))
+    assert np.array_equal(trace_reader(tmp_path)["error_accum"], np.arange(10))
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+
+def test_lut_sim_trace(tmp_path, monkeypatch):
+    """
+    The example simulation must stream its trace
+    """
+    monkeypatch.chdir(tmp_path) # It writes its headers, plots and wav files here
+    run_lut_sw_pll_sim(trace_path=tmp_path / "trace")
+
+    reader = trace_reader(tmp_path / "trace")
+    assert reader.metadata["sim"] == "lut"
+    assert sorted(reader.channels) == ["error_accum", "error_accum_accum", "frequency", "lock_status"]
+    assert reader.num_samples("frequency") == 100
+    assert reader["frequency"][-1] == pytest.approx(12288000 * (1 + 50e-6), rel=5e-6)
+
+
+def test_sd_sim_trace(tmp_path, monkeypatch):
+    """
+    The control loop channels of the SDM simulation must be timed from its first run, one control period in
+    """
+    monkeypatch.chdir(tmp_path)
+    run_sd_sw_pll_sim(24576000, simulation_iterations=100000, trace_path=tmp_path / "trace")
+
+    reader = trace_reader(tmp_path / "trace")
+    assert reader.num_samples("sdm_step") == 100000
+    assert reader.num_samples("control_setting") == 9 # At 10ms to 90ms
+    for name in ("control_setting", "error_accum", "error_accum_accum", "lock_status"):
+        assert reader.start_s(name) == pytest.approx(0.01)
+        assert np.array_equal(reader.read_time(name, 0.0, 0.035), reader[name][:3])
+        assert np.array_equal(reader.read_time(name, 0.05, 0.1), reader[name][4:])
+    assert reader.start_s("sdm_step") == 0.0
@@ -0,0 +1,133 @@
+# Copyright 2026 XMOS LIMITED.
+# This Software is subject to the terms of the XMOS Public Licence: Version 1.
+"""
+Tests for the simulator. These run on the host only
+and do not need xsim.
+"""
+
+import numpy as np
+import pytest
+
+from sw_pll import kernels
+from sw_pll.app_pll_model import find_pll_config
+from sw_pll.sim_scheduler import sim_scheduler
+from sw_pll.sw_pll_sim import sim_sw_pll_lut, sim_sw_pll_lut_batch, sim_sw_pll_sd, sim_sw_pll_sd_batch
+
+
+@pytest.fixture(scope="module")
+def pll_config():
+    return find_pll_config(24000000, 12288000, max_denom=80, min_F=200, ppm_max=5, fracmin=0.695, fracmax=0.905, cache=False)
+
+
+def test_lut_batch_matches_instances(pll_config):
+    """
+    Each lane of the batch must give the same frequencies and lock statuses as its own sim_sw_pll_lut
+    """
+    nominal_control_rate_hz = 48000 / 512
+    Kp = np.array([0.0, 0.0, 1.0, 0.5, 0.0])
+    Ki = np.array([1.0, 2.0, 0.5, 0.0, 0.0])
+    Kii = np.array([0.0, 0.01, 0.0, 0.0, 0.1])
+    ppm_shift = np.array([700, -200, 400, 0, 50]) # The first is beyond the LUT range
+
+    rng = np.random.default_rng(21)
+    jitter = rng.uniform(-50, 50, (200, len(Kp)))
+    jitter[::37] = 20000 # Missed control loops
+
+    batch = sim_sw_pll_lut_batch(12288000, nominal_control_rate_hz, Kp, Ki, Kii=Kii, config=pll_config)
+    instances = [sim_sw_pll_lut(12288000, nominal_control_rate_hz, *gains, config=pll_config) for gains in zip(Kp, Ki, Kii)]
+
+    output_clock_count = np.zeros(len(Kp))
+    period_fraction = np.ones(len(Kp))
+    lock_statuses = set()
+    for loop in range(len(jitter)):
+        output_frequency, lock_status = batch.do_control_loop(output_clock_count, period_fractions=period_fraction)
+        expected = [sim.do_control_loop(count, period_fraction=fraction) for sim, count, fraction in zip(instances, output_clock_count, period_fraction)]
+        assert output_frequency.tolist() == [frequency for frequency, _ in expected]
+        assert lock_status.tolist() == [lock for _, lock in expected]
+        lock_statuses.update(lock_status.tolist())
+
+        measured_clock_count_inc = output_frequency / nominal_control_rate_hz * (1 - ppm_shift / 1e6)
+        period_fraction = (measured_clock_count_inc + jitter[loop]) / measured_clock_count_inc
+        output_clock_count += measured_clock_count_inc * period_fraction
+
+    assert lock_statuses == {-1, 0, 1}
+
+
+def test_lut_batch_run(pll_config):
+    """
+    Lanes with the same settings must track the same way and all lanes must lock to their reference
+    """
+    ppm_shift = np.tile(np.linspace(-200, 200, 50), 2)
+    batch = sim_sw_pll_lut_batch(12288000, 48000 / 512, 0.0, np.repeat([1.0, 2.0], 50), config=pll_config)
+    freq_log, lock_log = batch.run(200, ppm_shift=ppm_shift)
+
+    single = sim_sw_pll_lut_batch(12288000, 48000 / 512, 0.0, 2.0, config=pll_config)
+    single_freq_log, _ = single.run(200, ppm_shift=ppm_shift[50])
+
+    assert freq_log.shape == lock_log.shape == (200, 100)
+    assert np.all(lock_log[-1] == 0)
+    assert np.array_equal(freq_log[:, 50], single_freq_log[:, 0])
+    assert np.allclose(freq_log[-20:].mean(axis=0), 12288000 * (1 + ppm_shift / 1e6), rtol=5e-6)
+
+
+@pytest.mark.parametrize("sdm_path", ["instances", "vector", "kernels"])
+def test_sd_batch_matches_instances(sdm_path, monkeypatch):
+    """
+    Each lane of the batch must give the same SDM steps and control settings as its own sim_sw_pll_sd,
+    whichever way the batch runs its SDMs
+    """
+    monkeypatch.setattr(kernels, "_enabled", sdm_path == "kernels")
+    if sdm_path == "vector":
+        monkeypatch.setattr(sim_sw_pll_sd_batch, "per_instance_max", 0)
+    Kp = np.array([0.0, 0.0, 1.0])
+    Ki = np.array([32.0, 16.0, 8.0])
+    Kii = np.array([0.25, 0.0, 0.5])
+    ppm_shift = np.array([50, -500, 3000])
+    sdm_steps_per_control = 2500
+
+    batch = sim_sw_pll_sd_batch(24576000, 100, Kp, Ki, Kii=Kii)
+    instances = [sim_sw_pll_sd(24576000, 100, *gains) for gains in zip(Kp, Ki, Kii)]
+
+    output_clock_count = [0.0] * len(Kp)
+    for period in range(30):
+        codes = batch.do_sigma_delta_block(sdm_steps_per_control)
+        for lane, sim in enumerate(instances):
+            assert codes[lane].tolist() == sim.do_sigma_delta_block(sdm_steps_per_control).tolist()
+
+            output_clocks = sim.dco.codes_to_frequency(codes[lane]) / (sdm_steps_per_control * 100) * (1 - ppm_shift[lane] / 1e6)
+            output_clock_count[lane] = float(np.cumsum(np.concatenate(([output_clock_count[lane]], output_clocks)))[-1])
+
+        control_setting = batch.do_control_loop(output_clock_count)
+        assert control_setting.tolist() == [sim.do_control_loop(count) for sim, count in zip(instances, output_clock_count)]
+        assert batch.lock_status.tolist() == [sim.controller.lock_status for sim in instances]
+
+    batch_run = sim_sw_pll_sd_batch(24576000, 100, Kp, Ki, Kii=Kii)
+    _, _, control_log = batch_run.run(30, sdm_steps_per_control=sdm_steps_per_control, ppm_shift=ppm_shift)
+    assert control_log[-1].tolist() == control_setting.tolist()
+
+
+def test_scheduler_rates():
+    """
+    Every stage must run each of its steps once, in order, with the blocks split exactly at the events
+    """
+    calls = []
+    scheduler = sim_scheduler()
+    scheduler.add_stage(48000 / 512, lambda step: calls.append(("control", step, 1)), start=1)
+    scheduler.add_stage(1e6, lambda step, n: calls.append(("sdm", step, n)), block=True)
+    scheduler.add_stage(6144000, lambda step, n: calls.append(("audio", step, n)), block=True)
+    assert scheduler.tick_rate_hz == 768000000
+
+    scheduler.run(2.0)
+    scheduler.run(end_tick=scheduler.ticks(4.0)) # Continues from where it stopped
+
+    for name, rate_hz in [("control", 93.75), ("sdm", 1000000), ("audio", 6144000)]:
+        steps = [(step, n) for stage, step, n in calls if stage == name]
+        assert steps[0][0] == (1 if name == "control" else 0)
+        assert all(step + n == next_step for (step, n), (next_step, _) in zip(steps, steps[1:]))
+        assert sum(n for _, n in steps) == 4 * rate_hz - (name == "control")
+
+    # Blocks run from each control event up to the next, so block steps never straddle an event time
+    control_ticks = [step * 8192000 for stage, step, _ in calls if stage == "control"]
+    sdm_start_ticks = [step * 768 for stage, step, _ in calls if stage == "sdm"]
+    assert {-(-tick // 768) * 768 for tick in control_ticks} <= set(sdm_start_ticks)
+    assert [stage for stage, _, _ in calls[:6]] == ["sdm", "audio", "control", "sdm", "audio", "control"]